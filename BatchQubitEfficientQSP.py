@@ -0,0 +1,104 @@
+import numpy as np
+from QuantumStatePreparation import QuantumStatePreparation
+from QubitEfficientQSP import QubitEfficientQSP
+
+class BatchQubitEfficientQSP:
+    """
+    Class for preparing a batch of same-size quantum states using the qubit efficient method.
+    The input is validated once and the angle trees of all states are computed in a single vectorized pass.
+    """
+
+    def __init__(self, normalized_complex_arrays: np.ndarray, dtype=np.float64):
+        """
+        Initialize the BatchQubitEfficientQSP with a batch of normalized complex arrays.
+
+        Args:
+            normalized_complex_arrays (np.ndarray): An array of shape (B, 2^n) whose rows are normalized complex arrays.
+            dtype: The precision of the amplitudes, phases and rotation angles, np.float64 or np.float32,
+                see QuantumStatePreparation.
+        """
+        dtype = QuantumStatePreparation._validate_dtype(dtype)
+        normalized_complex_arrays = np.asarray(normalized_complex_arrays)
+        if normalized_complex_arrays.ndim != 2:
+            raise ValueError("Wave function arrays need to be stacked into a 2d array of shape (B, 2^n).")
+        self._normalized_complex_arrays = normalized_complex_arrays
+        self._batch_size, self._array_len = normalized_complex_arrays.shape
+
+        # Validate that the array length is a power of 2
+        if not (self._array_len > 0 and (self._array_len & (self._array_len - 1)) == 0):
+            raise ValueError("Wave function array needs to have length as power of 2. Consider padding it with zeros.")
+        self._n = int(np.log2(self._array_len))
+
+        # Validate that every array is normalized
+        l2_norms = np.linalg.norm(normalized_complex_arrays, ord=2, axis=1)
+        not_normalized_rows = np.flatnonzero(np.abs(l2_norms - 1) >= QuantumStatePreparation._normalization_tolerance(
+            self._array_len, normalized_complex_arrays.dtype))
+        if len(not_normalized_rows) > 0:
+            raise ValueError(f"Wave function array needs to be normalized (rows {not_normalized_rows.tolist()}).")
+
+        # the amplitudes are squared in place since they are only needed for the angle tree
+        amplitude_arrays, phase_arrays = QuantumStatePreparation._compute_amplitude_phase_arrays(normalized_complex_arrays, dtype)
+        self._ry_angle_tree, self._rz_angle_tree = QuantumStatePreparation._compute_angle_levels(
+            np.square(amplitude_arrays, out=amplitude_arrays), phase_arrays)[:2]
+
+    def get_batch_size(self) -> int:
+        """Return the number of states in the batch for debugging purposes."""
+        return self._batch_size
+
+    def get_array_len(self) -> int:
+        """Return the length of each array for debugging purposes."""
+        return self._array_len
+
+    def get_n(self) -> int:
+        """Return the number of qubits for debugging purposes."""
+        return self._n
+
+    def get_ry_angle_level(self, s: int) -> np.ndarray:
+        """Return the Ry angles of level s as an array of shape (B, 2^(n-s)) for debugging purposes."""
+        return self._ry_angle_tree[s - 1]
+
+    def get_rz_angle_level(self, s: int) -> np.ndarray:
+        """Return the Rz angles of level s as an array of shape (B, 2^(n-s)) for debugging purposes."""
+        return self._rz_angle_tree[s - 1]
+
+    def get_state_preparation(self, b: int) -> QubitEfficientQSP:
+        """
+        Return the QubitEfficientQSP of the b-th state, built from the shared angle trees without recomputing them.
+
+        Args:
+            b (int): Index of the state in the batch.
+
+        Returns:
+            QubitEfficientQSP: The state preparation instance of the b-th state.
+        """
+        return QubitEfficientQSP.from_angle_tree(self._n,
+                                                 [ry_angle_level[b] for ry_angle_level in self._ry_angle_tree],
+                                                 [rz_angle_level[b] for rz_angle_level in self._rz_angle_tree])
+
+    def construct_circuits(self, decomposition: str = "multi_control", optimize: bool = False) -> list:
+        """
+        Construct the QSP circuit of every state in the batch.
+
+        Args:
+            decomposition (str): The decomposition mode, see QubitEfficientQSP.construct_circuit.
+            optimize (bool): Whether to run the peephole optimization, see QubitEfficientQSP.construct_circuit.
+
+        Returns:
+            list: The B constructed quantum circuits, in batch order.
+        """
+        return [self.get_state_preparation(b).construct_circuit(decomposition=decomposition, optimize=optimize)
+                for b in range(self._batch_size)]
+
+    def construct_parametric_circuits(self, decomposition: str = "multi_control") -> list:
+        """
+        Construct the parametric QSP circuit template and parameter values of every state in the batch.
+        States sharing the same pattern of nonzero rotations share the same cached template.
+
+        Args:
+            decomposition (str): The decomposition mode, see QubitEfficientQSP.construct_circuit.
+
+        Returns:
+            list: The B (template, parameter_values) pairs, see QubitEfficientQSP.construct_parametric_circuit.
+        """
+        return [self.get_state_preparation(b).construct_parametric_circuit(decomposition=decomposition)
+                for b in range(self._batch_size)]
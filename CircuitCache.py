@@ -0,0 +1,180 @@
+from __future__ import annotations
+import hashlib
+import os
+import time
+import uuid
+from typing import TYPE_CHECKING
+import numpy as np
+from GateSequence import GateSequence
+from QubitEfficientQSP import QubitEfficientQSP
+
+if TYPE_CHECKING:
+    from braket.circuits import Circuit
+
+class CircuitCache:
+    """
+    Class for caching constructed QSP circuits on disk across runs and processes. Entries are keyed by a hash of
+    the quantized amplitude array, n, the tolerance and the decomposition mode, and hold the angle tree and the
+    gate records of the circuit in a single .npz file, so a repeated preparation is one file read.
+    Entries are written to a temporary file and renamed into place, so concurrent readers never see a partial
+    entry, and the least recently used entries are evicted once the directory exceeds max_size_bytes.
+    The size is summed from the directory after every store, so writes of other processes sharing the directory
+    count toward the bound, and the scan also removes the temporary files left behind by crashed writers.
+    """
+
+    FORMAT_VERSION = 1
+    # temporary files older than this many seconds are left over from crashed writers
+    STALE_TEMPORARY_AGE = 3600
+
+    def __init__(self, cache_directory: str, max_size_bytes: int = 2 ** 30, quantization: float = 1e-12):
+        """
+        Initialize the CircuitCache with the directory holding the entries.
+
+        Args:
+            cache_directory (str): The directory of the cache entries, created if it does not exist.
+            max_size_bytes (int): The total size of the entries above which the least recently used are evicted.
+            quantization (float): The resolution the real and imaginary parts are rounded to before hashing, so arrays
+                that differ by less share an entry.
+        """
+        os.makedirs(cache_directory, exist_ok=True)
+        self._cache_directory = cache_directory
+        self._max_size_bytes = max_size_bytes
+        self._quantization = quantization
+        self._statistics = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get_statistics(self) -> dict:
+        """Return the hit, miss and eviction counts of this instance for debugging purposes."""
+        return self._statistics
+
+    def compute_key(self, normalized_complex_array: np.ndarray, decomposition: str = "multi_control", tolerance: float = 1e-100) -> str:
+        """
+        Compute the cache key of a preparation.
+
+        Args:
+            normalized_complex_array (np.ndarray): A normalized complex array representing the quantum state.
+            decomposition (str): The decomposition mode, see QubitEfficientQSP.construct_circuit.
+            tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+
+        Returns:
+            str: The hexadecimal SHA-256 digest identifying the entry.
+        """
+        normalized_complex_array = np.asarray(normalized_complex_array, dtype=np.complex128)
+        key_hash = hashlib.sha256(f"v{self.FORMAT_VERSION}|{len(normalized_complex_array)}|{decomposition}|{tolerance!r}|{self._quantization!r}".encode())
+        key_hash.update(np.round(normalized_complex_array.real / self._quantization).astype(np.int64).tobytes())
+        key_hash.update(np.round(normalized_complex_array.imag / self._quantization).astype(np.int64).tobytes())
+        return key_hash.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self._cache_directory, f"{key}.npz")
+
+    def _load_entry(self, key: str):
+        """Read an entry and mark it as recently used, or return None if it does not exist (or was just evicted)."""
+        entry_path = self._entry_path(key)
+        try:
+            with np.load(entry_path) as entry:
+                n = int(entry["n"])
+                ry_angle_tree = [entry[f"ry_angle_level_{s}"] for s in range(1, n + 1)]
+                rz_angle_tree = [entry[f"rz_angle_level_{s}"] for s in range(1, n + 1)]
+                gate_sequence = GateSequence(n, entry["gates"])
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        return QubitEfficientQSP.from_angle_tree(n, ry_angle_tree, rz_angle_tree), gate_sequence
+
+    def _store_entry(self, key: str, qsp: QubitEfficientQSP, gate_sequence: GateSequence):
+        """Write an entry atomically and evict the least recently used entries beyond the size bound."""
+        n = qsp.get_n()
+        arrays = {"n": np.array(n), "gates": gate_sequence.get_gates()}
+        for s in range(1, n + 1):
+            arrays[f"ry_angle_level_{s}"] = qsp.get_ry_angle_level(s)
+            arrays[f"rz_angle_level_{s}"] = qsp.get_rz_angle_level(s)
+        temporary_path = os.path.join(self._cache_directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        with open(temporary_path, "wb") as temporary_file:
+            np.savez(temporary_file, **arrays)
+        os.replace(temporary_path, self._entry_path(key))
+        self._evict()
+
+    def _scan_entries(self) -> tuple:
+        """
+        Scan the cache directory and remove the stale temporary files.
+
+        Returns:
+            tuple: (temporary_size, entries) with the total size of the temporary files still being written and
+                one (mtime, size, path) tuple per entry.
+        """
+        stale_time = time.time() - self.STALE_TEMPORARY_AGE
+        temporary_size = 0
+        entries = []
+        for directory_entry in os.scandir(self._cache_directory):
+            is_temporary = directory_entry.name.endswith(".tmp")
+            if not (is_temporary or directory_entry.name.endswith(".npz")):
+                continue
+            try:
+                entry_stat = directory_entry.stat()
+                if is_temporary and entry_stat.st_mtime < stale_time:
+                    os.remove(directory_entry.path)
+                    continue
+            except FileNotFoundError:
+                continue # renamed or removed by another process
+            if is_temporary:
+                temporary_size += entry_stat.st_size
+            else:
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, directory_entry.path))
+        return temporary_size, entries
+
+    def _evict(self):
+        """Sum the size of the directory, including the entries of other processes, and remove the least recently
+        used entries until the cache fits into max_size_bytes. Only a cache above the bound sorts its entries."""
+        temporary_size, entries = self._scan_entries()
+        total_size = temporary_size + sum(entry_size for _, entry_size, _ in entries)
+        if total_size <= self._max_size_bytes:
+            return
+        for _, entry_size, entry_path in sorted(entries):
+            if total_size <= self._max_size_bytes:
+                break
+            try:
+                os.remove(entry_path)
+                self._statistics["evictions"] += 1
+            except FileNotFoundError:
+                pass # already evicted by another process
+            total_size -= entry_size
+
+    def construct_gate_sequence(self, normalized_complex_array: np.ndarray, decomposition: str = "multi_control",
+                                tolerance: float = 1e-100) -> tuple:
+        """
+        Return the state preparation and gate sequence of a state, from the cache if possible.
+
+        Args:
+            normalized_complex_array (np.ndarray): A normalized complex array representing the quantum state.
+            decomposition (str): The decomposition mode, see QubitEfficientQSP.construct_circuit.
+            tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+
+        Returns:
+            tuple: (qsp, gate_sequence) with a QubitEfficientQSP holding the angle tree and the GateSequence of the circuit.
+        """
+        key = self.compute_key(normalized_complex_array, decomposition, tolerance)
+        cached_entry = self._load_entry(key)
+        if cached_entry is not None:
+            self._statistics["hits"] += 1
+            return cached_entry
+        self._statistics["misses"] += 1
+        qsp = QubitEfficientQSP(normalized_complex_array)
+        gate_sequence = qsp.construct_gate_sequence(decomposition=decomposition, tolerance=tolerance)
+        self._store_entry(key, qsp, gate_sequence)
+        return qsp, gate_sequence
+
+    def construct_circuit(self, normalized_complex_array: np.ndarray, decomposition: str = "multi_control",
+                          tolerance: float = 1e-100) -> Circuit:
+        """
+        Return the QSP circuit of a state, from the cache if possible. The circuit is the one of
+        QubitEfficientQSP.construct_circuit(decomposition), without the peephole optimization.
+
+        Args:
+            normalized_complex_array (np.ndarray): A normalized complex array representing the quantum state.
+            decomposition (str): The decomposition mode, see QubitEfficientQSP.construct_circuit.
+            tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+
+        Returns:
+            Circuit: The constructed quantum circuit.
+        """
+        return self.construct_gate_sequence(normalized_complex_array, decomposition, tolerance)[1].to_braket()
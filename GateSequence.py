@@ -0,0 +1,250 @@
+from __future__ import annotations
+import json
+from typing import TYPE_CHECKING
+import numpy as np
+from PipelineProfiler import PipelineProfiler
+
+if TYPE_CHECKING:
+    from braket.circuits import Circuit
+
+class GateSequence:
+    """
+    Class for holding a constructed circuit as a compact, backend-neutral gate sequence.
+    Every gate is one record (op, target, control_mask, anti_control_mask, angle) of a NumPy structured
+    array, where bit q of a mask selects qubit q as a control on |1> or on |0> respectively.
+    Thin emitters turn the whole sequence into a Braket Circuit, a Qiskit QuantumCircuit or OpenQASM 3 text,
+    so one angle computation serves every backend. Qubit 0 is the most significant bit, as in Braket.
+    """
+
+    X, RY, RZ = 0, 1, 2
+    GATE_DTYPE = np.dtype([("op", np.uint8), ("target", np.int32), ("control_mask", np.uint64),
+                           ("anti_control_mask", np.uint64), ("angle", np.float64)])
+    OP_NAMES = ("x", "ry", "rz")
+
+    def __init__(self, n: int, gates: np.ndarray = None):
+        """
+        Initialize the GateSequence with the number of qubits and the gate records.
+
+        Args:
+            n (int): The number of qubits.
+            gates (np.ndarray): A structured array of dtype GATE_DTYPE. Defaults to an empty sequence.
+        """
+        self._n = n
+        self._gates = np.zeros(0, dtype=self.GATE_DTYPE) if gates is None else np.asarray(gates, dtype=self.GATE_DTYPE)
+
+    @classmethod
+    def from_braket(cls, circ: Circuit, n: int = None) -> GateSequence:
+        """
+        Convert a Braket circuit made of (controlled) X, CNot, Ry and Rz gates, e.g. a peephole-optimized QSP
+        circuit, back into gate records, with the control_state of a gate turned into anti-controls.
+
+        Args:
+            circ (Circuit): The circuit to convert.
+            n (int): The number of qubits. Defaults to one more than the highest qubit of the circuit.
+
+        Returns:
+            GateSequence: The gate records of the circuit.
+        """
+        op_codes = {"X": cls.X, "CNot": cls.X, "Ry": cls.RY, "Rz": cls.RZ}
+        gates = np.zeros(len(circ.instructions), dtype=cls.GATE_DTYPE)
+        for k, instruction in enumerate(circ.instructions):
+            gate_name = type(instruction.operator).__name__
+            if gate_name not in op_codes:
+                raise ValueError("Circuit needs to consist of X, CNot, Ry and Rz gates.")
+            qubits = [int(qubit) for qubit in instruction.target]
+            controls = [int(qubit) for qubit in instruction.control] + qubits[:-1]
+            control_state = list(instruction.control_state) if instruction.control_state is not None else []
+            control_state = control_state + [1] * (len(controls) - len(control_state))
+            gates[k] = (op_codes[gate_name], qubits[-1],
+                        sum(1 << q for q, bit in zip(controls, control_state) if bit),
+                        sum(1 << q for q, bit in zip(controls, control_state) if not bit),
+                        instruction.operator.angle if gate_name in ("Ry", "Rz") else 0.0)
+        if n is None:
+            n = max((int(qubit) for qubit in circ.qubits), default=-1) + 1
+        return cls(n, gates)
+
+    def __len__(self) -> int:
+        return len(self._gates)
+
+    def get_n(self) -> int:
+        """Return the number of qubits for debugging purposes."""
+        return self._n
+
+    def get_gates(self) -> np.ndarray:
+        """Return the structured array of gate records for debugging purposes."""
+        return self._gates
+
+    def get_gate_counts(self) -> dict:
+        """Return the number of gates per op name, counting anti-controls as native controls."""
+        op_array = self._gates["op"]
+        return {self.OP_NAMES[op]: int(np.count_nonzero(op_array == op)) for op in np.unique(op_array)}
+
+    @staticmethod
+    def _mask_qubits(mask: int, qubit_lists: dict) -> list:
+        """Return the ascending qubits selected by a mask, memoized in qubit_lists since masks repeat."""
+        qubits = qubit_lists.get(mask)
+        if qubits is None:
+            qubits = [q for q in range(mask.bit_length()) if (mask >> q) & 1]
+            qubit_lists[mask] = qubits
+        return qubits
+
+    def to_braket(self, circ: Circuit = None, use_control_state: bool = False, angle_parameters: list = None) -> Circuit:
+        """
+        Emit the gate sequence as Braket instructions.
+
+        Args:
+            circ (Circuit): The circuit to add the gates to. Defaults to a new circuit.
+            use_control_state (bool): If True, anti-controls are emitted as the control_state of the gate.
+                Otherwise, every run of consecutive gates on the same target sharing the same anti-controls is
+                wrapped in X gates, which matches the gates QubitEfficientQSP has always emitted.
+            angle_parameters (list): Per gate record, an angle replacing the angle of the record, e.g. a FreeParameter
+                for parametric templates, or None to keep it. Defaults to the angles of the records.
+
+        Returns:
+            Circuit: The circuit with the gates added.
+        """
+        with PipelineProfiler.phase("braket_emission"):
+            return self._emit_braket(circ, use_control_state, angle_parameters)
+
+    def _emit_braket(self, circ: Circuit = None, use_control_state: bool = False, angle_parameters: list = None) -> Circuit:
+        """Add the Braket instructions of the gate sequence to circ, see to_braket."""
+        from braket.circuits import Circuit, Instruction
+        from braket.circuits.gates import CNot, Ry, Rz, X
+
+        circ = Circuit() if circ is None else circ
+        gate_classes = (X, Ry, Rz)
+        qubit_lists = {}
+        instructions = []
+        wrapped_target, wrapped_anti_control_mask = None, 0
+        for k, (op, target, control_mask, anti_control_mask, angle) in enumerate(self._gates.tolist()):
+            if angle_parameters is not None and angle_parameters[k] is not None:
+                angle = angle_parameters[k]
+            if not use_control_state and (target, anti_control_mask) != (wrapped_target, wrapped_anti_control_mask):
+                instructions.extend(Instruction(X(), q) for q in self._mask_qubits(wrapped_anti_control_mask, qubit_lists))
+                instructions.extend(Instruction(X(), q) for q in self._mask_qubits(anti_control_mask, qubit_lists))
+                wrapped_target, wrapped_anti_control_mask = target, anti_control_mask
+            controls = self._mask_qubits(control_mask | anti_control_mask, qubit_lists)
+            if op == self.X and len(controls) == 1 and anti_control_mask == 0:
+                instructions.append(Instruction(CNot(), [controls[0], target]))
+                continue
+            gate = X() if op == self.X else gate_classes[op](angle)
+            control_state = [(control_mask >> q) & 1 for q in controls] if use_control_state and anti_control_mask else None
+            instructions.append(Instruction(gate, target, control=controls, control_state=control_state))
+        instructions.extend(Instruction(X(), q) for q in self._mask_qubits(wrapped_anti_control_mask, qubit_lists))
+        return circ.add(instructions)
+
+    def to_qiskit(self):
+        """
+        Emit the gate sequence as a Qiskit QuantumCircuit with native control states. Braket qubit q is
+        mapped to Qiskit qubit n - 1 - q, so the Qiskit state vector is in the same order as the input array.
+
+        Returns:
+            QuantumCircuit: The constructed Qiskit circuit.
+        """
+        with PipelineProfiler.phase("qiskit_emission"):
+            return self._emit_qiskit()
+
+    def _emit_qiskit(self):
+        """Build the Qiskit QuantumCircuit of the gate sequence, see to_qiskit."""
+        from qiskit import QuantumCircuit
+        from qiskit.circuit.library import RYGate, RZGate, XGate
+
+        gate_classes = (XGate, RYGate, RZGate)
+        qiskit_circ = QuantumCircuit(self._n)
+        qubit_lists = {}
+        for op, target, control_mask, anti_control_mask, angle in self._gates.tolist():
+            controls = self._mask_qubits(control_mask | anti_control_mask, qubit_lists)
+            gate = gate_classes[op]() if op == self.X else gate_classes[op](angle)
+            if controls:
+                # bit i of ctrl_state is the state the i-th control qubit is conditioned on
+                ctrl_state = sum(((control_mask >> q) & 1) << i for i, q in enumerate(controls))
+                gate = gate.control(len(controls), ctrl_state=ctrl_state)
+            qiskit_circ.append(gate, [self._n - 1 - q for q in controls] + [self._n - 1 - target])
+        return qiskit_circ
+
+    @staticmethod
+    def _openqasm_header_lines(n: int, braket_dialect: bool = False) -> list:
+        """Return the version, include and qubit declaration lines of an OpenQASM 3 program on n qubits."""
+        lines = ["OPENQASM 3.0;"] if braket_dialect else ["OPENQASM 3.0;", 'include "stdgates.inc";']
+        lines.append(f"qubit[{n}] q;")
+        return lines
+
+    def _openqasm_gate_lines(self, braket_dialect: bool = False) -> list:
+        """Return one OpenQASM 3 statement per gate record, see to_openqasm."""
+        cnot_name = "cnot" if braket_dialect else "cx"
+        qubit_lists = {}
+        # the Ry and Rz of an <s, j> instance share their modifiers and operands, so they are formatted once
+        operand_strings = {}
+        lines = []
+        for op, target, control_mask, anti_control_mask, angle in self._gates.tolist():
+            operands = operand_strings.get((target, control_mask, anti_control_mask))
+            if operands is None:
+                anti_controls = self._mask_qubits(anti_control_mask, qubit_lists)
+                controls = self._mask_qubits(control_mask, qubit_lists)
+                modifiers = ""
+                if anti_controls:
+                    modifiers += f"negctrl({len(anti_controls)}) @ "
+                if controls:
+                    modifiers += f"ctrl({len(controls)}) @ "
+                operands = (modifiers, ", ".join(f"q[{q}]" for q in anti_controls + controls + [target]),
+                            len(controls) == 1 and not anti_controls)
+                operand_strings[(target, control_mask, anti_control_mask)] = operands
+            modifiers, qubits, is_cnot = operands
+            if op == self.X and is_cnot:
+                lines.append(f"{cnot_name} {qubits};")
+            elif op == self.X:
+                lines.append(f"{modifiers}x {qubits};")
+            else:
+                lines.append(f"{modifiers}{self.OP_NAMES[op]}({angle!r}) {qubits};")
+        return lines
+
+    def to_openqasm(self, braket_dialect: bool = False) -> str:
+        """
+        Emit the gate sequence as OpenQASM 3 text, with the ctrl and negctrl gate modifiers for the controls.
+
+        Args:
+            braket_dialect (bool): If True, omit the "stdgates.inc" include, which Braket rejects since it defines
+                the standard gates natively, and name the CNOT cnot instead of cx.
+
+        Returns:
+            str: The OpenQASM 3 program.
+        """
+        with PipelineProfiler.phase("openqasm_emission"):
+            return "\n".join(self._openqasm_header_lines(self._n, braket_dialect) + self._openqasm_gate_lines(braket_dialect)) + "\n"
+
+    def _jsonl_lines(self) -> list:
+        """Return one JSON object per gate record, with the op name and the record fields."""
+        return [json.dumps({"op": self.OP_NAMES[op], "target": target, "control_mask": control_mask,
+                            "anti_control_mask": anti_control_mask, "angle": angle})
+                for op, target, control_mask, anti_control_mask, angle in self._gates.tolist()]
+
+    @classmethod
+    def write_stream(cls, gate_sequences, file_path: str, n: int, file_format: str = "openqasm",
+                     braket_dialect: bool = False) -> int:
+        """
+        Write gate sequence chunks to a file one chunk at a time, so only the current chunk is held in memory.
+
+        Args:
+            gate_sequences: An iterable of GateSequence chunks on n qubits, e.g. QubitEfficientQSP.iter_gate_sequence().
+            file_path (str): The path of the file to write.
+            n (int): The number of qubits.
+            file_format (str): "openqasm" for an OpenQASM 3 program or "jsonl" for one JSON gate record per line.
+            braket_dialect (bool): See to_openqasm.
+
+        Returns:
+            int: The number of gate records written.
+        """
+        if file_format not in ("openqasm", "jsonl"):
+            raise ValueError("File format needs to be either 'openqasm' or 'jsonl'.")
+        gate_count = 0
+        with open(file_path, "w") as stream_file:
+            if file_format == "openqasm":
+                stream_file.writelines(line + "\n" for line in cls._openqasm_header_lines(n, braket_dialect))
+            for gate_sequence in gate_sequences:
+                if file_format == "openqasm":
+                    lines = gate_sequence._openqasm_gate_lines(braket_dialect)
+                else:
+                    lines = gate_sequence._jsonl_lines()
+                stream_file.writelines(line + "\n" for line in lines)
+                gate_count += len(gate_sequence)
+        return gate_count
@@ -0,0 +1,126 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import shared_memory
+import numpy as np
+from GateSequence import GateSequence
+from QubitEfficientQSP import QubitEfficientQSP
+
+# per-worker state emitting from the shared angle tree, set up once by _attach_shared_angle_tree
+_worker_state = {}
+
+
+def _attach_shared_angle_tree(shared_memory_name: str, n: int, dtype: str):
+    """
+    Attach a worker process to the shared angle tree.
+
+    Args:
+        shared_memory_name (str): The name of the shared memory block holding the Ry and then the Rz angle levels back to back.
+        n (int): The number of qubits.
+        dtype (str): The dtype of the angle levels.
+    """
+    shared_block = shared_memory.SharedMemory(name=shared_memory_name)
+    shared_angles = np.ndarray((2, 2 ** n - 1), dtype=dtype, buffer=shared_block.buf)
+    # level s occupies the 2^(n-s) entries starting at 2^n - 2^(n-s+1), the layout of the levels concatenated in order
+    level_slices = [slice(2 ** n - 2 ** (n - s + 1), 2 ** n - 2 ** (n - s)) for s in range(1, n + 1)]
+    _worker_state["shared_block"] = shared_block
+    _worker_state["qsp"] = QubitEfficientQSP.from_angle_tree(n, [shared_angles[0][level_slice] for level_slice in level_slices],
+                                                              [shared_angles[1][level_slice] for level_slice in level_slices])
+
+
+def _emit_shard(s: int, j_start: int, j_end: int, tolerance: float, file_format: str, braket_dialect: bool) -> tuple:
+    """
+    Format the gates of the <s, j> instances with j_start <= j <= j_end in decreasing j as a text segment.
+
+    Args:
+        s (int): As it appears in equation 4.30 in the ML with QC book.
+        j_start (int): The first j of the shard.
+        j_end (int): The last j of the shard.
+        tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+        file_format (str): "openqasm" for OpenQASM 3 statements or "jsonl" for one JSON gate record per line.
+        braket_dialect (bool): See GateSequence.to_openqasm.
+
+    Returns:
+        tuple: (text, gate_count) with the lines of the shard and the number of gate records in it.
+    """
+    qsp = _worker_state["qsp"]
+    gate_sequence = GateSequence(qsp.get_n(), qsp._multi_control_level_gates(s, np.arange(j_end - 1, j_start - 2, -1), tolerance))
+    lines = gate_sequence._openqasm_gate_lines(braket_dialect) if file_format == "openqasm" else gate_sequence._jsonl_lines()
+    return "".join(line + "\n" for line in lines), len(gate_sequence)
+
+
+class ParallelCircuitBuilder:
+    """
+    Class for writing the multi-control QSP circuit of a large dense state to a file with several processes.
+    The angle tree is shared with the workers through shared memory instead of being pickled, every level s
+    is sharded into contiguous j-ranges, and the workers generate the gate records of their shards and format
+    them as OpenQASM or JSONL text, which is the expensive part. The segments are written in order, so the file
+    is identical to the one of QubitEfficientQSP.write_gate_stream().
+    """
+
+    def __init__(self, qsp: QubitEfficientQSP, max_workers: int = None, shard_size: int = 65536, tolerance: float = 1e-100):
+        """
+        Initialize the ParallelCircuitBuilder with the state preparation to write.
+
+        Args:
+            qsp (QubitEfficientQSP): A state preparation with a dense angle tree, i.e. not created through from_sparse.
+            max_workers (int): The number of worker processes. Defaults to the number of processors.
+            shard_size (int): The maximum number of j per shard.
+            tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+        """
+        if qsp.is_sparse():
+            raise ValueError("Parallel construction needs a dense angle tree.")
+        self._qsp = qsp
+        self._max_workers = max_workers
+        self._shard_size = shard_size
+        self._tolerance = tolerance
+
+    def _shards(self) -> list:
+        """Return the (s, j_start, j_end) shards in emission order: decreasing s, then decreasing j."""
+        n = self._qsp.get_n()
+        shards = []
+        for s in range(n, 0, -1):
+            for j_end in range(2 ** (n - s), 0, -self._shard_size):
+                shards.append((s, max(1, j_end - self._shard_size + 1), j_end))
+        return shards
+
+    def write_gate_stream(self, file_path: str, file_format: str = "openqasm", braket_dialect: bool = False) -> int:
+        """
+        Write the full QSP circuit to a file, formatting the shards in parallel.
+
+        Args:
+            file_path (str): The path of the file to write.
+            file_format (str): "openqasm" for an OpenQASM 3 program or "jsonl" for one JSON gate record per line.
+            braket_dialect (bool): See GateSequence.to_openqasm.
+
+        Returns:
+            int: The number of gate records written.
+        """
+        if file_format not in ("openqasm", "jsonl"):
+            raise ValueError("File format needs to be either 'openqasm' or 'jsonl'.")
+        n = self._qsp.get_n()
+        ry_angle_levels = [self._qsp.get_ry_angle_level(s) for s in range(1, n + 1)]
+        rz_angle_levels = [self._qsp.get_rz_angle_level(s) for s in range(1, n + 1)]
+        dtype = np.result_type(*ry_angle_levels, *rz_angle_levels)
+        shared_block = shared_memory.SharedMemory(create=True, size=2 * (2 ** n - 1) * dtype.itemsize)
+        gate_count = 0
+        try:
+            shared_angles = np.ndarray((2, 2 ** n - 1), dtype=dtype, buffer=shared_block.buf)
+            np.concatenate(ry_angle_levels, out=shared_angles[0])
+            np.concatenate(rz_angle_levels, out=shared_angles[1])
+
+            shards = self._shards()
+            with open(file_path, "w") as stream_file, \
+                    ProcessPoolExecutor(max_workers=self._max_workers, initializer=_attach_shared_angle_tree,
+                                        initargs=(shared_block.name, n, dtype.str)) as executor:
+                if file_format == "openqasm":
+                    stream_file.writelines(line + "\n" for line in GateSequence._openqasm_header_lines(n, braket_dialect))
+                # map hands back the segments in shard order while the workers format the following shards
+                emit_shard = partial(_emit_shard, tolerance=self._tolerance, file_format=file_format, braket_dialect=braket_dialect)
+                for text, shard_gate_count in executor.map(emit_shard, *zip(*shards)):
+                    stream_file.write(text)
+                    gate_count += shard_gate_count
+            del shared_angles
+        finally:
+            shared_block.close()
+            shared_block.unlink()
+        return gate_count
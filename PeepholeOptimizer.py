@@ -0,0 +1,122 @@
+import numpy as np
+from braket.circuits import Circuit, Instruction
+
+class PeepholeOptimizer:
+    """
+    Class for removing redundant gates from a constructed quantum circuit.
+    Adjacent self-inverse gate pairs (e.g., the back-to-back X layers emitted by consecutive
+    anti-controlled rotations) are cancelled, and adjacent same-axis rotations acting on the
+    same target with the same controls are merged into a single rotation.
+    """
+
+    SELF_INVERSE_GATES = ("X", "Y", "Z", "H", "CNot", "CZ", "Swap")
+    MERGEABLE_ROTATION_GATES = ("Rx", "Ry", "Rz")
+
+    def __init__(self, circuit: Circuit, tolerance: float = 1e-100):
+        """
+        Initialize the PeepholeOptimizer with the circuit to optimize.
+
+        Args:
+            circuit (Circuit): The quantum circuit to optimize.
+            tolerance (float): A small value to determine if a merged rotation angle is close enough to zero to drop the rotation.
+        """
+        self._circuit = circuit
+        self._tolerance = tolerance
+        self._gate_count_reduction = {}
+
+    def get_gate_count_reduction(self) -> dict:
+        """Return the gate counts before and after the last optimization together with the applied rewrites."""
+        return self._gate_count_reduction
+
+    @staticmethod
+    def _instruction_qubits(instruction: Instruction) -> frozenset:
+        """Return the set of qubits (targets and controls) an instruction acts on."""
+        return frozenset(int(qubit) for qubit in instruction.target) | frozenset(int(qubit) for qubit in instruction.control)
+
+    @staticmethod
+    def _has_same_qubits(previous: Instruction, current: Instruction) -> bool:
+        """Check that two instructions act on the same targets with the same controls and control state."""
+        return (previous.target == current.target
+                and previous.control == current.control
+                and previous.control_state == current.control_state
+                and previous.power == current.power)
+
+    def _is_cancelling_pair(self, previous: Instruction, current: Instruction) -> bool:
+        """Check that two adjacent instructions are the same self-inverse gate and thus multiply to identity."""
+        gate_name = type(current.operator).__name__
+        return (gate_name in self.SELF_INVERSE_GATES
+                and type(previous.operator).__name__ == gate_name
+                and self._has_same_qubits(previous, current))
+
+    def _merged_rotation_angle(self, previous: Instruction, current: Instruction):
+        """Return the angle of the merged rotation if two adjacent instructions can be merged, otherwise None."""
+        gate_name = type(current.operator).__name__
+        if gate_name not in self.MERGEABLE_ROTATION_GATES or type(previous.operator).__name__ != gate_name:
+            return None
+        if not self._has_same_qubits(previous, current):
+            return None
+        if not isinstance(previous.operator.angle, (int, float)) or not isinstance(current.operator.angle, (int, float)):
+            return None
+        return previous.operator.angle + current.operator.angle
+
+    def optimize(self) -> Circuit:
+        """
+        Cancel adjacent self-inverse gate pairs and merge adjacent same-axis rotations.
+        Two instructions are adjacent when they act on the same qubits and no instruction in between
+        touches any of those qubits. Rewrites cascade, e.g., X X X X on a qubit is removed entirely.
+
+        Returns:
+            Circuit: The optimized quantum circuit.
+        """
+        optimized_instructions = []
+        qubit_stacks = {}
+        cancelled_gate_count = 0
+        merged_rotation_count = 0
+        removed_rotation_count = 0
+
+        for instruction in self._circuit.instructions:
+            qubits = self._instruction_qubits(instruction)
+            top_indices = {qubit_stacks[qubit][-1] if qubit_stacks.get(qubit) else None for qubit in qubits}
+            previous_index = top_indices.pop() if len(top_indices) == 1 else None
+
+            if previous_index is not None and self._instruction_qubits(optimized_instructions[previous_index]) == qubits:
+                previous = optimized_instructions[previous_index]
+                if self._is_cancelling_pair(previous, instruction):
+                    cancelled_gate_count += 2
+                    self._remove_instruction(optimized_instructions, qubit_stacks, previous_index, qubits)
+                    continue
+                merged_angle = self._merged_rotation_angle(previous, instruction)
+                if merged_angle is not None:
+                    merged_rotation_count += 1
+                    if np.abs(merged_angle) > self._tolerance:
+                        optimized_instructions[previous_index] = Instruction(
+                            type(instruction.operator)(merged_angle), target=instruction.target,
+                            control=instruction.control, control_state=instruction.control_state, power=instruction.power)
+                    else:
+                        removed_rotation_count += 1
+                        self._remove_instruction(optimized_instructions, qubit_stacks, previous_index, qubits)
+                    continue
+
+            for qubit in qubits:
+                qubit_stacks.setdefault(qubit, []).append(len(optimized_instructions))
+            optimized_instructions.append(instruction)
+
+        optimized_circ = Circuit([instruction for instruction in optimized_instructions if instruction is not None])
+        for result_type in self._circuit.result_types:
+            optimized_circ.add_result_type(result_type)
+
+        self._gate_count_reduction = {
+            "gate_count_before": len(self._circuit.instructions),
+            "gate_count_after": len(optimized_circ.instructions),
+            "cancelled_gates": cancelled_gate_count,
+            "merged_rotations": merged_rotation_count,
+            "removed_rotations": removed_rotation_count,
+        }
+        return optimized_circ
+
+    @staticmethod
+    def _remove_instruction(optimized_instructions: list, qubit_stacks: dict, index: int, qubits: frozenset):
+        """Remove an already emitted instruction that sits on top of the stacks of all its qubits."""
+        optimized_instructions[index] = None
+        for qubit in qubits:
+            qubit_stacks[qubit].pop()
@@ -0,0 +1,138 @@
+import contextvars
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# the profiler of the current thread or task, None while profiling is disabled
+_active_profiler = contextvars.ContextVar("active_profiler", default=None)
+_disabled_phase = nullcontext()
+
+class PipelineProfiler:
+    """
+    Class for opt-in instrumentation of the QSP pipeline. While a profiler is active (as a context manager),
+    the pipeline records the wall time, CPU time and optionally the peak memory of every phase (validation,
+    angle computation, gate generation, backend emission, ...), the emitted and skipped rotations per level s
+    and the sizes of the large arrays it allocates. When no profiler is active, every instrumentation point
+    costs a single context variable lookup.
+    """
+
+    def __init__(self, track_memory: bool = False, callback=None):
+        """
+        Initialize the PipelineProfiler.
+
+        Args:
+            track_memory (bool): Whether to record the peak traced memory of every phase with tracemalloc, which
+                slows down allocations considerably while active.
+            callback: An optional function called as callback(phase, measurement) after every phase, e.g. to
+                forward the timings to a metrics service. measurement holds "wall_time", "cpu_time" and "peak_memory".
+        """
+        self._track_memory = track_memory
+        self._callback = callback
+        self._phases = {}
+        self._levels = {}
+        self._allocations = {}
+        self._tokens = []
+        self._started_tracing = False
+        # [memory at phase entry, highest peak seen] of the open phases, innermost last
+        self._memory_stack = []
+
+    def __enter__(self):
+        self._tokens.append(_active_profiler.set(self))
+        if self._track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active_profiler.reset(self._tokens.pop())
+        if self._started_tracing and not self._tokens:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    @staticmethod
+    def get_active():
+        """Return the active profiler, or None while profiling is disabled."""
+        return _active_profiler.get()
+
+    @staticmethod
+    def phase(name: str):
+        """
+        Return a context manager measuring a pipeline phase on the active profiler, or a no-op context manager
+        while profiling is disabled.
+
+        Args:
+            name (str): The name of the phase. Repeated and nested phases are accumulated per name.
+        """
+        profiler = _active_profiler.get()
+        return _disabled_phase if profiler is None else profiler._measure_phase(name)
+
+    @contextmanager
+    def _measure_phase(self, name: str):
+        if self._track_memory:
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            if self._memory_stack:
+                # the enclosing phase keeps its peak although the tracemalloc peak is reset for this one
+                self._memory_stack[-1][1] = max(self._memory_stack[-1][1], peak_memory)
+            tracemalloc.reset_peak()
+            self._memory_stack.append([current_memory, current_memory])
+        start_wall_time = time.perf_counter()
+        start_cpu_time = time.process_time()
+        try:
+            yield
+        finally:
+            measurement = {"wall_time": time.perf_counter() - start_wall_time,
+                           "cpu_time": time.process_time() - start_cpu_time,
+                           "peak_memory": None}
+            if self._track_memory:
+                start_memory, peak_memory = self._memory_stack.pop()
+                peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+                measurement["peak_memory"] = peak_memory - start_memory
+                if self._memory_stack:
+                    self._memory_stack[-1][1] = max(self._memory_stack[-1][1], peak_memory)
+            self._record_phase(name, measurement)
+
+    def _record_phase(self, name: str, measurement: dict):
+        phase = self._phases.setdefault(name, {"calls": 0, "wall_time": 0.0, "cpu_time": 0.0, "peak_memory": None})
+        phase["calls"] += 1
+        phase["wall_time"] += measurement["wall_time"]
+        phase["cpu_time"] += measurement["cpu_time"]
+        if measurement["peak_memory"] is not None:
+            phase["peak_memory"] = max(phase["peak_memory"] or 0, measurement["peak_memory"])
+        if self._callback is not None:
+            self._callback(name, measurement)
+
+    def record_level(self, s: int, gate_count: int, emitted_rotations: int, skipped_rotations: int):
+        """
+        Accumulate the gate counts of level s of a constructed circuit.
+
+        Args:
+            s (int): As it appears in equation 4.30 in the ML with QC book.
+            gate_count (int): The number of emitted gate records (rotations, X and CNOT gates).
+            emitted_rotations (int): The number of emitted Ry and Rz rotations.
+            skipped_rotations (int): The number of Ry and Rz rotations dropped as zero within the tolerance.
+        """
+        level = self._levels.setdefault(s, {"gate_count": 0, "emitted_rotations": 0, "skipped_rotations": 0})
+        level["gate_count"] += gate_count
+        level["emitted_rotations"] += emitted_rotations
+        level["skipped_rotations"] += skipped_rotations
+
+    def record_allocation(self, name: str, nbytes: int):
+        """Accumulate the size in bytes and the number of the arrays allocated for name."""
+        allocation = self._allocations.setdefault(name, {"count": 0, "nbytes": 0})
+        allocation["count"] += 1
+        allocation["nbytes"] += int(nbytes)
+
+    def get_report(self) -> dict:
+        """
+        Return the recorded measurements.
+
+        Returns:
+            dict: "phases" maps every phase name to its "calls", total "wall_time" and "cpu_time" and the largest
+                "peak_memory" (None without track_memory), "levels" maps every level s (in decreasing s, the
+                construction order) to its "gate_count", "emitted_rotations" and "skipped_rotations", and
+                "allocations" maps every array name to its "count" and total "nbytes".
+        """
+        return {"phases": {name: dict(phase) for name, phase in self._phases.items()},
+                "levels": {s: dict(self._levels[s]) for s in sorted(self._levels, reverse=True)},
+                "allocations": {name: dict(allocation) for name, allocation in self._allocations.items()}}
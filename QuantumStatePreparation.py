@@ -1,4 +1,6 @@
+import os
 import numpy as np
+from PipelineProfiler import PipelineProfiler
 
 class QuantumStatePreparation:
     """
@@ -6,34 +8,253 @@ class QuantumStatePreparation:
     from a normalized complex array.
     """
 
-    def __init__(self, normalized_complex_array: np.ndarray):
+    def __init__(self, normalized_complex_array: np.ndarray, dtype=np.float64, keep_amplitude_arrays: bool = True):
         """
         Initialize the QuantumStatePreparation with a normalized complex array.
 
         Args:
             normalized_complex_array (np.ndarray): A normalized complex array representing the quantum state.
+            dtype: The precision of the amplitudes, phases and rotation angles, np.float64 or np.float32
+                (np.complex128 and np.complex64 select the same). float32 halves the memory and bandwidth of
+                the angle computation, see compute_angle_error_bounds for the resulting angle errors.
+            keep_amplitude_arrays (bool): If False, the amplitude and phase arrays are only used to compute the angle
+                tree and released afterwards, so only a reference to the input is kept. get_amplitude_array and
+                get_phase_array then derive them from the input on every call and update_amplitudes is unavailable.
         """
+        dtype = self._validate_dtype(dtype)
         self._normalized_complex_array = normalized_complex_array
-        self._amplitude_array = np.abs(normalized_complex_array)
-        self._phase_array = np.angle(normalized_complex_array)
+        with PipelineProfiler.phase("input_conversion"):
+            self._amplitude_array, self._phase_array = self._compute_amplitude_phase_arrays(normalized_complex_array, dtype)
         self._array_len = len(normalized_complex_array)
         self._n = int(np.log2(self._array_len))
 
-        # Validate that the array length is a power of 2
-        if not (self._array_len > 0 and (self._array_len & (self._array_len - 1)) == 0):
+        with PipelineProfiler.phase("validation"):
+            # Validate that the array length is a power of 2
+            if not (self._array_len > 0 and (self._array_len & (self._array_len - 1)) == 0):
+                raise ValueError("Wave function array needs to have length as power of 2. Consider padding it with zeros.")
+
+            # Validate that the array is normalized
+            l2_norm = np.linalg.norm(normalized_complex_array, ord=2)
+            if abs(l2_norm - 1) >= self._normalization_tolerance(self._array_len, np.asarray(normalized_complex_array).dtype):
+                raise ValueError("Wave function array needs to be normalized.")
+
+        profiler = PipelineProfiler.get_active()
+        if profiler is not None:
+            profiler.record_allocation("input_arrays", self._amplitude_array.nbytes + self._phase_array.nbytes)
+        with PipelineProfiler.phase("angle_computation"):
+            if keep_amplitude_arrays:
+                self._ry_angle_tree, self._rz_angle_tree = self.compute_angle_tree(self._amplitude_array, self._phase_array)
+            else:
+                # the amplitudes are squared in place since they are released afterwards
+                squared_amplitude_array = np.square(self._amplitude_array, out=self._amplitude_array)
+                self._ry_angle_tree, self._rz_angle_tree = self._compute_angle_levels(squared_amplitude_array, self._phase_array)[:2]
+                self._amplitude_array = None
+                self._phase_array = None
+        if profiler is not None:
+            profiler.record_allocation("angle_tree", sum(level.nbytes for level in self._ry_angle_tree + self._rz_angle_tree))
+        self._block_index_tree = None
+        self._squared_amplitude_tree = None
+        self._phase_sum_tree = None
+        self._norm_scale = 1.0
+        self._initialize_circuit_state()
+
+    @classmethod
+    def from_sparse(cls, n: int, indices, values=None):
+        """
+        Create the state preparation from the nonzero entries of a sparse state without materialising the
+        length-2^n array. Only the angles of the blocks that hold nonzero amplitudes are computed, by walking
+        the binary prefix tree of the occupied indices, so the cost scales with nnz * n instead of 2^n.
+        The dense amplitude and phase arrays are not available on the returned object.
+
+        Args:
+            n (int): The number of qubits.
+            indices: A 1d array of the nonzero indices (COO format), or a dict mapping index to amplitude.
+            values: A 1d array of the corresponding amplitudes. Omitted when indices is a dict.
+
+        Returns:
+            QuantumStatePreparation: The state preparation instance.
+        """
+        if isinstance(indices, dict):
+            indices, values = list(indices.keys()), list(indices.values())
+        indices = np.asarray(indices, dtype=np.int64)
+        values = np.asarray(values)
+        input_dtype = values.dtype
+        values = values.astype(np.complex128, copy=False)
+
+        if not 0 < n < 63:
+            raise ValueError("Number of qubits needs to be between 1 and 62 for sparse states.")
+        if indices.ndim != 1 or indices.shape != values.shape:
+            raise ValueError("Sparse indices and values need to be 1d arrays of the same length.")
+        with PipelineProfiler.phase("validation"):
+            if len(indices) == 0 or np.any(indices < 0) or np.any(indices >= 2 ** n):
+                raise ValueError("Sparse indices need to be non-empty and lie in [0, 2^n).")
+            order = np.argsort(indices, kind="stable")
+            indices = indices[order]
+            values = values[order]
+            if np.any(indices[1:] == indices[:-1]):
+                raise ValueError("Sparse indices need to be unique.")
+            l2_norm = np.linalg.norm(values, ord=2)
+            if abs(l2_norm - 1) >= cls._normalization_tolerance(len(values), input_dtype):
+                raise ValueError("Wave function array needs to be normalized.")
+
+        with PipelineProfiler.phase("angle_computation"):
+            block_index_tree, ry_angle_tree, rz_angle_tree = cls.compute_sparse_angle_tree(n, indices, np.abs(values), np.angle(values))
+        profiler = PipelineProfiler.get_active()
+        if profiler is not None:
+            profiler.record_allocation("angle_tree", sum(level.nbytes for level in ry_angle_tree + rz_angle_tree + block_index_tree))
+        return cls.from_angle_tree(n, ry_angle_tree, rz_angle_tree, block_index_tree)
+
+    @classmethod
+    def from_chunked_array(cls, normalized_complex_array, chunk_size: int = 2 ** 20, angle_tree_directory: str = None,
+                           dtype=np.float64):
+        """
+        Create the state preparation from an array too large to hold in memory several times over, e.g. a .npy file
+        opened with np.load(path, mmap_mode="r"). The input is read chunk by chunk; the amplitudes and phases of
+        one chunk are derived, reduced into the angles of the levels that fit inside the chunk and discarded, and
+        the levels above are computed from the per-chunk sums. The working set is thus about 64 bytes per amplitude
+        of a chunk on top of the angle tree, whose large levels can be written to .npy files as well.
+        The angles are identical to the ones of the constructor. The amplitude and phase arrays are not stored,
+        get_amplitude_array and get_phase_array derive them from the input on every call.
+
+        Args:
+            normalized_complex_array: A normalized complex array supporting slicing, e.g. a np.memmap,
+                or the path of a .npy file to memory-map.
+            chunk_size (int): The number of amplitudes read at a time, a power of 2.
+            angle_tree_directory (str): If given, the angle levels inside a chunk are stored as .npy files
+                ry_angle_level_<s>.npy and rz_angle_level_<s>.npy in this existing directory instead of in memory.
+            dtype: The precision of the amplitudes, phases and rotation angles, see the constructor.
+
+        Returns:
+            QuantumStatePreparation: The state preparation instance.
+        """
+        if isinstance(normalized_complex_array, str):
+            normalized_complex_array = np.load(normalized_complex_array, mmap_mode="r")
+        array_len = len(normalized_complex_array)
+        if not (array_len > 0 and (array_len & (array_len - 1)) == 0):
             raise ValueError("Wave function array needs to have length as power of 2. Consider padding it with zeros.")
-        
+        if not (chunk_size > 0 and (chunk_size & (chunk_size - 1)) == 0):
+            raise ValueError("Chunk size needs to be a power of 2.")
+        dtype = cls._validate_dtype(dtype)
+        chunk_size = min(chunk_size, array_len)
+        n = int(np.log2(array_len))
+        chunk_n = int(np.log2(chunk_size))
+
+        ry_angle_tree = []
+        rz_angle_tree = []
+        for s in range(1, chunk_n + 1):
+            for rotation_type, angle_tree in (("ry", ry_angle_tree), ("rz", rz_angle_tree)):
+                if angle_tree_directory is None:
+                    angle_tree.append(np.empty(2 ** (n - s), dtype=dtype))
+                else:
+                    angle_tree.append(np.lib.format.open_memmap(os.path.join(angle_tree_directory, f"{rotation_type}_angle_level_{s}.npy"),
+                                                                mode="w+", dtype=dtype, shape=(2 ** (n - s),)))
+
+        chunk_squared_amplitude_sums = np.empty(array_len // chunk_size, dtype=dtype)
+        chunk_phase_sums = np.empty(array_len // chunk_size, dtype=dtype)
+        with PipelineProfiler.phase("angle_computation"):
+            for k in range(array_len // chunk_size):
+                amplitude_chunk, phase_chunk = cls._compute_amplitude_phase_arrays(
+                    normalized_complex_array[k * chunk_size:(k + 1) * chunk_size], dtype)
+                ry_angle_levels, rz_angle_levels, squared_amplitude_root, phase_sum_root = cls._compute_angle_levels(
+                    np.square(amplitude_chunk, out=amplitude_chunk), phase_chunk)
+                for s in range(1, chunk_n + 1):
+                    level_slice = slice(k * 2 ** (chunk_n - s), (k + 1) * 2 ** (chunk_n - s))
+                    ry_angle_tree[s - 1][level_slice] = ry_angle_levels[s - 1]
+                    rz_angle_tree[s - 1][level_slice] = rz_angle_levels[s - 1]
+                chunk_squared_amplitude_sums[k] = squared_amplitude_root[0]
+                chunk_phase_sums[k] = phase_sum_root[0]
+
+            ry_angle_levels, rz_angle_levels, squared_amplitude_root, _ = cls._compute_angle_levels(
+                chunk_squared_amplitude_sums, chunk_phase_sums, first_s=chunk_n + 1)
         # Validate that the array is normalized
-        l2_norm = np.linalg.norm(normalized_complex_array, ord=2)
-        if abs(l2_norm - 1) >= 1e-7:
+        if abs(np.sqrt(squared_amplitude_root[0]) - 1) >= cls._normalization_tolerance(array_len, np.asarray(normalized_complex_array[:1]).dtype, dtype):
             raise ValueError("Wave function array needs to be normalized.")
+        profiler = PipelineProfiler.get_active()
+        if profiler is not None and angle_tree_directory is None:
+            profiler.record_allocation("angle_tree", sum(level.nbytes for level in ry_angle_tree + rz_angle_tree + ry_angle_levels + rz_angle_levels))
+
+        qsp = cls.from_angle_tree(n, ry_angle_tree + ry_angle_levels, rz_angle_tree + rz_angle_levels)
+        qsp._normalized_complex_array = normalized_complex_array
+        return qsp
+
+    @classmethod
+    def from_angle_tree(cls, n: int, ry_angle_tree: list, rz_angle_tree: list, block_index_tree: list = None):
+        """
+        Create the state preparation directly from precomputed angles, e.g. one row of a batched angle tree.
+        The amplitude and phase arrays are not available on the returned object.
+
+        Args:
+            n (int): The number of qubits.
+            ry_angle_tree (list): Entry s - 1 holds the Ry angles of level s, as returned by compute_angle_tree.
+            rz_angle_tree (list): Entry s - 1 holds the Rz angles of level s, as returned by compute_angle_tree.
+            block_index_tree (list): Entry s - 1 holds the occupied block indices j - 1 of level s for sparse
+                angle trees, as returned by compute_sparse_angle_tree. None for dense angle trees.
+
+        Returns:
+            QuantumStatePreparation: The state preparation instance.
+        """
+        qsp = cls.__new__(cls)
+        qsp._normalized_complex_array = None
+        qsp._amplitude_array = None
+        qsp._phase_array = None
+        qsp._array_len = 2 ** n
+        qsp._n = n
+        qsp._ry_angle_tree = ry_angle_tree
+        qsp._rz_angle_tree = rz_angle_tree
+        qsp._block_index_tree = block_index_tree
+        qsp._squared_amplitude_tree = None
+        qsp._phase_sum_tree = None
+        qsp._norm_scale = 1.0
+        qsp._initialize_circuit_state()
+        return qsp
+
+    def _initialize_circuit_state(self):
+        """Hook for subclasses to set up their circuit construction state on every new instance."""
+        pass
+
+    @staticmethod
+    def _validate_dtype(dtype) -> np.dtype:
+        """Return the real floating point dtype selected by dtype, float32 or float64."""
+        dtype = np.dtype(dtype)
+        if dtype.kind not in "fc" or np.finfo(dtype).dtype not in (np.float32, np.float64):
+            raise ValueError("Dtype needs to be either float32 or float64.")
+        return np.finfo(dtype).dtype
+
+    @staticmethod
+    def _normalization_tolerance(array_len: int, *dtypes) -> float:
+        """
+        Return the tolerance of the normalization check of array_len amplitudes stored or summed in the given dtypes.
+        The rounding of single precision inputs alone moves the norm by about the float32 epsilon, so the tolerance
+        grows with the epsilon of the least precise floating point dtype and sqrt(array_len) above 1e-7.
+        """
+        epsilons = [np.finfo(dtype).eps for dtype in map(np.dtype, dtypes) if dtype.kind in "fc"]
+        return max(1e-7, 2 * max(epsilons, default=0.0) * np.sqrt(array_len))
+
+    @staticmethod
+    def _compute_amplitude_phase_arrays(normalized_complex_array, dtype=np.float64) -> tuple:
+        """
+        Compute the amplitudes and phases of the input directly into arrays of dtype, so a float32 conversion
+        does not allocate float64 intermediates of the input size. The phases equal np.angle.
+        """
+        amplitude_array = np.empty(np.shape(normalized_complex_array), dtype=dtype)
+        phase_array = np.empty_like(amplitude_array)
+        np.abs(normalized_complex_array, out=amplitude_array)
+        np.arctan2(np.imag(normalized_complex_array), np.real(normalized_complex_array), out=phase_array)
+        return amplitude_array, phase_array
 
     def get_amplitude_array(self) -> np.ndarray:
         """Return the amplitude array for debugging purposes."""
-        return self._amplitude_array
+        if self._amplitude_array is None and self._normalized_complex_array is not None:
+            # instances created through from_chunked_array or with keep_amplitude_arrays=False derive it from the input on request
+            return np.abs(self._normalized_complex_array)
+        if self._norm_scale == 1.0:
+            return self._amplitude_array
+        return self._amplitude_array * self._norm_scale
     
     def get_phase_array(self) -> np.ndarray:
         """Return the phase array for debugging purposes."""
+        if self._phase_array is None and self._normalized_complex_array is not None:
+            return np.angle(self._normalized_complex_array)
         return self._phase_array
     
     def get_array_len(self) -> int:
@@ -44,9 +265,401 @@ class QuantumStatePreparation:
         """Return the number of qubits for debugging purposes."""
         return self._n
 
+    def is_sparse(self) -> bool:
+        """Return whether the instance was created from a sparse state."""
+        return self._block_index_tree is not None
+
+    def get_block_index_tree(self) -> list:
+        """Return the occupied block indices j - 1 of every level for sparse instances, None for dense ones, for debugging purposes."""
+        return self._block_index_tree
+
+    def _densify_angle_level(self, s: int, angle_level: np.ndarray) -> np.ndarray:
+        """Scatter the angles of the occupied blocks of level s into a dense array of length 2^(n-s)."""
+        if self._block_index_tree is None:
+            return angle_level
+        dense_angle_level = np.zeros(2 ** (self._n - s), dtype=angle_level.dtype)
+        dense_angle_level[self._block_index_tree[s - 1]] = angle_level
+        return dense_angle_level
+
+    def get_ry_angle_level(self, s: int) -> np.ndarray:
+        """Return the Ry angles of all j at level s (index j - 1) for debugging purposes. Sparse levels are densified."""
+        return self._densify_angle_level(s, self._ry_angle_tree[s - 1])
+
+    def get_rz_angle_level(self, s: int) -> np.ndarray:
+        """Return the Rz angles of all j at level s (index j - 1) for debugging purposes. Sparse levels are densified."""
+        return self._densify_angle_level(s, self._rz_angle_tree[s - 1])
+
+    def get_nontrivial_rotation_angles(self, s: int) -> tuple:
+        """
+        Return the rotation angles of level s for every j whose block may hold a nonzero amplitude.
+
+        Args:
+            s (int): As it appears in equation 4.30 in the ML with QC book.
+
+        Returns:
+            tuple: Three aligned arrays (j_array, ry_angle_array, rz_angle_array) in increasing order of j.
+                For dense states j covers 1, ..., 2^(n-s); for sparse states only the occupied blocks are listed.
+        """
+        if self._block_index_tree is None:
+            j_array = np.arange(1, 2 ** (self._n - s) + 1)
+        else:
+            j_array = self._block_index_tree[s - 1] + 1
+        return j_array, self._ry_angle_tree[s - 1], self._rz_angle_tree[s - 1]
+
+    @staticmethod
+    def _ry_angle_from_squared_sums(sum_top: np.ndarray, sum_total: np.ndarray) -> np.ndarray:
+        """Compute the Ry angles 2 arcsin(sqrt(sum_top / sum_total)) of a level, with zero angles for empty blocks."""
+        # only an exactly empty block is skipped; an absolute tolerance would zero out legitimate small blocks at large n
+        is_zero_block = sum_total == 0.0
+        ratio = np.divide(sum_top, sum_total, out=np.zeros_like(sum_top), where=~is_zero_block)
+        return 2 * np.arcsin(np.sqrt(ratio))
+
+    @staticmethod
+    def compute_angle_tree(amplitude_array: np.ndarray, phase_array: np.ndarray) -> tuple:
+        """
+        Compute the Ry and Rz rotation angles of every level in one bottom-up pass.
+
+        Level s is obtained from level s - 1 by summing neighbouring pairs of the squared amplitudes
+        and of the phases, so the whole tree costs O(N) instead of re-slicing the input for every (s, j).
+        Leading axes of the input arrays are treated as batch axes.
+
+        Args:
+            amplitude_array (np.ndarray): Array of shape (..., 2^n) holding the amplitudes.
+            phase_array (np.ndarray): Array of shape (..., 2^n) holding the phases.
+
+        Returns:
+            tuple: Two lists (ry_angle_tree, rz_angle_tree) of length n. Entry s - 1 is an array of shape
+                (..., 2^(n-s)) whose element j - 1 is the angle of the <s, j> instance in equation 4.30.
+        """
+        return QuantumStatePreparation._compute_angle_levels(amplitude_array ** 2, phase_array)[:2]
+
+    @staticmethod
+    def _compute_angle_levels(squared_amplitude_level: np.ndarray, phase_sum_level: np.ndarray, first_s: int = 1) -> tuple:
+        """
+        Compute the angles of levels first_s, first_s + 1, ... up to the root from the squared-amplitude and phase
+        sums of the blocks of level first_s - 1, see compute_angle_tree.
+
+        Args:
+            squared_amplitude_level (np.ndarray): Array of shape (..., 2^k) holding the squared-amplitude sums of the blocks.
+            phase_sum_level (np.ndarray): Array of shape (..., 2^k) holding the phase sums of the blocks.
+            first_s (int): The level whose angles are computed first.
+
+        Returns:
+            tuple: (ry_angle_levels, rz_angle_levels, squared_amplitude_root, phase_sum_root) with the k levels of
+                angles and the sums over all blocks, of shape (..., 1).
+        """
+        batch_shape = squared_amplitude_level.shape[:-1]
+        ry_angle_levels = []
+        rz_angle_levels = []
+        for s in range(first_s, first_s + int(np.log2(squared_amplitude_level.shape[-1]))):
+            squared_amplitude_pairs = squared_amplitude_level.reshape(*batch_shape, -1, 2)
+            phase_sum_pairs = phase_sum_level.reshape(*batch_shape, -1, 2)
+            sum_top = squared_amplitude_pairs[..., 1]
+            squared_amplitude_level = squared_amplitude_pairs.sum(axis=-1)
+            phase_sum_level = phase_sum_pairs.sum(axis=-1)
+
+            ry_angle_levels.append(QuantumStatePreparation._ry_angle_from_squared_sums(sum_top, squared_amplitude_level))
+            rz_angle_levels.append((phase_sum_pairs[..., 1] - phase_sum_pairs[..., 0]) / (2 ** (s - 1)))
+        return ry_angle_levels, rz_angle_levels, squared_amplitude_level, phase_sum_level
+
+    @staticmethod
+    def compute_sparse_angle_tree(n: int, sorted_indices: np.ndarray, amplitude_array: np.ndarray, phase_array: np.ndarray) -> tuple:
+        """
+        Compute the Ry and Rz rotation angles of the occupied blocks of every level in one bottom-up pass.
+
+        At every level, neighbouring occupied blocks that share a parent are merged, so all-zero subtrees
+        are never visited and the whole tree costs O(nnz * n).
+
+        Args:
+            n (int): The number of qubits.
+            sorted_indices (np.ndarray): The nonzero indices in increasing order.
+            amplitude_array (np.ndarray): The amplitudes at sorted_indices.
+            phase_array (np.ndarray): The phases at sorted_indices.
+
+        Returns:
+            tuple: Three lists (block_index_tree, ry_angle_tree, rz_angle_tree) of length n. Entry s - 1 holds the
+                increasing block indices j - 1 of the occupied blocks of level s and their angles.
+        """
+        block_index_tree = []
+        ry_angle_tree = []
+        rz_angle_tree = []
+        block_index_level = sorted_indices
+        squared_amplitude_level = amplitude_array ** 2
+        phase_sum_level = phase_array
+        for s in range(1, n + 1):
+            parent_index = block_index_level >> 1
+            is_top = (block_index_level & 1).astype(bool)
+            parent_start = np.concatenate(([0], np.flatnonzero(parent_index[1:] != parent_index[:-1]) + 1))
+
+            sum_top = np.add.reduceat(np.where(is_top, squared_amplitude_level, 0.0), parent_start)
+            phase_sum_top = np.add.reduceat(np.where(is_top, phase_sum_level, 0.0), parent_start)
+            phase_sum_bottom = np.add.reduceat(np.where(is_top, 0.0, phase_sum_level), parent_start)
+            block_index_level = parent_index[parent_start]
+            squared_amplitude_level = np.add.reduceat(squared_amplitude_level, parent_start)
+            phase_sum_level = np.add.reduceat(phase_sum_level, parent_start)
+
+            block_index_tree.append(block_index_level)
+            ry_angle_tree.append(QuantumStatePreparation._ry_angle_from_squared_sums(sum_top, squared_amplitude_level))
+            rz_angle_tree.append((phase_sum_top - phase_sum_bottom) / (2 ** (s - 1)))
+        return block_index_tree, ry_angle_tree, rz_angle_tree
+
+    def _build_sum_tree(self):
+        """Cache the squared-amplitude and phase sums of every block, which incremental updates start from."""
+        self._squared_amplitude_tree = []
+        self._phase_sum_tree = []
+        squared_amplitude_level = self._amplitude_array ** 2
+        phase_sum_level = self._phase_array
+        for s in range(1, self._n + 1):
+            squared_amplitude_level = squared_amplitude_level.reshape(-1, 2).sum(axis=-1)
+            phase_sum_level = phase_sum_level.reshape(-1, 2).sum(axis=-1)
+            self._squared_amplitude_tree.append(squared_amplitude_level)
+            self._phase_sum_tree.append(phase_sum_level)
+
+    def update_amplitudes(self, indices, values, allow_rotation_pattern_change: bool = False, tolerance: float = 1e-100) -> dict:
+        """
+        Change a few amplitudes of the state and renormalise it. Only the angles on the paths from the changed
+        leaves to the root are recomputed, so an update of k amplitudes costs O(k * n) after the block sums
+        have been cached by the first update. Renormalisation does not change any angle, so it is applied
+        lazily to the amplitude array. Circuits constructed before the update are not patched: the next
+        construct_circuit builds a new circuit, or the returned angles are bound into a parametric template.
+
+        Args:
+            indices: A 1d array of the indices to change.
+            values: A 1d array of the new amplitudes, relative to the current normalized state.
+            allow_rotation_pattern_change (bool): Whether the update may turn a rotation that was skipped as zero
+                into a nonzero one, e.g. give Rz rotations to a real state. Such a rotation has no parameter in a
+                template built before the update, so the template has to be rebuilt with construct_parametric_circuit.
+                If False, such an update is rejected and the state is left unchanged.
+            tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero,
+                as in construct_parametric_circuit.
+
+        Returns:
+            dict: The rotations whose angle changed, keyed by the parameter names of
+                construct_parametric_circuit in "multi_control" mode, e.g. {"ry_3_1": 0.52}.
+        """
+        if self._amplitude_array is None:
+            raise ValueError("Amplitude updates need the dense amplitude and phase arrays.")
+        indices = np.asarray(indices, dtype=np.int64)
+        values = np.asarray(values, dtype=np.complex128)
+        if indices.ndim != 1 or indices.shape != values.shape:
+            raise ValueError("Indices and values need to be 1d arrays of the same length.")
+        if len(indices) == 0 or np.any(indices < 0) or np.any(indices >= self._array_len):
+            raise ValueError("Indices need to be non-empty and lie in [0, 2^n).")
+        if len(np.unique(indices)) != len(indices):
+            raise ValueError("Indices need to be unique.")
+        if self._squared_amplitude_tree is None:
+            self._build_sum_tree()
+
+        # the previous entries of every written array, so a rejected update can be rolled back
+        previous_entries = []
+
+        def assign(array, index, new_values):
+            previous_entries.append((array, index, array[index].copy()))
+            array[index] = new_values
+
+        assign(self._amplitude_array, indices, np.abs(values) / self._norm_scale)
+        assign(self._phase_array, indices, np.angle(values))
+
+        changed_rotations = {}
+        appeared_rotations = []
+        block_index_level = indices
+        for s in range(1, self._n + 1):
+            block_index_level = np.unique(block_index_level >> 1)
+            child_index = np.stack((2 * block_index_level, 2 * block_index_level + 1), axis=-1)
+            if s == 1:
+                squared_amplitude_pairs = self._amplitude_array[child_index] ** 2
+                phase_sum_pairs = self._phase_array[child_index]
+            else:
+                squared_amplitude_pairs = self._squared_amplitude_tree[s - 2][child_index]
+                phase_sum_pairs = self._phase_sum_tree[s - 2][child_index]
+            squared_amplitude_level = squared_amplitude_pairs.sum(axis=-1)
+            assign(self._squared_amplitude_tree[s - 1], block_index_level, squared_amplitude_level)
+            assign(self._phase_sum_tree[s - 1], block_index_level, phase_sum_pairs.sum(axis=-1))
+
+            for rotation_type, angle_tree, new_angle_level in (
+                    ("ry", self._ry_angle_tree, self._ry_angle_from_squared_sums(squared_amplitude_pairs[:, 1], squared_amplitude_level)),
+                    ("rz", self._rz_angle_tree, (phase_sum_pairs[:, 1] - phase_sum_pairs[:, 0]) / (2 ** (s - 1)))):
+                previous_angle_level = angle_tree[s - 1][block_index_level]
+                changed = previous_angle_level != new_angle_level
+                appeared = (np.abs(previous_angle_level) <= tolerance) & (np.abs(new_angle_level) > tolerance)
+                assign(angle_tree[s - 1], block_index_level, new_angle_level)
+                changed_rotations.update((f"{rotation_type}_{s}_{j}", float(angle))
+                                         for j, angle in zip(block_index_level[changed] + 1, new_angle_level[changed]))
+                appeared_rotations.extend(f"{rotation_type}_{s}_{j}" for j in block_index_level[appeared] + 1)
+
+        squared_norm = self._squared_amplitude_tree[-1][0]
+        if squared_norm == 0 or (appeared_rotations and not allow_rotation_pattern_change):
+            for array, index, previous_values in reversed(previous_entries):
+                array[index] = previous_values
+            if squared_norm == 0:
+                raise ValueError("Wave function array needs to have a nonzero norm after the update.")
+            raise ValueError(f"Update needs to keep the pattern of nonzero rotations, but turns on {appeared_rotations[:5]}; "
+                             "pass allow_rotation_pattern_change=True and rebuild the parametric template.")
+
+        self._normalized_complex_array = None
+        self._norm_scale = 1 / np.sqrt(squared_norm)
+        self._initialize_circuit_state()
+        return changed_rotations
+
+    def compute_block_masses(self) -> list:
+        """
+        Compute the probability mass of every block top-down from the Ry angles, i.e. the Ry denominator
+        sum_bottom of equation 4.30, without needing the amplitude array.
+
+        Returns:
+            list: Entry s - 1 holds the masses of the blocks listed by get_nontrivial_rotation_angles(s).
+        """
+        if self._n == 0:
+            return []
+        block_masses = [None] * self._n
+        block_masses[self._n - 1] = np.ones(1)
+        for s in range(self._n, 1, -1):
+            parent_j_array, parent_ry_angle_array, _ = self.get_nontrivial_rotation_angles(s)
+            child_j_array = self.get_nontrivial_rotation_angles(s - 1)[0]
+            parent_position = np.searchsorted(parent_j_array - 1, (child_j_array - 1) >> 1)
+            is_top = ((child_j_array - 1) & 1).astype(bool)
+            half_angle = parent_ry_angle_array[parent_position] / 2
+            branch_probability = np.where(is_top, np.sin(half_angle) ** 2, np.cos(half_angle) ** 2)
+            block_masses[s - 2] = block_masses[s - 1][parent_position] * branch_probability
+        return block_masses
+
+    def compute_pruned_angle_tree(self, target_fidelity: float, tolerance: float = 1e-100) -> tuple:
+        """
+        Zero out rotations so that the prepared state keeps at least target_fidelity with the exact state.
+
+        Dropping the rotations of a whole subtree of mass m leaves its block in |0...0> instead of the normalized
+        sub-state, which moves at most 2 sqrt(m) of norm (the sub-state may be nearly opposite to |0...0> once the
+        Rz phases are involved), and dropping a single Ry/Rz rotation by theta on a block of mass m moves at most
+        2 sqrt(m) |sin(theta / 4)|. By the hybrid argument
+        these costs add up to a bound eps on ||psi - psi'||, so the fidelity is at least (1 - eps^2 / 2)^2.
+        Up to half of the budget is first spent on dropping the maximal subtrees below a mass threshold, the
+        largest threshold whose cost fits, found by scanning all block masses as the cost is not monotone in the
+        threshold, the rest on the cheapest remaining rotations.
+
+        Args:
+            target_fidelity (float): The lower bound on |<psi|psi'>|^2 to keep, in (0, 1].
+            tolerance (float): Rotations at or below this angle are already skipped and cost nothing.
+
+        Returns:
+            tuple: (ry_angle_tree, rz_angle_tree, fidelity_bound) with the pruned angle trees, laid out as the
+                angle trees of this instance, and the achieved lower bound on the fidelity.
+        """
+        if not 0 < target_fidelity <= 1:
+            raise ValueError("Target fidelity needs to lie in (0, 1].")
+        if self._n == 0:
+            return [], [], 1.0
+        error_budget = np.sqrt(2 * (1 - np.sqrt(target_fidelity)))
+        block_masses = self.compute_block_masses()
+        levels = range(1, self._n + 1)
+        rotation_angles = [self.get_nontrivial_rotation_angles(s) for s in levels]
+
+        # a subtree is maximal below threshold when its own mass is at most the threshold but its parent's is not
+        parent_masses = [block_masses[s][np.searchsorted(rotation_angles[s][0] - 1, (rotation_angles[s - 1][0] - 1) >> 1)]
+                         if s < self._n else np.full(1, np.inf) for s in levels]
+
+        def subtree_cost(mass_threshold):
+            return sum(2 * np.sum(np.sqrt(block_masses[s - 1][(block_masses[s - 1] <= mass_threshold) & (parent_masses[s - 1] > mass_threshold)]))
+                       for s in levels)
+
+        # a block of mass m is a maximal subtree for the thresholds in [m, parent mass), so a difference array over
+        # the sorted candidate thresholds accumulates the cost of every candidate in one pass
+        candidate_thresholds = np.unique(np.concatenate(block_masses))
+        cost_differences = np.zeros(len(candidate_thresholds) + 1)
+        for s in levels:
+            subtree_costs = 2 * np.sqrt(block_masses[s - 1])
+            np.add.at(cost_differences, np.searchsorted(candidate_thresholds, block_masses[s - 1]), subtree_costs)
+            np.add.at(cost_differences, np.searchsorted(candidate_thresholds, parent_masses[s - 1]), -subtree_costs)
+        candidate_costs = np.cumsum(cost_differences)[:-1]
+
+        # the accumulated costs carry rounding errors, so the feasibility is confirmed with the exact cost
+        mass_threshold, error_bound = -1.0, 0.0
+        for candidate_index in np.flatnonzero(candidate_costs <= error_budget / 2)[::-1]:
+            cost = subtree_cost(candidate_thresholds[candidate_index])
+            if cost <= error_budget / 2:
+                mass_threshold, error_bound = candidate_thresholds[candidate_index], cost
+                break
+
+        ry_angle_tree = []
+        rz_angle_tree = []
+        rotation_costs = []
+        for s in levels:
+            is_kept_block = block_masses[s - 1] > mass_threshold
+            ry_angle_tree.append(np.where(is_kept_block, rotation_angles[s - 1][1], 0.0))
+            rz_angle_tree.append(np.where(is_kept_block, rotation_angles[s - 1][2], 0.0))
+            for angle_level in (ry_angle_tree[-1], rz_angle_tree[-1]):
+                cost = 2 * np.sqrt(block_masses[s - 1]) * np.abs(np.sin(angle_level / 4))
+                rotation_costs.append(np.where(np.abs(angle_level) > tolerance, cost, np.inf))
+
+        all_rotation_costs = np.concatenate(rotation_costs)
+        cost_order = np.argsort(all_rotation_costs, kind="stable")
+        cumulative_costs = error_bound + np.cumsum(all_rotation_costs[cost_order])
+        dropped_count = np.searchsorted(cumulative_costs, error_budget, side="right")
+        if dropped_count > 0:
+            error_bound = cumulative_costs[dropped_count - 1]
+        is_dropped = np.zeros(len(all_rotation_costs), dtype=bool)
+        is_dropped[cost_order[:dropped_count]] = True
+
+        offset = 0
+        for s in levels:
+            for angle_level in (ry_angle_tree[s - 1], rz_angle_tree[s - 1]):
+                angle_level[is_dropped[offset:offset + len(angle_level)]] = 0.0
+                offset += len(angle_level)
+
+        fidelity_bound = max(0.0, 1 - error_bound ** 2 / 2) ** 2
+        return ry_angle_tree, rz_angle_tree, fidelity_bound
+
+    def compute_angle_error_bounds(self) -> tuple:
+        """
+        Bound the rounding errors of the rotation angles, e.g. of an angle tree computed in float32, and the
+        resulting loss of fidelity. The bounds are first order in the unit roundoff u of the angle dtype.
+
+        The squared-amplitude sums of level s carry a relative error of at most (s + 2) u, so the ratio
+        r = sum_top / sum_total of equation 4.30 is off by at most (2 s + 6) u r and, as the derivative of
+        2 arcsin(sqrt(r)) is 1 / sqrt(r (1 - r)), the Ry angle by at most (2 s + 6) u sqrt(r / (1 - r)), capped by
+        2 sqrt(2 (2 s + 6) u) near r = 1, where the angle is ill-conditioned. The phase sums of level s are off by
+        at most 2^(s-1) pi (s + 1) u, so the Rz angles by at most 2 pi (s + 2) u. A rotation off by delta on a block
+        of mass m moves at most sqrt(m) delta / 2 of norm; the blocks of a level are orthogonal and by the hybrid
+        argument the levels add up to a bound eps on ||psi - psi'||, so the fidelity is at least (1 - eps^2 / 2)^2.
+
+        Returns:
+            tuple: (ry_error_bounds, rz_error_bounds, fidelity_bound) where entry s - 1 of the two arrays bounds the
+                error of every Ry (Rz) angle of level s, and fidelity_bound is the lower bound on |<psi|psi'>|^2.
+        """
+        if self._n == 0:
+            return np.zeros(0), np.zeros(0), 1.0
+        unit_roundoff = np.finfo(self._ry_angle_tree[0].dtype).eps / 2
+        block_masses = self.compute_block_masses()
+        ry_error_bounds = np.zeros(self._n)
+        rz_error_bounds = np.zeros(self._n)
+        error_bound = 0.0
+        for s in range(1, self._n + 1):
+            ry_angle_array = self.get_nontrivial_rotation_angles(s)[1]
+            ratio_error = (2 * s + 6) * unit_roundoff
+            top_ratio = np.sin(ry_angle_array.astype(np.float64) / 2) ** 2
+            ratio_sensitivity = np.sqrt(top_ratio / np.maximum(1 - top_ratio, np.finfo(np.float64).tiny))
+            # the square root and arcsin of the angle computation add a few roundings of angles up to pi
+            ry_angle_errors = np.minimum(ratio_error * ratio_sensitivity, 2 * np.sqrt(2 * ratio_error)) + 2 * np.pi * unit_roundoff
+            ry_error_bounds[s - 1] = ry_angle_errors.max()
+            rz_error_bounds[s - 1] = 2 * np.pi * (s + 2) * unit_roundoff
+            error_bound += (np.sqrt(np.sum(block_masses[s - 1] * ry_angle_errors ** 2))
+                            + rz_error_bounds[s - 1] * np.sqrt(np.sum(block_masses[s - 1]))) / 2
+
+        fidelity_bound = max(0.0, 1 - error_bound ** 2 / 2) ** 2
+        return ry_error_bounds, rz_error_bounds, fidelity_bound
+
+    def _lookup_angle(self, angle_tree: list, s: int, j: int) -> float:
+        """Return the angle of the <s, j> instance from an angle tree, which is zero for unoccupied sparse blocks."""
+        if self._block_index_tree is None:
+            return float(angle_tree[s - 1][j - 1])
+        block_index_level = self._block_index_tree[s - 1]
+        position = np.searchsorted(block_index_level, j - 1)
+        if position < len(block_index_level) and block_index_level[position] == j - 1:
+            return float(angle_tree[s - 1][position])
+        return 0.0
+
     def _compute_rz_rotation_angle(self, s: int, j: int) -> float:
         """
-        Compute the Rz rotation angle for given s and j.
+        Return the Rz rotation angle for given s and j from the angle tree.
 
         Args:
             s (int): As it appears in equation 4.30 in the ML with QC book.
@@ -55,10 +668,7 @@ class QuantumStatePreparation:
         Returns:
             float: The computed Rz rotation angle.
         """
-        indices_top = (2 * j - 1) * 2 ** (s - 1) + np.arange(2 ** (s - 1))
-        indices_bottom = (2 * j - 2) * 2 ** (s - 1) + np.arange(2 ** (s - 1))
-        sum_top = np.sum(self._phase_array[indices_top] - self._phase_array[indices_bottom])
-        return sum_top / (2 ** (s - 1))
+        return self._lookup_angle(self._rz_angle_tree, s, j)
     
     def get_rz_rotation_angle(self, s:int, j: int) -> float:
         """Return the the rz angle for a particular <s, j> instance for debugging purposes."""
@@ -66,7 +676,7 @@ class QuantumStatePreparation:
 
     def _compute_ry_rotation_angle(self, s: int, j: int) -> float:
         """
-        Compute the Ry rotation angle for given s and j.
+        Return the Ry rotation angle for given s and j from the angle tree.
 
         Args:
             s (int): As it appears in equation 4.30 in the ML with QC book.
@@ -75,13 +685,7 @@ class QuantumStatePreparation:
         Returns:
             float: The computed Ry rotation angle.
         """
-        top_indices = (2 * j - 1) * 2 ** (s - 1) + np.arange(2 ** (s - 1))
-        sum_top = np.sum(self._amplitude_array[top_indices] ** 2)
-        bottom_indices = (j - 1) * 2 ** s + np.arange(2 ** s)
-        sum_bottom = np.sum(self._amplitude_array[bottom_indices] ** 2)
-        if np.isclose(sum_bottom, 0.0):
-            return 0.0
-        return 2 * np.arcsin(np.sqrt(sum_top / sum_bottom))
+        return self._lookup_angle(self._ry_angle_tree, s, j)
 
     def get_ry_rotation_angle(self, s:int, j: int) -> float:
         """Return the the ry angle for a particular <s, j> instance for debugging purposes."""
@@ -1,6 +1,15 @@
+from __future__ import annotations
+import hashlib
+from collections import OrderedDict
+from typing import TYPE_CHECKING
 import numpy as np
-from braket.circuits import Circuit
 from QuantumStatePreparation import QuantumStatePreparation
+from GateSequence import GateSequence
+from PipelineProfiler import PipelineProfiler
+from helper_functions import gray_code, gray_code_rank, fast_walsh_hadamard_transform
+
+if TYPE_CHECKING:
+    from braket.circuits import Circuit
 
 class QubitEfficientQSP(QuantumStatePreparation):
     """
@@ -8,64 +17,385 @@ class QubitEfficientQSP(QuantumStatePreparation):
     Inherits from QuantumStatePreparation.
     """
 
-    def __init__(self, normalized_complex_array: np.ndarray):
+    # the most recently used parametric circuit templates keyed by (n, decomposition, hash of the gate structure),
+    # and under the same keys the gate records and rotation parameter names the templates were emitted from
+    PARAMETRIC_CIRCUIT_CACHE_SIZE = 32
+    _parametric_circuit_cache = OrderedDict()
+    _parametric_template_records = {}
+
+    def __init__(self, normalized_complex_array: np.ndarray, dtype=np.float64, keep_amplitude_arrays: bool = True):
         """
         Initialize the QubitEfficientQSP with a normalized complex array.
 
         Args:
             normalized_complex_array (np.ndarray): A normalized complex array representing the quantum state.
+            dtype: The precision of the amplitudes, phases and rotation angles, see QuantumStatePreparation.
+            keep_amplitude_arrays (bool): Whether to keep the amplitude and phase arrays, see QuantumStatePreparation.
+        """
+        super().__init__(normalized_complex_array, dtype=dtype, keep_amplitude_arrays=keep_amplitude_arrays)
+
+    def _initialize_circuit_state(self):
         """
-        super().__init__(normalized_complex_array)
-        self._circ = Circuit()
+        Set up the circuit state, also for instances created through from_sparse or from_angle_tree.
+        The Braket circuit is only created by construct_circuit, so the angle computation does not import Braket.
+        """
+        self._circ = None
+        self._gate_count_reduction = {}
+
+    def get_gate_count_reduction(self) -> dict:
+        """Return the gate count reduction of the last optimized construction for debugging purposes."""
+        return self._gate_count_reduction
+
+    @classmethod
+    def clear_parametric_circuit_cache(cls):
+        """Remove all cached parametric circuit templates."""
+        cls._parametric_circuit_cache.clear()
+        cls._parametric_template_records.clear()
 
-    def _x_gate_sequence(self, s: int, j: int):
+    def _multi_control_level_positions(self, s: int, gray_order: bool = False) -> np.ndarray:
         """
-        Add X gates to emulate the anti-control operations.
+        Return the positions in get_nontrivial_rotation_angles(s) of the <s, j> instances in emission order.
 
         Args:
             s (int): As it appears in equation 4.30 in the ML with QC book.
-            j (int): As it appears in equation 4.30 in the ML with QC book.
+            gray_order (bool): If True, visit j in Gray-code order instead of decreasing j.
+
+        Returns:
+            np.ndarray: The positions in emission order.
         """
-        binary_j = bin(j - 1).replace("0b", "").zfill(self._n - s)
-        for i in range(self._n - s):
-            if int(binary_j[i]) == 0:
-                self._circ.x(i)
+        j_array = self.get_nontrivial_rotation_angles(s)[0]
+        return np.argsort(gray_code_rank(j_array - 1)) if gray_order else np.arange(len(j_array))[::-1]
 
-    def _full_multi_control_rotation_gate(self, s: int, j: int, tolerance: float = 1e-100):
+    def _multi_control_level_gates(self, s: int, j_positions: np.ndarray, tolerance: float = 1e-100) -> np.ndarray:
         """
-        Perform a full multi-control rotation gate based on the s and j values, 
-        including anti-control conditions.
+        Compute the gate records of the anti-controlled Ry and Rz rotations of some <s, j> instances in one vectorized pass.
 
         Args:
             s (int): As it appears in equation 4.30 in the ML with QC book.
-            j (int): As it appears in equation 4.30 in the ML with QC book.
+            j_positions (np.ndarray): The positions of the instances in get_nontrivial_rotation_angles(s), in emission order.
             tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+
+        Returns:
+            np.ndarray: The gate records, see GateSequence.
         """
-        ry_rotation_angle = self._compute_ry_rotation_angle(s, j)
-        rz_rotation_angle = self._compute_rz_rotation_angle(s, j)
+        j_array, ry_angle_array, rz_angle_array = self.get_nontrivial_rotation_angles(s)
         target_bit_index = self._n - s
-        control_qubit_list = list(range(target_bit_index))
-
-        if np.abs(ry_rotation_angle) > tolerance or np.abs(rz_rotation_angle) > tolerance:
-            self._x_gate_sequence(s, j)
-        
-        if np.abs(ry_rotation_angle) > tolerance:
-            self._circ.ry(angle=ry_rotation_angle, target=target_bit_index, control=control_qubit_list)
-        
-        if np.abs(rz_rotation_angle) > tolerance:
-            self._circ.rz(angle=rz_rotation_angle, target=target_bit_index, control=control_qubit_list)
-        
-        if np.abs(ry_rotation_angle) > tolerance or np.abs(rz_rotation_angle) > tolerance:
-            self._x_gate_sequence(s, j)
-
-    def construct_circuit(self) -> Circuit:
+
+        # qubit i carries bit target_bit_index - 1 - i of j - 1, and is an anti-control where that bit is 0
+        control_bits = ((j_array[j_positions, np.newaxis] - 1) >> np.arange(target_bit_index - 1, -1, -1)) & 1
+        qubit_weights = 1 << np.arange(target_bit_index)
+        level_gates = np.zeros((len(j_positions), 2), dtype=GateSequence.GATE_DTYPE)
+        level_gates["op"] = [GateSequence.RY, GateSequence.RZ]
+        level_gates["target"] = target_bit_index
+        level_gates["control_mask"] = (control_bits @ qubit_weights)[:, np.newaxis]
+        level_gates["anti_control_mask"] = ((1 - control_bits) @ qubit_weights)[:, np.newaxis]
+        level_gates["angle"][:, 0] = ry_angle_array[j_positions]
+        level_gates["angle"][:, 1] = rz_angle_array[j_positions]
+        return level_gates[np.abs(level_gates["angle"]) > tolerance]
+
+    def _uniformly_controlled_level_gates(self, s: int, rotation_type: str, gray_rotation_angles: np.ndarray,
+                                          i_start: int = 0, i_stop: int = None, tolerance: float = 1e-100) -> np.ndarray:
+        """
+        Compute the gate records of the Gray-code decomposition of the uniformly controlled rotation of level s,
+        as described by Mottonen et al. 2004, for the Gray code words i_start <= i < i_stop.
+
+        Args:
+            s (int): As it appears in equation 4.30 in the ML with QC book.
+            rotation_type (str): Either "ry" or "rz".
+            gray_rotation_angles (np.ndarray): The rotation angles of the level, see _compute_gray_code_rotation_angles.
+            i_start (int): The first Gray code word.
+            i_stop (int): One past the last Gray code word. Defaults to the end of the level.
+            tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+
+        Returns:
+            np.ndarray: The gate records, see GateSequence.
+        """
+        i_array = np.arange(i_start, len(gray_rotation_angles) if i_stop is None else min(i_stop, len(gray_rotation_angles)))
+        target_bit_index = self._n - s
+
+        level_gates = np.zeros((len(i_array), 2), dtype=GateSequence.GATE_DTYPE)
+        level_gates["op"] = [GateSequence.RY if rotation_type == "ry" else GateSequence.RZ, GateSequence.X]
+        level_gates["target"] = target_bit_index
+        level_gates["angle"][:, 0] = gray_rotation_angles[i_array]
+        is_emitted = np.zeros(level_gates.shape, dtype=bool)
+        is_emitted[:, 0] = np.abs(level_gates["angle"][:, 0]) > tolerance
+        if target_bit_index > 0:
+            next_i_array = (i_array + 1) % len(gray_rotation_angles)
+            # the control of the i-th CNOT is the bit flipped between Gray code words i and i + 1 (cyclically),
+            # and bit b of j - 1 (counted from the least significant bit) is carried by qubit target_bit_index - 1 - b
+            flipped_bit_array = np.log2((i_array ^ (i_array >> 1)) ^ (next_i_array ^ (next_i_array >> 1))).astype(np.int64)
+            level_gates["control_mask"][:, 1] = 1 << (target_bit_index - 1 - flipped_bit_array)
+            is_emitted[:, 1] = True
+        return level_gates[is_emitted]
+
+    def _compute_gray_code_rotation_angles(self, s: int, rotation_type: str, tolerance: float = 1e-100):
+        """
+        Compute the single-qubit rotation angles of the Gray-code decomposition of level s.
+
+        Args:
+            s (int): As it appears in equation 4.30 in the ML with QC book.
+            rotation_type (str): Either "ry" or "rz".
+            tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+
+        Returns:
+            np.ndarray: The 2^(n-s) rotation angles in Gray-code order, or None if every angle of the level is zero.
+        """
+        if rotation_type == "ry":
+            rotation_angle_level = self.get_ry_angle_level(s)
+        else:
+            rotation_angle_level = self.get_rz_angle_level(s)
+
+        if not np.any(np.abs(rotation_angle_level) > tolerance):
+            return None
+        # angle i is applied while the parity of the controls selected by Gray code word i is accumulated on the target
+        return fast_walsh_hadamard_transform(rotation_angle_level)[gray_code(self._n - s)] / len(rotation_angle_level)
+
+    def iter_gate_sequence(self, decomposition: str = "multi_control", gray_order: bool = False,
+                           chunk_size: int = 65536, tolerance: float = 1e-100):
+        """
+        Lazily generate the QSP circuit as GateSequence chunks, level by level and, within a level, in chunks of at
+        most chunk_size (s, j) instances (or Gray code words), in the order of construct_gate_sequence.
+        Only one chunk of gate records exists at a time, so the memory stays O(N) for the angle tree.
+
+        Args:
+            decomposition (str): The decomposition mode, see construct_circuit.
+            gray_order (bool): See construct_gate_sequence.
+            chunk_size (int): The maximum number of (s, j) instances per chunk.
+            tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+
+        Yields:
+            GateSequence: The next non-empty chunk of gate records.
+        """
+        if decomposition not in ("multi_control", "gray_code"):
+            raise ValueError("Decomposition needs to be either 'multi_control' or 'gray_code'.")
+        profiler = PipelineProfiler.get_active()
+        for s in range(self._n, 0, -1):
+            if decomposition == "multi_control":
+                j_positions = self._multi_control_level_positions(s, gray_order)
+                candidate_rotation_count = 2 * len(j_positions)
+                chunk_gate_arrays = (self._multi_control_level_gates(s, j_positions[chunk_start:chunk_start + chunk_size], tolerance)
+                                     for chunk_start in range(0, len(j_positions), chunk_size))
+            else:
+                candidate_rotation_count = 2 * 2 ** (self._n - s)
+                chunk_gate_arrays = self._iter_uniformly_controlled_level_gates(s, chunk_size, tolerance)
+            gate_count = emitted_rotation_count = 0
+            for chunk_gates in chunk_gate_arrays:
+                if profiler is not None:
+                    gate_count += len(chunk_gates)
+                    emitted_rotation_count += int(np.count_nonzero(chunk_gates["op"] != GateSequence.X))
+                if len(chunk_gates) > 0:
+                    yield GateSequence(self._n, chunk_gates)
+            if profiler is not None:
+                profiler.record_level(s, gate_count, emitted_rotation_count, candidate_rotation_count - emitted_rotation_count)
+
+    def _iter_uniformly_controlled_level_gates(self, s: int, chunk_size: int, tolerance: float = 1e-100):
+        """Generate the gate records of the Ry and then the Rz uniformly controlled rotation of level s in chunks."""
+        for rotation_type in ("ry", "rz"):
+            gray_rotation_angles = self._compute_gray_code_rotation_angles(s, rotation_type, tolerance)
+            if gray_rotation_angles is None:
+                continue
+            for i_start in range(0, len(gray_rotation_angles), chunk_size):
+                yield self._uniformly_controlled_level_gates(s, rotation_type, gray_rotation_angles,
+                                                             i_start, i_start + chunk_size, tolerance)
+
+    def construct_gate_sequence(self, decomposition: str = "multi_control", gray_order: bool = False,
+                                tolerance: float = 1e-100) -> GateSequence:
+        """
+        Construct the QSP circuit as a backend-neutral GateSequence, which can be emitted for Braket, Qiskit or OpenQASM 3.
+
+        Args:
+            decomposition (str): The decomposition mode, see construct_circuit.
+            gray_order (bool): If True and decomposition is "multi_control", visit j in Gray-code order so that
+                neighbouring X layers differ on a single control qubit.
+            tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+
+        Returns:
+            GateSequence: The gate records of the circuit, with the anti-controls kept as anti_control_mask.
+        """
+        with PipelineProfiler.phase("gate_generation"):
+            gate_arrays = [gate_sequence.get_gates() for gate_sequence
+                           in self.iter_gate_sequence(decomposition, gray_order, chunk_size=2 ** self._n, tolerance=tolerance)]
+            gate_sequence = GateSequence(self._n, np.concatenate(gate_arrays) if gate_arrays else None)
+        profiler = PipelineProfiler.get_active()
+        if profiler is not None:
+            profiler.record_allocation("gate_records", gate_sequence.get_gates().nbytes)
+        return gate_sequence
+
+    def write_gate_stream(self, file_path: str, decomposition: str = "multi_control", file_format: str = "openqasm",
+                          braket_dialect: bool = False, chunk_size: int = 65536) -> int:
+        """
+        Write the QSP circuit to a file chunk by chunk without ever materializing the full circuit, see iter_gate_sequence.
+
+        Args:
+            file_path (str): The path of the file to write.
+            decomposition (str): The decomposition mode, see construct_circuit.
+            file_format (str): "openqasm" for an OpenQASM 3 program or "jsonl" for one JSON gate record per line.
+            braket_dialect (bool): See GateSequence.to_openqasm.
+            chunk_size (int): The maximum number of (s, j) instances per chunk.
+
+        Returns:
+            int: The number of gate records written.
+        """
+        return GateSequence.write_stream(self.iter_gate_sequence(decomposition, chunk_size=chunk_size), file_path, self._n,
+                                         file_format=file_format, braket_dialect=braket_dialect)
+
+    def construct_circuit(self, decomposition: str = "multi_control", optimize: bool = False) -> Circuit:
         """
         Construct the full quantum state preparation (QSP) circuit using the qubit efficient method.
 
+        Args:
+            decomposition (str): "multi_control" emits one multi-controlled Ry/Rz per (s, j), wrapped in X gates
+                for the anti-controls. "gray_code" emits every level as a uniformly controlled rotation made of
+                2^(n-s) single-qubit rotations and 2^(n-s) CNOT gates, so no multi-controlled gate is used.
+                This mode densifies every level, so "multi_control" is preferred for sparse states on many qubits.
+            optimize (bool): If True, visit j in Gray-code order so that neighbouring X layers differ on a single
+                control qubit, and run the PeepholeOptimizer on the result. The reduction is available from
+                get_gate_count_reduction().
+
         Returns:
             Circuit: The constructed quantum circuit.
         """
-        for s in range(self._n, 0, -1):
-            for j in range(2 ** (self._n - s), 0, -1):
-                self._full_multi_control_rotation_gate(s, j)
-        return self._circ
\ No newline at end of file
+        self._circ = self.construct_gate_sequence(decomposition=decomposition, gray_order=optimize).to_braket(self._circ)
+
+        if optimize:
+            from PeepholeOptimizer import PeepholeOptimizer
+            with PipelineProfiler.phase("peephole_optimization"):
+                optimizer = PeepholeOptimizer(self._circ)
+                self._circ = optimizer.optimize()
+            self._gate_count_reduction = optimizer.get_gate_count_reduction()
+        return self._circ
+
+    def construct_approximate_circuit(self, target_fidelity: float, decomposition: str = "multi_control", optimize: bool = False) -> tuple:
+        """
+        Construct an approximate QSP circuit that drops small rotations and low-weight subtrees while keeping
+        a guaranteed lower bound on the fidelity, see QuantumStatePreparation.compute_pruned_angle_tree.
+
+        Args:
+            target_fidelity (float): The lower bound on |<psi|psi'>|^2 to keep, in (0, 1].
+            decomposition (str): The decomposition mode, see construct_circuit.
+            optimize (bool): Whether to run the peephole optimization, see construct_circuit.
+
+        Returns:
+            tuple: (circuit, fidelity_bound) with the constructed circuit and the achieved lower bound on the fidelity.
+        """
+        ry_angle_tree, rz_angle_tree, fidelity_bound = self.compute_pruned_angle_tree(target_fidelity)
+        approximate_qsp = type(self).from_angle_tree(self._n, ry_angle_tree, rz_angle_tree, self._block_index_tree)
+        return approximate_qsp.construct_circuit(decomposition=decomposition, optimize=optimize), fidelity_bound
+
+    def construct_parametric_circuit(self, decomposition: str = "multi_control", tolerance: float = 1e-100) -> tuple:
+        """
+        Construct the QSP circuit as a template whose Ry/Rz angles are FreeParameters, together with the
+        parameter values of this state. The gate structure only depends on n, the decomposition and which
+        rotations are nonzero, so the PARAMETRIC_CIRCUIT_CACHE_SIZE most recently used templates are cached by
+        that structure and states sharing it reuse the same template. The returned template is shared and
+        must not be modified.
+
+        Args:
+            decomposition (str): The decomposition mode, see construct_circuit.
+            tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+
+        Returns:
+            tuple: (template, parameter_values) where template is the parametric Circuit and parameter_values
+                maps parameter names to angles, to be passed as device.run(template, inputs=parameter_values)
+                or to bind_parameter_values. The parameters are named ry_<s>_<j> and rz_<s>_<j> in "multi_control"
+                mode and gray_ry_<s>_<i> and gray_rz_<s>_<i> for the Gray code word i in "gray_code" mode.
+        """
+        gate_sequence = self.construct_gate_sequence(decomposition=decomposition, tolerance=tolerance)
+        gates = gate_sequence.get_gates()
+        parameter_names = self._parameter_names(gates, decomposition)
+        is_rotation = gates["op"] != GateSequence.X
+        parameter_values = dict(zip((parameter_names[k] for k in np.flatnonzero(is_rotation)), gates["angle"][is_rotation].tolist()))
+
+        gate_structure = gates.copy()
+        gate_structure["angle"] = 0.0
+        cache_key = (self._n, decomposition, hashlib.sha256(gate_structure.tobytes()).hexdigest())
+        template = self._parametric_circuit_cache.get(cache_key)
+        if template is None:
+            with PipelineProfiler.phase("parametric_template_construction"):
+                template = self._construct_circuit_template(gate_sequence, parameter_names)
+            self._parametric_circuit_cache[cache_key] = template
+            self._parametric_template_records[cache_key] = (gate_sequence, [parameter_names[k] for k in np.flatnonzero(is_rotation)])
+            while len(self._parametric_circuit_cache) > self.PARAMETRIC_CIRCUIT_CACHE_SIZE:
+                del self._parametric_template_records[self._parametric_circuit_cache.popitem(last=False)[0]]
+        else:
+            self._parametric_circuit_cache.move_to_end(cache_key)
+        return template, parameter_values
+
+    def _parameter_names(self, gates: np.ndarray, decomposition: str) -> list:
+        """
+        Return the parameter name of every gate record of construct_gate_sequence(decomposition), None for X gates.
+
+        Args:
+            gates (np.ndarray): The gate records, see GateSequence.
+            decomposition (str): The decomposition mode the records were constructed with.
+
+        Returns:
+            list: The parameter names, see construct_parametric_circuit.
+        """
+        target_array = gates["target"].astype(np.int64)
+        s_array = self._n - target_array
+        if decomposition == "multi_control":
+            # qubit q < target carries bit target - 1 - q of j - 1 and is a control on |1> where that bit is 1
+            control_mask_array = gates["control_mask"].astype(np.int64)
+            j_array = np.ones(len(gates), dtype=np.int64)
+            for q in range(self._n):
+                j_array += ((control_mask_array >> q) & 1) << np.maximum(target_array - 1 - q, 0)
+            name_formats = (None, "ry_{}_{}", "rz_{}_{}")
+        else:
+            # every Gray code word i is followed by one CNOT on the target, and the Ry words of a level precede its Rz words
+            is_x = gates["op"] == GateSequence.X
+            x_counts_before = np.cumsum(is_x) - is_x
+            level_starts = np.searchsorted(target_array, target_array)
+            j_array = (x_counts_before - x_counts_before[level_starts]) % (1 << target_array)
+            name_formats = (None, "gray_ry_{}_{}", "gray_rz_{}_{}")
+        return [None if name_formats[op] is None else name_formats[op].format(s, j)
+                for op, s, j in zip(gates["op"].tolist(), s_array.tolist(), j_array.tolist())]
+
+    @classmethod
+    def bind_parameter_values(cls, template: Circuit, parameter_values: dict) -> Circuit:
+        """
+        Create a circuit with the FreeParameters of a template replaced by their values.
+        Unlike Circuit.make_bound_circuit, the controls and control states of controlled gates are kept.
+        A cached template bound to all of its parameters is emitted again from its gate records with the new
+        angles, which costs as much as construct_circuit; other templates are bound instruction by instruction.
+        Running the template with device.run(template, inputs=parameter_values) avoids building a circuit at all.
+
+        Args:
+            template (Circuit): The parametric circuit.
+            parameter_values (dict): A mapping of FreeParameter names to their values.
+
+        Returns:
+            Circuit: The bound circuit.
+        """
+        for cache_key, cached_template in cls._parametric_circuit_cache.items():
+            if cached_template is template:
+                gate_sequence, rotation_parameter_names = cls._parametric_template_records[cache_key]
+                if all(name in parameter_values for name in rotation_parameter_names):
+                    gates = gate_sequence.get_gates().copy()
+                    gates["angle"][gates["op"] != GateSequence.X] = [parameter_values[name] for name in rotation_parameter_names]
+                    return GateSequence(gate_sequence.get_n(), gates).to_braket()
+                break
+
+        from braket.circuits import Circuit, Instruction, Parameterizable
+        bound_circ = Circuit()
+        for instruction in template.instructions:
+            if isinstance(instruction.operator, Parameterizable):
+                instruction = Instruction(instruction.operator.bind_values(**parameter_values), target=instruction.target,
+                                          control=instruction.control, control_state=instruction.control_state,
+                                          power=instruction.power)
+            bound_circ.add_instruction(instruction)
+        return bound_circ
+
+    def _construct_circuit_template(self, gate_sequence: GateSequence, parameter_names: list) -> Circuit:
+        """
+        Emit the gate records of a circuit for Braket with a FreeParameter in place of every rotation angle.
+
+        Args:
+            gate_sequence (GateSequence): The gate records of the circuit.
+            parameter_names (list): The parameter name of every gate record, None for X gates.
+
+        Returns:
+            Circuit: The parametric circuit.
+        """
+        from braket.circuits import FreeParameter
+        return gate_sequence.to_braket(angle_parameters=[None if name is None else FreeParameter(name) for name in parameter_names])
@@ -0,0 +1,145 @@
+import numpy as np
+from QubitEfficientQSP import QubitEfficientQSP
+from helper_functions import gray_code, popcount
+
+class ResourceEstimator:
+    """
+    Class for predicting the exact gate counts and depth of QubitEfficientQSP.construct_circuit() (without the
+    peephole optimization) from the angle tree, without constructing any gate. A rotation is counted if its
+    angle exceeds the tolerance, as in the circuit construction. The cost is O(N) for dense states and
+    O(nnz * n) for sparse states in "multi_control" mode; "gray_code" mode densifies every level.
+    """
+
+    def __init__(self, qsp: QubitEfficientQSP, tolerance: float = 1e-100):
+        """
+        Initialize the ResourceEstimator with the state preparation to estimate.
+
+        Args:
+            qsp (QubitEfficientQSP): The state preparation whose circuit is estimated.
+            tolerance (float): A small value to determine if a number is close enough to zero to be treated as zero.
+        """
+        self._qsp = qsp
+        self._tolerance = tolerance
+
+    def estimate(self, decomposition: str = "multi_control") -> dict:
+        """
+        Predict the resources of the circuit of a decomposition mode.
+
+        Args:
+            decomposition (str): The decomposition mode, see QubitEfficientQSP.construct_circuit.
+
+        Returns:
+            dict: "gate_count", "depth" (as Circuit.depth), "x_count" (uncontrolled X gates), "cnot_count",
+                "rotation_count" (uncontrolled Ry/Rz), "controlled_rotation_count" (Ry/Rz with one control)
+                and "multi_control_gate_count" (Ry/Rz with two or more controls).
+        """
+        if decomposition == "multi_control":
+            resources = self._estimate_multi_control()
+        elif decomposition == "gray_code":
+            resources = self._estimate_gray_code()
+        else:
+            raise ValueError("Decomposition needs to be either 'multi_control' or 'gray_code'.")
+        resources["gate_count"] = (resources["x_count"] + resources["cnot_count"] + resources["rotation_count"]
+                                   + resources["controlled_rotation_count"] + resources["multi_control_gate_count"])
+        return resources
+
+    @staticmethod
+    def _qubit_mask(j_bits: int, target_bit_index: int) -> int:
+        """Convert a mask over the bits of j - 1 at a level into a mask over the qubits carrying them."""
+        return sum(1 << i for i in range(target_bit_index) if (j_bits >> (target_bit_index - 1 - i)) & 1)
+
+    def _estimate_multi_control(self) -> dict:
+        """
+        Count the gates of the multi-control decomposition and compute its depth. Every rotation of an <s, j>
+        instance acts on all qubits 0, ..., n - s, so after it every qubit it touches is at the same time T.
+        The X layers around two consecutive instances then add 2 to the time of the next rotation if their
+        anti-controls overlap, 1 if only one of them has anti-controls, and 0 otherwise. Qubits above the
+        previous target are still at time 0 after skipped levels, so X gates on them never delay the rotation.
+        """
+        n = self._qsp.get_n()
+        resources = dict.fromkeys(("x_count", "cnot_count", "rotation_count", "controlled_rotation_count", "multi_control_gate_count"), 0)
+        rotation_count_keys = ("rotation_count", "controlled_rotation_count")
+        depth = 0
+        previous_anti_control_mask = 0
+        touched_qubit_mask = 0
+        for s in range(n, 0, -1):
+            target_bit_index = n - s
+            j_array, ry_angle_array, rz_angle_array = self._qsp.get_nontrivial_rotation_angles(s)
+            rotation_counts = (np.abs(ry_angle_array) > self._tolerance).astype(np.int64) + (np.abs(rz_angle_array) > self._tolerance)
+            is_active = rotation_counts > 0
+            if not np.any(is_active):
+                continue
+            # instances are emitted in decreasing j
+            j_bits = (j_array[is_active] - 1)[::-1]
+            rotation_counts = rotation_counts[is_active][::-1]
+            anti_control_bits = ~j_bits & ((1 << target_bit_index) - 1)
+
+            resources["x_count"] += 2 * int(target_bit_index * len(j_bits) - popcount(j_bits).sum())
+            resources[rotation_count_keys[target_bit_index] if target_bit_index < 2 else "multi_control_gate_count"] += int(rotation_counts.sum())
+
+            first_anti_control_mask = self._qubit_mask(int(anti_control_bits[0]), target_bit_index)
+            if touched_qubit_mask:
+                first_anti_control_mask &= touched_qubit_mask
+            depth += bool(previous_anti_control_mask | first_anti_control_mask) + bool(previous_anti_control_mask & first_anti_control_mask)
+            depth += int(np.count_nonzero(anti_control_bits[1:] | anti_control_bits[:-1])
+                         + np.count_nonzero(anti_control_bits[1:] & anti_control_bits[:-1]) + rotation_counts.sum())
+            previous_anti_control_mask = self._qubit_mask(int(anti_control_bits[-1]), target_bit_index)
+            touched_qubit_mask = (1 << (target_bit_index + 1)) - 1
+        resources["depth"] = depth + (1 if previous_anti_control_mask else 0)
+        return resources
+
+    def _estimate_gray_code(self) -> dict:
+        """
+        Count the gates of the Gray-code decomposition and compute its depth. Every gate of level s acts on the
+        target qubit n - s, so within a level the gates run one after another, and a CNOT control can only delay
+        the target on its first use in the level, by the time the control qubit finished at.
+        """
+        n = self._qsp.get_n()
+        resources = dict.fromkeys(("x_count", "cnot_count", "rotation_count", "controlled_rotation_count", "multi_control_gate_count"), 0)
+        finish_times = np.zeros(n, dtype=np.int64)
+        for s in range(n, 0, -1):
+            target_bit_index = n - s
+            if target_bit_index > 0:
+                gray_code_array = gray_code(target_bit_index)
+                flipped_bit_array = np.log2(gray_code_array ^ np.roll(gray_code_array, -1)).astype(np.int64)
+                cnot_control_array = target_bit_index - 1 - flipped_bit_array
+
+            # the control of every emitted gate of the level in order, -1 for the single-qubit rotations
+            level_controls = []
+            for rotation_type in ("ry", "rz"):
+                gray_rotation_angles = self._qsp._compute_gray_code_rotation_angles(s, rotation_type, self._tolerance)
+                if gray_rotation_angles is None:
+                    continue
+                is_rotation_emitted = np.abs(gray_rotation_angles) > self._tolerance
+                resources["rotation_count"] += int(np.count_nonzero(is_rotation_emitted))
+                if target_bit_index == 0:
+                    level_controls.append(np.full(np.count_nonzero(is_rotation_emitted), -1))
+                    continue
+                resources["cnot_count"] += len(gray_rotation_angles)
+                gate_controls = np.stack((np.full(len(gray_rotation_angles), -1), cnot_control_array), axis=-1)
+                is_emitted = np.stack((is_rotation_emitted, np.ones(len(gray_rotation_angles), dtype=bool)), axis=-1)
+                level_controls.append(gate_controls[is_emitted])
+            if not level_controls:
+                continue
+            level_controls = np.concatenate(level_controls)
+
+            cnot_positions = np.flatnonzero(level_controls >= 0)
+            if len(cnot_positions) == 0:
+                finish_times[target_bit_index] = len(level_controls)
+                continue
+            cnot_controls = level_controls[cnot_positions]
+            used_controls, first_use_index = np.unique(cnot_controls, return_index=True)
+            last_use_index = len(cnot_controls) - 1 - np.unique(cnot_controls[::-1], return_index=True)[1]
+            first_use_positions = cnot_positions[first_use_index]
+            start_offsets = finish_times[used_controls] - first_use_positions
+
+            def time_after(positions: np.ndarray) -> np.ndarray:
+                # time of the target after the gate at each position: one step per gate, delayed by the controls used so far
+                started = first_use_positions[np.newaxis, :] <= positions[:, np.newaxis]
+                delay = np.where(started, start_offsets[np.newaxis, :], 0).max(axis=1)
+                return positions + 1 + np.maximum(delay, 0)
+
+            finish_times[used_controls] = time_after(cnot_positions[last_use_index])
+            finish_times[target_bit_index] = time_after(np.array([len(level_controls) - 1]))[0]
+        resources["depth"] = int(finish_times.max())
+        return resources
@@ -0,0 +1,118 @@
+import numpy as np
+from GateSequence import GateSequence
+from QuantumStatePreparation import QuantumStatePreparation
+
+class StatevectorVerifier:
+    """
+    Class for verifying a quantum state preparation with a lightweight NumPy statevector simulation
+    specialised for the QSP circuit family. Every level s is applied as a vectorized 2x2 rotation
+    over reshaped slices of the state vector, so no gate unitary is ever constructed.
+    The simulation takes O(N log N) time and O(N) memory.
+    A constructed circuit, e.g. in "gray_code" mode, pruned or peephole-optimized, is verified by simulating
+    its GateSequence gate by gate instead, which takes O(N) time per gate.
+    """
+
+    def __init__(self, qsp: QuantumStatePreparation, tolerance: float = 1e-100, gate_sequence: GateSequence = None):
+        """
+        Initialize the StatevectorVerifier with the state preparation to verify.
+
+        Args:
+            qsp (QuantumStatePreparation): The state preparation whose angle tree is simulated.
+            tolerance (float): A small value to determine if an angle is close enough to zero to be skipped, as in the circuit.
+            gate_sequence (GateSequence): If given, the gates of this circuit are simulated instead of the angle tree,
+                e.g. qsp.construct_gate_sequence("gray_code") or GateSequence.from_braket of an optimized circuit.
+        """
+        self._qsp = qsp
+        self._tolerance = tolerance
+        self._gate_sequence = gate_sequence
+
+    def simulate(self) -> np.ndarray:
+        """
+        Simulate the QSP circuit on |0...0> level by level, or gate by gate if a gate sequence was given.
+
+        Returns:
+            np.ndarray: The resulting state vector of length 2^n, with qubit 0 as the most significant bit as in Braket.
+        """
+        if self._gate_sequence is not None:
+            return self.simulate_gate_sequence(self._gate_sequence)
+        n = self._qsp.get_n()
+        state_vector = np.zeros(2 ** n, dtype=np.complex128)
+        state_vector[0] = 1.0
+        for s in range(n, 0, -1):
+            # the trigonometry runs in float64 so that the rotations of a float32 angle tree stay unitary
+            ry_angle_level = self._qsp.get_ry_angle_level(s).astype(np.float64)
+            rz_angle_level = self._qsp.get_rz_angle_level(s).astype(np.float64)
+            ry_angle_level = np.where(np.abs(ry_angle_level) > self._tolerance, ry_angle_level, 0.0)[:, np.newaxis]
+            rz_angle_level = np.where(np.abs(rz_angle_level) > self._tolerance, rz_angle_level, 0.0)[:, np.newaxis]
+
+            # axis 0 enumerates the control values j - 1 of qubits 0, ..., n - s - 1 and axis 1 the target qubit n - s
+            state_blocks = state_vector.reshape(2 ** (n - s), 2, 2 ** (s - 1))
+            cos_half, sin_half = np.cos(ry_angle_level / 2), np.sin(ry_angle_level / 2)
+            phase_half = np.exp(-0.5j * rz_angle_level)
+            bottom = phase_half * (cos_half * state_blocks[:, 0] - sin_half * state_blocks[:, 1])
+            top = np.conj(phase_half) * (sin_half * state_blocks[:, 0] + cos_half * state_blocks[:, 1])
+            state_blocks[:, 0] = bottom
+            state_blocks[:, 1] = top
+        return state_vector
+
+    @staticmethod
+    def simulate_gate_sequence(gate_sequence: GateSequence) -> np.ndarray:
+        """
+        Simulate the gate records of a GateSequence on |0...0>. Every gate updates the amplitude pairs that differ in
+        its target qubit and satisfy its controls (on |1>) and anti-controls (on |0>).
+
+        Args:
+            gate_sequence (GateSequence): The circuit to simulate.
+
+        Returns:
+            np.ndarray: The resulting state vector of length 2^n, with qubit 0 as the most significant bit as in Braket.
+        """
+        n = gate_sequence.get_n()
+        state_vector = np.zeros(2 ** n, dtype=np.complex128)
+        state_vector[0] = 1.0
+        index_array = np.arange(2 ** n, dtype=np.int64)
+        # the indices whose bit of the target qubit is 0, per target, and the index bit of every qubit
+        zero_index_arrays = {}
+        qubit_bits = [1 << (n - 1 - q) for q in range(n)]
+
+        def index_mask(qubit_mask):
+            return sum(qubit_bits[q] for q in range(n) if (qubit_mask >> q) & 1)
+
+        for op, target, control_mask, anti_control_mask, angle in gate_sequence.get_gates().tolist():
+            zero_index_array = zero_index_arrays.get(target)
+            if zero_index_array is None:
+                zero_index_array = index_array[(index_array & qubit_bits[target]) == 0]
+                zero_index_arrays[target] = zero_index_array
+            control_bits, anti_control_bits = index_mask(control_mask), index_mask(anti_control_mask)
+            if control_bits or anti_control_bits:
+                zero_index_array = zero_index_array[(zero_index_array & (control_bits | anti_control_bits)) == control_bits]
+            one_index_array = zero_index_array | qubit_bits[target]
+            zero_amplitudes, one_amplitudes = state_vector[zero_index_array], state_vector[one_index_array]
+            if op == GateSequence.X:
+                state_vector[zero_index_array], state_vector[one_index_array] = one_amplitudes, zero_amplitudes
+            elif op == GateSequence.RY:
+                cos_half, sin_half = np.cos(angle / 2), np.sin(angle / 2)
+                state_vector[zero_index_array] = cos_half * zero_amplitudes - sin_half * one_amplitudes
+                state_vector[one_index_array] = sin_half * zero_amplitudes + cos_half * one_amplitudes
+            else:
+                phase_half = np.exp(-0.5j * angle)
+                state_vector[zero_index_array] = phase_half * zero_amplitudes
+                state_vector[one_index_array] = np.conj(phase_half) * one_amplitudes
+        return state_vector
+
+    def compute_fidelity(self, normalized_complex_array: np.ndarray = None) -> float:
+        """
+        Compute the fidelity |<psi|psi'>|^2 between the target state and the simulated state,
+        which ignores the global phase of the preparation.
+
+        Args:
+            normalized_complex_array (np.ndarray): The target state. Defaults to the amplitude and phase arrays of the state preparation.
+
+        Returns:
+            float: The fidelity.
+        """
+        if normalized_complex_array is None:
+            if self._qsp.get_amplitude_array() is None:
+                raise ValueError("Target state needs to be given for state preparations without amplitude and phase arrays.")
+            normalized_complex_array = self._qsp.get_amplitude_array() * np.exp(1j * self._qsp.get_phase_array())
+        return float(np.abs(np.vdot(normalized_complex_array, self.simulate())) ** 2)
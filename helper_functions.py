@@ -2,6 +2,7 @@ import numpy as np
 import random
 
 import time
+import tracemalloc
 
 
 def round_to_three_significant_digits(numbers_vec: list, digit: int) -> np.ndarray:
@@ -13,13 +14,10 @@ def round_to_three_significant_digits(numbers_vec: list, digit: int) -> np.ndarr
     
     @return rounded_numbers_vec: rounded vector of floating numbers
     """
-    rounded_numbers_vec = []
-    for num in numbers_vec:
-        if num == 0:
-            rounded_numbers_vec.append(0)
-        else:
-            rounded_numbers_vec.append(np.round(num, digit))
-    return np.array(rounded_numbers_vec)
+    numbers_vec = np.asarray(numbers_vec)
+    rounded_numbers_vec = np.round(numbers_vec, digit)
+    rounded_numbers_vec[numbers_vec == 0] = 0 # zeros are displayed without a sign
+    return rounded_numbers_vec
 
 
 def row_to_column_vector(row_vector: np.ndarray) -> np.ndarray:
@@ -48,32 +46,37 @@ def nicer_array_display(input_vec: np.ndarray, digit: int) -> np.ndarray:
     return row_to_column_vector(round_to_three_significant_digits(input_vec, digit))
 
 
-def generate_normalized_real_array(n: int) -> np.ndarray:
+def generate_normalized_real_array(n: int, rng: np.random.Generator = None) -> np.ndarray:
     """
     Function to generate a normalized random real value vector
     
     @param n: total number of data qubit
+    @param rng: a np.random.Generator (or seed) to draw the values from in one vectorized call. If None, the values are
+        drawn from the random module, so random.seed keeps reproducing earlier results
     
     @return normalized_v: an array of size 2^n that holds the generated nomalized real vector
     """
-    vec = []
-    for i in range(2 ** n):
-        vec.append(random.random())
-    normalized_real_array = np.array(vec) / np.sqrt(np.sum(np.array(vec)**2)) # need to normalize the vector
+    if rng is None:
+        vec = np.array([random.random() for _ in range(2 ** n)])
+    else:
+        vec = np.random.default_rng(rng).random(2 ** n)
+    normalized_real_array = vec / np.sqrt(np.sum(vec ** 2)) # need to normalize the vector
     return normalized_real_array
 
 
-def generate_normalized_complex_array(n: int) -> np.ndarray:
+def generate_normalized_complex_array(n: int, rng: np.random.Generator = None) -> np.ndarray:
     """
     Function to generate a normalized random complex value vector
     
     @param n: total number of data qubit
+    @param rng: a np.random.Generator (or seed) to draw the values from. If None, the global np.random state is used
     
     @return normalized_v: an array of size 2^n that holds the generated nomalized complex vector
     """
     array_length = 2 ** n
+    random_source = np.random if rng is None else np.random.default_rng(rng)
     # Generate a complex array with random complex values that may contain negatives
-    complex_array = (np.random.rand(array_length) - 0.5) + 1j * (np.random.rand(array_length) - 0.5)
+    complex_array = (random_source.random(array_length) - 0.5) + 1j * (random_source.random(array_length) - 0.5)
 
     # Normalize the complex array
     normalized_complex_array = complex_array / np.linalg.norm(complex_array)
@@ -81,22 +84,147 @@ def generate_normalized_complex_array(n: int) -> np.ndarray:
     return normalized_complex_array
 
 
-def generate_normalized_real_sparse_array(n: int, none_zero_index_array: np.ndarray) -> np.ndarray:
+def generate_normalized_real_sparse_array(n: int, none_zero_index_array: np.ndarray, rng: np.random.Generator = None) -> np.ndarray:
     """
     Function to generate a normalized random real value vector
     
     @param n: total number of data qubit
     @param none_zero_index_array: a 1d array that stores the index of the non zero elements. E.g., a quantum state of |a> = 0.6|00> + 0.8|11> would have the array as [0, 3]
+    @param rng: a np.random.Generator (or seed) to draw the values from. If None, the random module is used
     
     @return normalized_v: an array of size 2^n that holds the generated nomalized real vector
     """
-    vec = [0] * (2 ** n)
-    for i in range(len(none_zero_index_array)):
-        vec[none_zero_index_array[i]] = random.random()
-    normalized_real_array = np.array(vec) / np.sqrt(np.sum(np.array(vec)**2)) # need to normalize the vector
+    vec = np.zeros(2 ** n)
+    if rng is None:
+        vec[none_zero_index_array] = [random.random() for _ in range(len(none_zero_index_array))]
+    else:
+        vec[none_zero_index_array] = np.random.default_rng(rng).random(len(none_zero_index_array))
+    normalized_real_array = vec / np.sqrt(np.sum(vec ** 2)) # need to normalize the vector
     return normalized_real_array
 
 
+def _standard_complex_normal(shape: tuple, rng: np.random.Generator, dtype=np.complex128) -> np.ndarray:
+    """
+    Function to draw i.i.d. complex Gaussian values, with the real and imaginary parts drawn in place through a real view
+    
+    @param shape: shape of the returned array
+    @param rng: a np.random.Generator
+    @param dtype: np.complex128 or np.complex64
+    
+    @return values: the complex Gaussian values
+    """
+    values = np.empty(shape, dtype=dtype)
+    real_dtype = np.finfo(values.dtype).dtype
+    rng.standard_normal(dtype=real_dtype, out=values.view(real_dtype))
+    return values
+
+
+def generate_haar_random_states(n: int, batch_size: int = 1, rng: np.random.Generator = None, dtype=np.complex128) -> np.ndarray:
+    """
+    Function to generate a batch of Haar-random states, i.e. normalized vectors of i.i.d. complex Gaussian amplitudes
+    
+    @param n: total number of data qubit
+    @param batch_size: number of states
+    @param rng: a np.random.Generator or a seed
+    @param dtype: np.complex128 or np.complex64
+    
+    @return states: an array of shape (batch_size, 2^n) whose rows are the normalized states
+    """
+    states = _standard_complex_normal((batch_size, 2 ** n), np.random.default_rng(rng), dtype)
+    states /= np.linalg.norm(states, axis=1, keepdims=True)
+    return states
+
+
+def generate_sparse_states(n: int, nonzero_count: int, batch_size: int = 1, rng: np.random.Generator = None,
+                           dtype=np.complex128) -> tuple:
+    """
+    Function to generate a batch of sparse states with a fixed number of nonzero amplitudes at uniformly random
+    positions, without building any array of size 2^n
+    
+    @param n: total number of data qubit
+    @param nonzero_count: number of nonzero amplitudes of every state, at most 2^n
+    @param batch_size: number of states
+    @param rng: a np.random.Generator or a seed
+    @param dtype: np.complex128 or np.complex64
+    
+    @return (indices, values): two arrays of shape (batch_size, nonzero_count) with the increasing nonzero indices of
+        every state and its normalized complex Gaussian amplitudes, e.g. for QubitEfficientQSP.from_sparse(n, indices[b], values[b])
+    """
+    rng = np.random.default_rng(rng)
+    if not 0 < nonzero_count <= 2 ** n:
+        raise ValueError("Number of nonzero amplitudes needs to lie in [1, 2^n].")
+    indices = np.empty((batch_size, nonzero_count), dtype=np.int64)
+    for b in range(batch_size):
+        indices[b] = np.sort(rng.choice(2 ** n, size=nonzero_count, replace=False))
+    values = _standard_complex_normal((batch_size, nonzero_count), rng, dtype)
+    values /= np.linalg.norm(values, axis=1, keepdims=True)
+    return indices, values
+
+
+def generate_product_states(n: int, batch_size: int = 1, rng: np.random.Generator = None, dtype=np.complex128) -> np.ndarray:
+    """
+    Function to generate a batch of random product states, i.e. unentangled (low-entropy) states whose qubits are
+    independent Haar-random single-qubit states
+    
+    @param n: total number of data qubit
+    @param batch_size: number of states
+    @param rng: a np.random.Generator or a seed
+    @param dtype: np.complex128 or np.complex64
+    
+    @return states: an array of shape (batch_size, 2^n) whose rows are the normalized states
+    """
+    qubit_states = generate_haar_random_states(1, batch_size * n, rng, dtype).reshape(batch_size, n, 2)
+    states = np.ones((batch_size, 1), dtype=dtype)
+    for q in range(n):
+        # qubit 0 is the most significant bit, as in the amplitude arrays
+        states = (states[:, :, np.newaxis] * qubit_states[:, q, np.newaxis, :]).reshape(batch_size, -1)
+    return states
+
+
+def generate_gaussian_states(n: int, batch_size: int = 1, rng: np.random.Generator = None, dtype=np.float64) -> np.ndarray:
+    """
+    Function to generate a batch of structured real states whose squared amplitudes are a discretized Gaussian
+    distribution with random mean and width, as when loading a smooth probability distribution
+    
+    @param n: total number of data qubit
+    @param batch_size: number of states
+    @param rng: a np.random.Generator or a seed
+    @param dtype: np.float64 or np.float32
+    
+    @return states: an array of shape (batch_size, 2^n) whose rows are the normalized states
+    """
+    rng = np.random.default_rng(rng)
+    array_length = 2 ** n
+    means = rng.uniform(0.25, 0.75, size=(batch_size, 1)) * array_length
+    widths = rng.uniform(1 / 64, 1 / 8, size=(batch_size, 1)) * array_length
+    states = np.arange(array_length, dtype=dtype) - means.astype(dtype)
+    states /= widths.astype(dtype)
+    # sqrt(exp(-x^2 / 2)) gives amplitudes whose squares follow the Gaussian distribution
+    np.square(states, out=states)
+    states *= -0.25
+    np.exp(states, out=states)
+    states /= np.linalg.norm(states, axis=1, keepdims=True)
+    return states
+
+
+def generate_state_batches(state_generator, n: int, batch_count: int, batch_size: int = 1, rng: np.random.Generator = None, **kwargs):
+    """
+    Function to stream batches of states for benchmark sweeps, so only one batch is held in memory at a time
+    
+    @param state_generator: one of the batched generators, e.g. generate_haar_random_states or generate_sparse_states
+    @param n: total number of data qubit
+    @param batch_count: number of batches
+    @param batch_size: number of states per batch
+    @param rng: a np.random.Generator or a seed, shared by all batches so the stream is reproducible
+    @param kwargs: further arguments of state_generator, e.g. nonzero_count
+    
+    @return a generator yielding the batch_count return values of state_generator
+    """
+    rng = np.random.default_rng(rng)
+    for _ in range(batch_count):
+        yield state_generator(n, batch_size=batch_size, rng=rng, **kwargs)
+
+
 def binary_to_decimal(binary: str) -> int:
     """
     Function to convert a binary number into a decimal number
@@ -113,19 +241,97 @@ def binary_to_decimal(binary: str) -> int:
     return decimal
 
 
-def measure_time(obj, method_name, *args, **kwargs):
+def gray_code(k: int) -> np.ndarray:
+    """
+    Function to generate the k-bit reflected binary Gray code sequence
+    
+    @param k: number of bits
+    
+    @return gray_code_array: an array of size 2^k whose i-th element is the i-th Gray code word
+    """
+    i = np.arange(2 ** k)
+    return i ^ (i >> 1)
+
+
+def gray_code_rank(gray_code_array: np.ndarray) -> np.ndarray:
+    """
+    Function to invert the reflected binary Gray code, i.e. find the position of each code word in the Gray code sequence
+    
+    @param gray_code_array: array of non-negative Gray code words (up to 64 bits)
+    
+    @return rank_array: an array holding the position of each code word, so that gray_code(k)[rank_array] == gray_code_array
+    """
+    rank_array = np.array(gray_code_array, dtype=np.int64)
+    shift = 1
+    while shift < 64:
+        rank_array ^= rank_array >> shift
+        shift *= 2
+    return rank_array
+
+
+def popcount(int_array: np.ndarray) -> np.ndarray:
+    """
+    Function to count the set bits of every element of an array of non-negative integers (up to 63 bits)
+    
+    @param int_array: array of non-negative integers
+    
+    @return count_array: an array holding the number of set bits of each element
+    """
+    count_array = np.array(int_array, dtype=np.int64)
+    count_array = count_array - ((count_array >> 1) & 0x5555555555555555)
+    count_array = (count_array & 0x3333333333333333) + ((count_array >> 2) & 0x3333333333333333)
+    count_array = (count_array + (count_array >> 4)) & 0x0F0F0F0F0F0F0F0F
+    return (count_array * 0x0101010101010101 & 0x7FFFFFFFFFFFFFFF) >> 56
+
+
+def fast_walsh_hadamard_transform(input_vec: np.ndarray) -> np.ndarray:
+    """
+    Function to apply the (unnormalized) Walsh-Hadamard transform to a vector of length 2^k in O(k 2^k) time
+    
+    @param input_vec: vector of length 2^k to transform
+    
+    @return transformed_vec: the transformed vector, i.e. transformed_vec[x] = sum_m (-1)^popcount(x & m) input_vec[m]
+    """
+    transformed_vec = np.array(input_vec, dtype=float)
+    h = 1
+    while h < len(transformed_vec):
+        pairs = transformed_vec.reshape(-1, 2, h)
+        transformed_vec = np.stack((pairs[:, 0] + pairs[:, 1], pairs[:, 0] - pairs[:, 1]), axis=1).reshape(-1)
+        h *= 2
+    return transformed_vec
+
+
+def measure_resources(obj, method_name, *args, track_memory: bool = False, **kwargs) -> tuple:
+    """
+    Function to call a method and measure its wall time, CPU time and optionally its peak memory
+    
+    @param obj: the object that owns the method
+    @param method_name: name of the method to call
+    @param track_memory: whether to trace the peak memory allocated during the call, which slows down Python-heavy code
+    
+    @return (result, resources): the return value of the method and a dict with "wall_time" and "cpu_time" in seconds
+        and "peak_memory" in bytes (None when not tracked)
+    """
     # Get the method from the object
     method = getattr(obj, method_name)
 
-    # Measure CPU start time
+    if track_memory:
+        tracemalloc.start()
+    start_wall_time = time.perf_counter()
     start_cpu_time = time.process_time()
 
     # Call the method
-    method(*args, **kwargs)
+    result = method(*args, **kwargs)
 
-    # Measure CPU end time
-    end_cpu_time = time.process_time()
+    cpu_time = time.process_time() - start_cpu_time
+    wall_time = time.perf_counter() - start_wall_time
+    peak_memory = None
+    if track_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, {"wall_time": wall_time, "cpu_time": cpu_time, "peak_memory": peak_memory}
 
-    cpu_time = end_cpu_time - start_cpu_time
 
-    return cpu_time
\ No newline at end of file
+def measure_time(obj, method_name, *args, **kwargs):
+    # Measure the CPU time of the method call
+    return measure_resources(obj, method_name, *args, **kwargs)[1]["cpu_time"]
\ No newline at end of file
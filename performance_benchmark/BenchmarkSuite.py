@@ -0,0 +1,247 @@
+"""
+Scripted benchmark suite for the QSP implementation.
+
+Sweeps the number of qubits, the density of the input state and the decomposition mode, times every
+phase separately and writes the records to JSON or CSV. A stored baseline can be given to flag regressions.
+
+Example (from the repository root):
+    python performance_benchmark/BenchmarkSuite.py --n 8 10 12 --density 1.0 0.1 --output results.json
+    python performance_benchmark/BenchmarkSuite.py --n 8 10 12 --baseline results.json
+"""
+import argparse
+import csv
+import importlib
+import json
+import os
+import sys
+
+import numpy as np
+
+# import modules from parent folder
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")))
+from GateSequence import GateSequence
+from QubitEfficientQSP import QubitEfficientQSP
+from StatevectorVerifier import StatevectorVerifier
+
+from helper_functions import measure_resources
+
+RECORD_FIELDS = ["n", "density", "decomposition", "phase", "wall_time", "cpu_time", "peak_memory", "gate_count", "depth", "fidelity"]
+
+
+class BenchmarkSuite:
+    """
+    Class for running a reproducible sweep of QSP benchmarks with per-phase timings.
+    """
+
+    def __init__(self, n_values: list, densities: list, decompositions: list, repeats: int = 1,
+                 simulator: str = "numpy", include_qiskit: bool = False, track_memory: bool = True, seed: int = 0):
+        """
+        Initialize the BenchmarkSuite with the sweep to run.
+
+        Args:
+            n_values (list): The numbers of qubits.
+            densities (list): The fractions of nonzero amplitudes, 1.0 for dense states.
+            decompositions (list): The decomposition modes of QubitEfficientQSP.construct_circuit.
+            repeats (int): The number of timed repetitions of every phase; the minimum is recorded.
+            simulator (str): "numpy" for the gate-level StatevectorVerifier, "braket" for the Braket LocalSimulator, or "none".
+                Both simulate the constructed circuit of every decomposition.
+            include_qiskit (bool): Whether to time Qiskit's initialize (synthesized to u/cx gates) as a baseline.
+            track_memory (bool): Whether to record the peak memory of every phase in one extra untimed run.
+            seed (int): The seed of the random input states.
+        """
+        if simulator not in ("numpy", "braket", "none"):
+            raise ValueError("Simulator needs to be 'numpy', 'braket' or 'none'.")
+        self._n_values = n_values
+        self._densities = densities
+        self._decompositions = decompositions
+        self._repeats = repeats
+        self._simulator = simulator
+        self._include_qiskit = include_qiskit
+        self._track_memory = track_memory
+        self._seed = seed
+
+    def _generate_input_array(self, n: int, density: float) -> np.ndarray:
+        """Generate a normalized random complex array with round(density * 2^n) nonzero amplitudes."""
+        rng = np.random.default_rng([self._seed, n, int(density * 1e6)])
+        nonzero_count = max(1, int(round(density * 2 ** n)))
+        input_array = np.zeros(2 ** n, dtype=np.complex128)
+        nonzero_indices = rng.choice(2 ** n, size=nonzero_count, replace=False)
+        input_array[nonzero_indices] = rng.normal(size=nonzero_count) + 1j * rng.normal(size=nonzero_count)
+        return input_array / np.linalg.norm(input_array)
+
+    def _measure_phase(self, function, *args, **kwargs) -> tuple:
+        """Call a function repeats times and return its last result and the minimum wall and CPU times."""
+        timings = []
+        for _ in range(self._repeats):
+            result, resources = measure_resources(function, "__call__", *args, **kwargs)
+            timings.append(resources)
+        resources = {"wall_time": min(timing["wall_time"] for timing in timings),
+                     "cpu_time": min(timing["cpu_time"] for timing in timings),
+                     "peak_memory": None}
+        if self._track_memory:
+            resources["peak_memory"] = measure_resources(function, "__call__", *args, track_memory=True, **kwargs)[1]["peak_memory"]
+        return result, resources
+
+    @staticmethod
+    def _record(n: int, density: float, decomposition: str, phase: str, resources: dict, **metrics) -> dict:
+        """Assemble a benchmark record with every field of RECORD_FIELDS."""
+        record = dict.fromkeys(RECORD_FIELDS)
+        record.update(n=n, density=density, decomposition=decomposition, phase=phase, **resources)
+        record.update(metrics)
+        return record
+
+    def _simulate(self, simulated_circuit, input_array: np.ndarray) -> float:
+        """Simulate the constructed circuit (a GateSequence for "numpy") and return the fidelity with the input array."""
+        if self._simulator == "numpy":
+            return float(np.abs(np.vdot(input_array, StatevectorVerifier.simulate_gate_sequence(simulated_circuit))) ** 2)
+        from braket.devices import LocalSimulator
+        simulated_circuit = simulated_circuit.copy()
+        simulated_circuit.state_vector() # convert the circuit to state vector
+        braket_state_vector_result = LocalSimulator().run(simulated_circuit, shots=0).result().values[0] # extract the result
+        return float(np.abs(np.vdot(input_array, braket_state_vector_result)) ** 2)
+
+    def _qiskit_initialize(self, input_array: np.ndarray, n: int):
+        """Build Qiskit's initialize circuit for the input array and synthesize it to u/cx gates."""
+        from qiskit import QuantumCircuit, transpile
+        qiskit_circ = QuantumCircuit(n)
+        qiskit_circ.initialize(input_array, range(n))
+        return transpile(qiskit_circ, basis_gates=["u", "cx"])
+
+    def run(self) -> list:
+        """
+        Run the sweep.
+
+        Returns:
+            list: One record (dict with the keys of RECORD_FIELDS) per configuration and phase.
+        """
+        # the core modules do not import the backends, so load them before the first timed phase
+        importlib.import_module("braket.circuits")
+        if self._simulator == "braket":
+            importlib.import_module("braket.devices")
+        if self._include_qiskit:
+            importlib.import_module("qiskit")
+
+        records = []
+        for n in self._n_values:
+            for density in self._densities:
+                input_array = self._generate_input_array(n, density)
+                for decomposition in self._decompositions:
+                    qsp, resources = self._measure_phase(QubitEfficientQSP, input_array)
+                    records.append(self._record(n, density, decomposition, "angle_computation", resources))
+
+                    # every repetition starts from a fresh instance since construct_circuit appends to the object's circuit
+                    circuit, resources = self._measure_phase(
+                        lambda: QubitEfficientQSP.from_angle_tree(
+                            n, [qsp.get_ry_angle_level(s) for s in range(1, n + 1)],
+                            [qsp.get_rz_angle_level(s) for s in range(1, n + 1)]).construct_circuit(decomposition=decomposition))
+                    records.append(self._record(n, density, decomposition, "circuit_construction", resources,
+                                                gate_count=len(circuit.instructions), depth=circuit.depth))
+
+                    if self._simulator != "none":
+                        # the numpy simulator applies the gates of the constructed circuit, converted outside the timed phase
+                        simulated_circuit = GateSequence.from_braket(circuit, n) if self._simulator == "numpy" else circuit
+                        fidelity, resources = self._measure_phase(self._simulate, simulated_circuit, input_array)
+                        records.append(self._record(n, density, decomposition, "simulation", resources, fidelity=fidelity))
+
+                if self._include_qiskit:
+                    qiskit_circ, resources = self._measure_phase(self._qiskit_initialize, input_array, n)
+                    records.append(self._record(n, density, None, "qiskit_initialize", resources,
+                                                gate_count=sum(qiskit_circ.count_ops().values()), depth=qiskit_circ.depth()))
+        return records
+
+    @staticmethod
+    def write_records(records: list, path: str):
+        """Write the records to a .json or .csv file, chosen by the file extension."""
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as csv_file:
+                writer = csv.DictWriter(csv_file, fieldnames=RECORD_FIELDS)
+                writer.writeheader()
+                writer.writerows(records)
+        else:
+            with open(path, "w") as json_file:
+                json.dump(records, json_file, indent=2)
+
+    @staticmethod
+    def read_records(path: str) -> list:
+        """Read records written by write_records."""
+        if path.endswith(".csv"):
+            with open(path, newline="") as csv_file:
+                records = list(csv.DictReader(csv_file))
+            for record in records:
+                for field in RECORD_FIELDS:
+                    if record[field] == "":
+                        record[field] = None
+                    elif field not in ("decomposition", "phase"):
+                        record[field] = float(record[field])
+            return records
+        with open(path) as json_file:
+            return json.load(json_file)
+
+    @staticmethod
+    def compare_to_baseline(records: list, baseline_records: list, threshold: float = 1.25, min_wall_time: float = 1e-3) -> list:
+        """
+        Flag the phases whose wall time grew beyond the baseline.
+
+        Args:
+            records (list): The new records.
+            baseline_records (list): The stored baseline records.
+            threshold (float): The allowed ratio of new to baseline wall time.
+            min_wall_time (float): Phases faster than this in both runs are ignored as noise.
+
+        Returns:
+            list: One dict per regression with the configuration, both wall times and their ratio.
+        """
+        def key(record):
+            return int(record["n"]), float(record["density"]), record["decomposition"], record["phase"]
+
+        baseline_wall_times = {key(record): record["wall_time"] for record in baseline_records}
+        regressions = []
+        for record in records:
+            baseline_wall_time = baseline_wall_times.get(key(record))
+            if baseline_wall_time is None or max(record["wall_time"], baseline_wall_time) < min_wall_time:
+                continue
+            ratio = record["wall_time"] / max(baseline_wall_time, 1e-12)
+            if ratio > threshold:
+                regressions.append({"n": record["n"], "density": record["density"], "decomposition": record["decomposition"],
+                                    "phase": record["phase"], "baseline_wall_time": baseline_wall_time,
+                                    "wall_time": record["wall_time"], "ratio": ratio})
+        return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the qubit efficient QSP implementation.")
+    parser.add_argument("--n", type=int, nargs="+", default=[4, 6, 8, 10], help="numbers of qubits")
+    parser.add_argument("--density", type=float, nargs="+", default=[1.0], help="fractions of nonzero amplitudes")
+    parser.add_argument("--decomposition", nargs="+", default=["multi_control", "gray_code"], help="decomposition modes")
+    parser.add_argument("--repeats", type=int, default=3, help="timed repetitions per phase (the minimum is kept)")
+    parser.add_argument("--simulator", choices=["numpy", "braket", "none"], default="numpy", help="simulator for the simulation phase")
+    parser.add_argument("--qiskit", action="store_true", help="also time Qiskit's initialize as a baseline")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random input states")
+    parser.add_argument("--output", help="write the records to this .json or .csv file")
+    parser.add_argument("--baseline", help="compare against the records in this .json or .csv file")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed ratio of new to baseline wall time")
+    args = parser.parse_args(argv)
+
+    benchmark_suite = BenchmarkSuite(args.n, args.density, args.decomposition, repeats=args.repeats, simulator=args.simulator,
+                                     include_qiskit=args.qiskit, track_memory=not args.no_memory, seed=args.seed)
+    records = benchmark_suite.run()
+    for record in records:
+        print(f"n={record['n']:<3} density={record['density']:<6} {str(record['decomposition']):<14} {record['phase']:<21} "
+              f"wall={record['wall_time']:.4f}s cpu={record['cpu_time']:.4f}s peak_memory={record['peak_memory']} "
+              f"gates={record['gate_count']} depth={record['depth']} fidelity={record['fidelity']}")
+    if args.output:
+        BenchmarkSuite.write_records(records, args.output)
+
+    if args.baseline:
+        regressions = BenchmarkSuite.compare_to_baseline(records, BenchmarkSuite.read_records(args.baseline), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION n={regression['n']} density={regression['density']} {regression['decomposition']} "
+                  f"{regression['phase']}: {regression['baseline_wall_time']:.4f}s -> {regression['wall_time']:.4f}s "
+                  f"({regression['ratio']:.2f}x)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,11 @@
-import matplotlib as mpl
-import matplotlib.pyplot as plt
 import numpy as np
 
-import braket
-from braket.circuits import Circuit
-from braket.devices import LocalSimulator
-
-from qiskit import QuantumCircuit
-from qiskit.execute_function import execute
-from qiskit import BasicAer
-
 # import functions from parent folder
 import sys
 import os
-parent_dir = os.path.abspath(os.path.join(os.path.dirname('performance_benchmark'), ".."))
-sys.path.append(parent_dir)
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
 from QubitEfficientQSP import QubitEfficientQSP
 
 from helper_functions import nicer_array_display
@@ -31,36 +22,65 @@ class BenchmarkTime():
         self._array_len = len(normalized_complex_array)
         self._n = int(np.log2(self._array_len))
 
-        self._braket_circ = Circuit()
-        self._qiskit_circ = QuantumCircuit(self._n)
-        self._braket_circ_from_unitary_alt = Circuit()
+        # Braket and Qiskit are imported by the setup methods of their experiment, outside of the timed runs
+        self._braket_circ = None
+        self._qiskit_circ = None
+        self._qiskit_qsp_circ = None
+        self._braket_circ_from_unitary_alt = None
 
     def setup_braket(self):
+        import braket.devices # load the simulator before run_braket is timed
         qsp_braket = QubitEfficientQSP(self._normalized_complex_array) # construct the QSP object
-        self.braket_circ = qsp_braket.construct_circuit() # create the circuit using the QSP object
+        self._braket_circ = qsp_braket.construct_circuit() # create the circuit using the QSP object
 
     def run_braket(self):
+        from braket.devices import LocalSimulator
         braket_device = LocalSimulator() # define the simulator
         self._braket_circ.state_vector() # convert the circuit to state vector
         braket_state_vector_result = braket_device.run(self._braket_circ, shots=0).result().values[0] # extract the result
         print(nicer_array_display(braket_state_vector_result, 3)) # print out the resulted state vector
+        return braket_state_vector_result
 
     def setup_qiskit(self):
+        from qiskit import QuantumCircuit
+        import qiskit.execute_function # load the simulator before run_qiskit_statevector is timed
+        self._qiskit_circ = QuantumCircuit(self._n)
         self._qiskit_circ.initialize(self._normalized_complex_array, range(self._n))
 
     def run_qiskit_statevector(self):
+        from qiskit import BasicAer
+        from qiskit.execute_function import execute
         qiskit_backend = BasicAer.get_backend('statevector_simulator')
         job = execute(self._qiskit_circ, qiskit_backend)
         qiskit_state_vector_result = job.result().get_statevector()
         print(nicer_array_display(qiskit_state_vector_result, 3)) # print out the resulted state vector
+        return qiskit_state_vector_result
+
+    def setup_qiskit_qsp(self):
+        import qiskit.execute_function # load the simulator before run_qiskit_qsp_statevector is timed
+        qsp_qiskit = QubitEfficientQSP(self._normalized_complex_array) # construct the QSP object
+        self._qiskit_qsp_circ = qsp_qiskit.construct_gate_sequence().to_qiskit() # emit our circuit for Qiskit
+
+    def run_qiskit_qsp_statevector(self):
+        from qiskit import BasicAer
+        from qiskit.execute_function import execute
+        qiskit_backend = BasicAer.get_backend('statevector_simulator')
+        job = execute(self._qiskit_qsp_circ, qiskit_backend)
+        qiskit_state_vector_result = job.result().get_statevector()
+        print(nicer_array_display(qiskit_state_vector_result, 3)) # print out the resulted state vector
+        return qiskit_state_vector_result
 
     def setup_braket_unitary(self):
+        from braket.circuits import Circuit
+        self._braket_circ_from_unitary_alt = Circuit()
         braket_qsp_circ_unitary_matrix_alt = self._braket_circ.state_vector().to_unitary()
         self._braket_circ_from_unitary_alt.unitary(matrix=braket_qsp_circ_unitary_matrix_alt, targets=range(self._n))
 
     def run_braket_unitary(self):
+        from braket.devices import LocalSimulator
         braket_device = LocalSimulator()
         self._braket_circ_from_unitary_alt.state_vector() # convert the circuit to state vector
         braket_result_from_unitary_alt = braket_device.run(self._braket_circ_from_unitary_alt, shots=0).result().values[0] # extract the result
         print(nicer_array_display(braket_result_from_unitary_alt, 3)) # print out the resulted state vector
+        return braket_result_from_unitary_alt
 
@@ -0,0 +1,131 @@
+"""
+Import-time benchmark for the QSP modules.
+
+Imports every module in a fresh interpreter, records the import time and which backend packages
+(Braket, Qiskit, matplotlib) the import pulled in, and writes the records to JSON. A stored baseline can be
+given to flag modules that became slower to import or started loading a backend.
+
+Example (from the repository root):
+    python performance_benchmark/ImportTimeBenchmark.py --output import_times.json
+    python performance_benchmark/ImportTimeBenchmark.py --baseline import_times.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPOSITORY_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# the modules that only need NumPy, and the modules of the backend-specific code paths
+CORE_MODULES = ["QuantumStatePreparation", "QubitEfficientQSP", "BatchQubitEfficientQSP", "GateSequence",
+                "ResourceEstimator", "StatevectorVerifier", "CircuitCache", "ParallelCircuitBuilder"]
+BACKEND_MODULES = ["PeepholeOptimizer"]
+BACKEND_PACKAGES = ["braket", "qiskit", "matplotlib"]
+
+# run in the child interpreter: numpy is imported first, so its own import time is not attributed to the module
+IMPORT_SCRIPT = """
+import importlib, json, sys, time
+import numpy
+start_time = time.perf_counter()
+importlib.import_module(sys.argv[1])
+import_time = time.perf_counter() - start_time
+loaded_backends = sorted({name.split(".")[0] for name in sys.modules} & set(sys.argv[2:]))
+print(json.dumps({"import_time": import_time, "loaded_backends": loaded_backends}))
+"""
+
+
+class ImportTimeBenchmark:
+    """
+    Class for measuring the cold import time of the QSP modules, each in a fresh interpreter.
+    """
+
+    def __init__(self, modules: list = None, repeats: int = 3):
+        """
+        Initialize the ImportTimeBenchmark with the modules to import.
+
+        Args:
+            modules (list): The module names, relative to the repository root. Defaults to CORE_MODULES and BACKEND_MODULES.
+            repeats (int): The number of fresh interpreters per module; the minimum import time is recorded.
+        """
+        self._modules = CORE_MODULES + BACKEND_MODULES if modules is None else modules
+        self._repeats = repeats
+
+    @staticmethod
+    def _measure_import(module: str) -> dict:
+        """Import a module in a fresh interpreter and return its import time and the loaded backend packages."""
+        completed_process = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT, module] + BACKEND_PACKAGES,
+                                           cwd=REPOSITORY_DIR, capture_output=True, text=True, check=True)
+        return json.loads(completed_process.stdout)
+
+    def run(self) -> list:
+        """
+        Run the benchmark.
+
+        Returns:
+            list: One record {"module", "import_time", "loaded_backends"} per module.
+        """
+        records = []
+        for module in self._modules:
+            measurements = [self._measure_import(module) for _ in range(self._repeats)]
+            records.append({"module": module, "import_time": min(measurement["import_time"] for measurement in measurements),
+                            "loaded_backends": measurements[-1]["loaded_backends"]})
+        return records
+
+    @staticmethod
+    def compare_to_baseline(records: list, baseline_records: list, threshold: float = 1.5, min_import_time: float = 0.05) -> list:
+        """
+        Flag the modules whose import became slower than the baseline or loads backends the baseline did not.
+
+        Args:
+            records (list): The new records.
+            baseline_records (list): The stored baseline records.
+            threshold (float): The allowed ratio of new to baseline import time.
+            min_import_time (float): Imports faster than this in both runs are not compared by time, as noise.
+
+        Returns:
+            list: One dict per regression with the module, both import times, their ratio and the new backends.
+        """
+        baseline_by_module = {record["module"]: record for record in baseline_records}
+        regressions = []
+        for record in records:
+            baseline_record = baseline_by_module.get(record["module"])
+            if baseline_record is None:
+                continue
+            new_backends = sorted(set(record["loaded_backends"]) - set(baseline_record["loaded_backends"]))
+            ratio = record["import_time"] / max(baseline_record["import_time"], 1e-12)
+            is_slower = ratio > threshold and max(record["import_time"], baseline_record["import_time"]) >= min_import_time
+            if new_backends or is_slower:
+                regressions.append({"module": record["module"], "baseline_import_time": baseline_record["import_time"],
+                                    "import_time": record["import_time"], "ratio": ratio, "new_backends": new_backends})
+        return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the qubit efficient QSP modules.")
+    parser.add_argument("--module", nargs="+", help="module names (default: all QSP modules)")
+    parser.add_argument("--repeats", type=int, default=3, help="fresh interpreters per module (the minimum is kept)")
+    parser.add_argument("--output", help="write the records to this .json file")
+    parser.add_argument("--baseline", help="compare against the records in this .json file")
+    parser.add_argument("--threshold", type=float, default=1.5, help="allowed ratio of new to baseline import time")
+    args = parser.parse_args(argv)
+
+    records = ImportTimeBenchmark(args.module, repeats=args.repeats).run()
+    for record in records:
+        print(f"{record['module']:<24} import={record['import_time']:.4f}s backends={','.join(record['loaded_backends']) or '-'}")
+    if args.output:
+        with open(args.output, "w") as json_file:
+            json.dump(records, json_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as json_file:
+            regressions = ImportTimeBenchmark.compare_to_baseline(records, json.load(json_file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['module']}: {regression['baseline_import_time']:.4f}s -> "
+                  f"{regression['import_time']:.4f}s ({regression['ratio']:.2f}x), new backends: {regression['new_backends']}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Benchmark of the parallel circuit writing against the serial one.
+
+Writes the multi-control QSP circuit of a random dense state to an OpenQASM or JSONL file serially with
+QubitEfficientQSP.write_gate_stream and with ParallelCircuitBuilder for every number of workers, checks
+that the files are identical and reports the speedups.
+
+Example (from the repository root):
+    python performance_benchmark/ParallelBuildBenchmark.py --n 18 20 22 --workers 1 2 4 8
+"""
+import argparse
+import filecmp
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# import modules from parent folder
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+from QubitEfficientQSP import QubitEfficientQSP
+from ParallelCircuitBuilder import ParallelCircuitBuilder
+
+from helper_functions import generate_haar_random_states
+
+
+class ParallelBuildBenchmark:
+    """
+    Class for comparing the wall time of the serial and the parallel circuit writing.
+    """
+
+    def __init__(self, n_values: list, worker_counts: list, repeats: int = 3, file_format: str = "openqasm", seed: int = 0):
+        """
+        Initialize the ParallelBuildBenchmark with the sweep to run.
+
+        Args:
+            n_values (list): The numbers of qubits.
+            worker_counts (list): The numbers of worker processes of the parallel write.
+            repeats (int): The number of timed repetitions of every write; the minimum is recorded.
+            file_format (str): "openqasm" or "jsonl", see QubitEfficientQSP.write_gate_stream.
+            seed (int): The seed of the random input states.
+        """
+        self._n_values = n_values
+        self._worker_counts = worker_counts
+        self._repeats = repeats
+        self._file_format = file_format
+        self._seed = seed
+
+    def _measure(self, function, *args) -> float:
+        """Call a function repeats times and return the minimum wall time."""
+        wall_times = []
+        for _ in range(self._repeats):
+            start_time = time.perf_counter()
+            function(*args)
+            wall_times.append(time.perf_counter() - start_time)
+        return min(wall_times)
+
+    def run(self) -> list:
+        """
+        Run the sweep.
+
+        Returns:
+            list: One record {"n", "workers", "wall_time", "speedup", "identical"} per n and number of workers, with
+                workers None for the serial write.
+        """
+        records = []
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            serial_path = os.path.join(temporary_directory, "serial")
+            parallel_path = os.path.join(temporary_directory, "parallel")
+            for n in self._n_values:
+                qsp = QubitEfficientQSP(generate_haar_random_states(n, rng=[self._seed, n])[0])
+                serial_wall_time = self._measure(qsp.write_gate_stream, serial_path, "multi_control", self._file_format)
+                records.append({"n": n, "workers": None, "wall_time": serial_wall_time, "speedup": 1.0, "identical": True})
+                for worker_count in self._worker_counts:
+                    builder = ParallelCircuitBuilder(qsp, max_workers=worker_count)
+                    wall_time = self._measure(builder.write_gate_stream, parallel_path, self._file_format)
+                    records.append({"n": n, "workers": worker_count, "wall_time": wall_time, "speedup": serial_wall_time / wall_time,
+                                    "identical": filecmp.cmp(serial_path, parallel_path, shallow=False)})
+        return records
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the parallel QSP circuit writing against the serial one.")
+    parser.add_argument("--n", type=int, nargs="+", default=[16, 18, 20], help="numbers of qubits")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="numbers of worker processes")
+    parser.add_argument("--repeats", type=int, default=3, help="timed repetitions per write (the minimum is kept)")
+    parser.add_argument("--format", choices=["openqasm", "jsonl"], default="openqasm", help="format of the written circuit")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random input states")
+    parser.add_argument("--output", help="write the records to this .json file")
+    args = parser.parse_args(argv)
+
+    print(f"{os.cpu_count()} processors available")
+    records = ParallelBuildBenchmark(args.n, args.workers, repeats=args.repeats, file_format=args.format, seed=args.seed).run()
+    for record in records:
+        print(f"n={record['n']:<3} workers={str(record['workers'] or 'serial'):<7} wall={record['wall_time']:.4f}s "
+              f"speedup={record['speedup']:.2f}x identical={record['identical']}")
+    if args.output:
+        with open(args.output, "w") as json_file:
+            json.dump(records, json_file, indent=2)
+    return 0 if all(record["identical"] for record in records) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+from BatchQubitEfficientQSP import BatchQubitEfficientQSP
+from QubitEfficientQSP import QubitEfficientQSP
+
+from braket.devices import LocalSimulator
+
+from helper_functions import generate_haar_random_states, generate_normalized_complex_array
+
+class TestBatchQubitEfficientQSP(unittest.TestCase):
+
+    def setUp(self):
+        self.input_arrays = np.array([generate_normalized_complex_array(4) for _ in range(5)])
+        self.batch_qsp = BatchQubitEfficientQSP(self.input_arrays)
+
+    def test_initialization(self):
+        self.assertEqual(self.batch_qsp.get_batch_size(), 5)
+        self.assertEqual(self.batch_qsp.get_array_len(), 16)
+        self.assertEqual(self.batch_qsp.get_n(), 4)
+        self.assertEqual(self.batch_qsp.get_ry_angle_level(1).shape, (5, 8))
+        self.assertEqual(self.batch_qsp.get_rz_angle_level(4).shape, (5, 1))
+
+    def test_angle_tree_matches_single_state(self):
+        for b in range(5):
+            qsp = QubitEfficientQSP(self.input_arrays[b])
+            for s in range(1, 5):
+                np.testing.assert_array_equal(self.batch_qsp.get_ry_angle_level(s)[b], qsp.get_ry_angle_level(s))
+                np.testing.assert_array_equal(self.batch_qsp.get_rz_angle_level(s)[b], qsp.get_rz_angle_level(s))
+
+    def test_reduced_precision(self):
+        batch_qsp = BatchQubitEfficientQSP(self.input_arrays, dtype=np.float32)
+        for b in range(5):
+            qsp = QubitEfficientQSP(self.input_arrays[b], dtype=np.float32)
+            for s in range(1, 5):
+                np.testing.assert_array_equal(batch_qsp.get_ry_angle_level(s)[b], qsp.get_ry_angle_level(s))
+                np.testing.assert_array_equal(batch_qsp.get_rz_angle_level(s)[b], qsp.get_rz_angle_level(s))
+        for n in (10, 16):
+            self.assertEqual(BatchQubitEfficientQSP(generate_haar_random_states(n, 8, rng=0, dtype=np.complex64), dtype=np.float32).get_batch_size(), 8)
+
+    def test_construct_circuits(self):
+        circuits = self.batch_qsp.construct_circuits()
+        self.assertEqual(len(circuits), 5)
+        braket_device = LocalSimulator() # define the simulator
+        for b, circuit in enumerate(circuits):
+            self.assertEqual(circuit, QubitEfficientQSP(self.input_arrays[b]).construct_circuit())
+            circuit.state_vector() # convert the circuit to state vector
+            braket_state_vector_result = braket_device.run(circuit, shots=0).result().values[0] # extract the result
+            vec_norm = np.abs(np.dot(self.input_arrays[b], np.conj(braket_state_vector_result))) # compute |<psi'|psi>| since there might be global phase diff
+            np.testing.assert_almost_equal(vec_norm, 1.0)
+
+    def test_construct_parametric_circuits(self):
+        parametric_circuits = self.batch_qsp.construct_parametric_circuits()
+        self.assertEqual(len(parametric_circuits), 5)
+        for b, (template, parameter_values) in enumerate(parametric_circuits):
+            self.assertIs(template, parametric_circuits[0][0])
+            bound_circuit = QubitEfficientQSP.bind_parameter_values(template, parameter_values)
+            self.assertEqual(bound_circuit, QubitEfficientQSP(self.input_arrays[b]).construct_circuit())
+
+    def test_invalid_batch(self):
+        with self.assertRaises(ValueError):
+            BatchQubitEfficientQSP(self.input_arrays[0])
+        with self.assertRaises(ValueError):
+            BatchQubitEfficientQSP(self.input_arrays[:, :12])
+        not_normalized_arrays = self.input_arrays.copy()
+        not_normalized_arrays[3] *= 2
+        with self.assertRaises(ValueError) as context:
+            BatchQubitEfficientQSP(not_normalized_arrays)
+        self.assertTrue("rows [3]" in str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from performance_benchmark.BenchmarkSuite import RECORD_FIELDS, BenchmarkSuite
+
+class TestBenchmarkSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.records = BenchmarkSuite([3, 4], [1.0, 0.5], ["multi_control", "gray_code"], track_memory=False).run()
+
+    def test_run(self):
+        self.assertEqual(len(self.records), 2 * 2 * 2 * 3)
+        for record in self.records:
+            self.assertEqual(set(record), set(RECORD_FIELDS))
+            if record["phase"] == "simulation":
+                self.assertAlmostEqual(record["fidelity"], 1.0)
+        gate_counts = {record["decomposition"]: record["gate_count"] for record in self.records
+                       if record["phase"] == "circuit_construction" and (record["n"], record["density"]) == (4, 1.0)}
+        self.assertNotEqual(gate_counts["multi_control"], gate_counts["gray_code"])
+
+    def test_write_and_read_records(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for file_name in ("records.json", "records.csv"):
+                path = os.path.join(directory, file_name)
+                BenchmarkSuite.write_records(self.records, path)
+                read_records = BenchmarkSuite.read_records(path)
+                self.assertEqual(len(read_records), len(self.records))
+                for read_record, record in zip(read_records, self.records):
+                    for field in RECORD_FIELDS:
+                        if isinstance(record[field], float):
+                            self.assertAlmostEqual(read_record[field], record[field])
+                        else:
+                            self.assertEqual(read_record[field], record[field])
+
+    def test_compare_to_baseline(self):
+        baseline_records = [dict(record, wall_time=0.01) for record in self.records]
+        records = [dict(record, wall_time=0.01) for record in self.records]
+        self.assertEqual(BenchmarkSuite.compare_to_baseline(records, baseline_records), [])
+        records[0]["wall_time"] = 0.02
+        records[1]["wall_time"] = 0.012 # within the threshold
+        records[2]["wall_time"] = 0.0005
+        baseline_records[2]["wall_time"] = 0.0001 # slower, but below min_wall_time in both runs
+        regressions = BenchmarkSuite.compare_to_baseline(records, baseline_records, threshold=1.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertEqual((regressions[0]["n"], regressions[0]["phase"]), (records[0]["n"], records[0]["phase"]))
+        self.assertAlmostEqual(regressions[0]["ratio"], 2.0)
+        # records without a baseline are skipped
+        self.assertEqual(BenchmarkSuite.compare_to_baseline(records, baseline_records[1:]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
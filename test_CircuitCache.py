@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from CircuitCache import CircuitCache
+from QubitEfficientQSP import QubitEfficientQSP
+
+from helper_functions import generate_normalized_complex_array
+
+class TestCircuitCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        # on the quantization grid, so a perturbation of 1e-15 never crosses a rounding boundary
+        self.input_array = np.round(generate_normalized_complex_array(4), 12)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_hit_matches_construction(self):
+        cache = CircuitCache(self.directory.name)
+        for decomposition in ("multi_control", "gray_code"):
+            circuit = QubitEfficientQSP(self.input_array).construct_circuit(decomposition=decomposition)
+            self.assertEqual(cache.construct_circuit(self.input_array, decomposition).instructions, circuit.instructions)
+            # a new instance reads the entry written by the first one
+            qsp, gate_sequence = CircuitCache(self.directory.name).construct_gate_sequence(self.input_array, decomposition)
+            self.assertEqual(gate_sequence.to_braket().instructions, circuit.instructions)
+            for s in range(1, 5):
+                np.testing.assert_array_equal(qsp.get_ry_angle_level(s), QubitEfficientQSP(self.input_array).get_ry_angle_level(s))
+        self.assertEqual(cache.get_statistics(), {"hits": 0, "misses": 2, "evictions": 0})
+        cache.construct_circuit(self.input_array + 1e-15, "gray_code")
+        self.assertEqual(cache.get_statistics()["hits"], 1)
+
+    def test_key(self):
+        cache = CircuitCache(self.directory.name)
+        key = cache.compute_key(self.input_array)
+        self.assertEqual(key, cache.compute_key(self.input_array + 1e-15))
+        self.assertNotEqual(key, cache.compute_key(self.input_array, decomposition="gray_code"))
+        self.assertNotEqual(key, cache.compute_key(self.input_array, tolerance=1e-8))
+        self.assertNotEqual(key, cache.compute_key(self.input_array[::-1]))
+
+    def test_lru_eviction(self):
+        cache = CircuitCache(self.directory.name)
+        input_arrays = [generate_normalized_complex_array(4) for _ in range(3)]
+        cache.construct_circuit(input_arrays[0])
+        entry_size = os.path.getsize(os.path.join(self.directory.name, cache.compute_key(input_arrays[0]) + ".npz"))
+        cache = CircuitCache(self.directory.name, max_size_bytes=2 * entry_size)
+        cache.construct_circuit(input_arrays[1])
+        # backdate the first entry, so the order does not depend on the timestamp resolution
+        os.utime(os.path.join(self.directory.name, cache.compute_key(input_arrays[0]) + ".npz"), (0, 0))
+        cache.construct_circuit(input_arrays[1])
+        cache.construct_circuit(input_arrays[2])
+        self.assertEqual(cache.get_statistics(), {"hits": 1, "misses": 2, "evictions": 1})
+        self.assertEqual(sorted(os.listdir(self.directory.name)),
+                         sorted(cache.compute_key(input_array) + ".npz" for input_array in input_arrays[1:]))
+
+    def test_stale_temporary_files(self):
+        stale_path = os.path.join(self.directory.name, ".stale.tmp")
+        fresh_path = os.path.join(self.directory.name, ".fresh.tmp")
+        for path in (stale_path, fresh_path):
+            with open(path, "wb") as temporary_file:
+                temporary_file.write(b"0" * 1000)
+        os.utime(stale_path, (0, 0))
+        cache = CircuitCache(self.directory.name, max_size_bytes=1500)
+        cache.construct_circuit(self.input_array)
+        # the stale file of a crashed writer is removed, the fresh one may still be renamed and counts toward the bound
+        self.assertFalse(os.path.exists(stale_path))
+        self.assertTrue(os.path.exists(fresh_path))
+        self.assertEqual(cache.get_statistics()["evictions"], 1)
+        self.assertEqual(os.listdir(self.directory.name), [".fresh.tmp"])
+
+    def test_shared_directory(self):
+        entry_cache = CircuitCache(self.directory.name)
+        entry_cache.construct_circuit(self.input_array)
+        entry_size = os.path.getsize(os.path.join(self.directory.name, entry_cache.compute_key(self.input_array) + ".npz"))
+        os.remove(os.path.join(self.directory.name, entry_cache.compute_key(self.input_array) + ".npz"))
+        # two instances, as in two processes, whose writes only exceed the bound together
+        caches = [CircuitCache(self.directory.name, max_size_bytes=3 * entry_size) for _ in range(2)]
+        for k in range(8):
+            caches[k % 2].construct_circuit(generate_normalized_complex_array(4))
+            self.assertLessEqual(sum(entry.stat().st_size for entry in os.scandir(self.directory.name)), 3 * entry_size)
+        self.assertEqual(len(os.listdir(self.directory.name)), 3)
+        self.assertEqual(sum(cache.get_statistics()["evictions"] for cache in caches), 5)
+
+if __name__ == '__main__':
+    unittest.main()
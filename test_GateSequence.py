@@ -0,0 +1,89 @@
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from braket.devices import LocalSimulator
+from braket.ir.openqasm import Program
+from GateSequence import GateSequence
+from QubitEfficientQSP import QubitEfficientQSP
+
+class TestGateSequence(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(12)
+        self.input_array = rng.normal(size=16) + 1j * rng.normal(size=16)
+        self.input_array /= np.linalg.norm(self.input_array)
+
+    def _braket_fidelity(self, task_specification) -> float:
+        state_vector = LocalSimulator().run(task_specification, shots=0).result().values[0]
+        return np.abs(np.vdot(self.input_array, state_vector)) ** 2
+
+    def test_multi_control_records(self):
+        gate_sequence = QubitEfficientQSP(self.input_array).construct_gate_sequence()
+        gates = gate_sequence.get_gates()
+        self.assertEqual(gate_sequence.get_gate_counts(), {"ry": 15, "rz": 15})
+        # the last record is the Rz of <s=1, j=1>, anti-controlled on qubits 0, 1 and 2
+        self.assertEqual((gates[-1]["op"], gates[-1]["target"], gates[-1]["control_mask"], gates[-1]["anti_control_mask"]),
+                         (GateSequence.RZ, 3, 0, 0b111))
+        self.assertEqual(np.count_nonzero(gates["control_mask"] & gates["anti_control_mask"]), 0)
+
+    def test_braket_emitter_matches_construct_circuit(self):
+        for decomposition in ("multi_control", "gray_code"):
+            circuit = QubitEfficientQSP(self.input_array).construct_circuit(decomposition=decomposition)
+            emitted_circuit = QubitEfficientQSP(self.input_array).construct_gate_sequence(decomposition).to_braket()
+            self.assertEqual(circuit.instructions, emitted_circuit.instructions)
+
+    def test_braket_emitter_control_state(self):
+        gate_sequence = QubitEfficientQSP(self.input_array).construct_gate_sequence()
+        circuit = gate_sequence.to_braket(use_control_state=True)
+        self.assertEqual(len(circuit.instructions), len(gate_sequence))
+        circuit.state_vector()
+        self.assertAlmostEqual(self._braket_fidelity(circuit), 1.0)
+
+    def test_openqasm_emitter(self):
+        for decomposition in ("multi_control", "gray_code"):
+            gate_sequence = QubitEfficientQSP(self.input_array).construct_gate_sequence(decomposition)
+            self.assertIn('include "stdgates.inc";', gate_sequence.to_openqasm())
+            source = gate_sequence.to_openqasm(braket_dialect=True) + "#pragma braket result state_vector\n"
+            self.assertAlmostEqual(self._braket_fidelity(Program(source=source)), 1.0)
+
+    @unittest.skipUnless(importlib.util.find_spec("qiskit"), "qiskit is not installed")
+    def test_qiskit_emitter(self):
+        from qiskit.quantum_info import Statevector
+        for decomposition in ("multi_control", "gray_code"):
+            qiskit_circ = QubitEfficientQSP(self.input_array).construct_gate_sequence(decomposition).to_qiskit()
+            state_vector = Statevector(qiskit_circ).data
+            self.assertAlmostEqual(np.abs(np.vdot(self.input_array, state_vector)) ** 2, 1.0)
+
+    def test_write_stream(self):
+        qsp = QubitEfficientQSP(self.input_array)
+        with tempfile.TemporaryDirectory() as directory:
+            openqasm_path = os.path.join(directory, "circuit.qasm")
+            self.assertEqual(qsp.write_gate_stream(openqasm_path, decomposition="gray_code", braket_dialect=True, chunk_size=2), 58)
+            with open(openqasm_path) as openqasm_file:
+                source = openqasm_file.read()
+            self.assertEqual(source, qsp.construct_gate_sequence("gray_code").to_openqasm(braket_dialect=True))
+            self.assertAlmostEqual(self._braket_fidelity(Program(source=source + "#pragma braket result state_vector\n")), 1.0)
+
+            jsonl_path = os.path.join(directory, "circuit.jsonl")
+            self.assertEqual(qsp.write_gate_stream(jsonl_path, file_format="jsonl", chunk_size=2), 30)
+            with open(jsonl_path) as jsonl_file:
+                gate_records = [json.loads(line) for line in jsonl_file]
+            gates = qsp.construct_gate_sequence().get_gates()
+            self.assertEqual([record["op"] for record in gate_records], [GateSequence.OP_NAMES[op] for op in gates["op"]])
+            np.testing.assert_array_equal([record["anti_control_mask"] for record in gate_records], gates["anti_control_mask"])
+            np.testing.assert_array_equal([record["angle"] for record in gate_records], gates["angle"])
+
+            with self.assertRaises(ValueError):
+                qsp.write_gate_stream(jsonl_path, file_format="csv")
+
+    def test_empty_sequence(self):
+        gate_sequence = GateSequence(2)
+        self.assertEqual(len(gate_sequence), 0)
+        self.assertEqual(len(gate_sequence.to_braket().instructions), 0)
+        self.assertEqual(gate_sequence.to_openqasm(), 'OPENQASM 3.0;\ninclude "stdgates.inc";\nqubit[2] q;\n')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from QubitEfficientQSP import QubitEfficientQSP
+from ParallelCircuitBuilder import ParallelCircuitBuilder
+
+from helper_functions import generate_haar_random_states, generate_normalized_complex_array, generate_normalized_real_sparse_array
+
+class TestParallelCircuitBuilder(unittest.TestCase):
+
+    def assert_identical_to_serial_stream(self, qsp, shard_size, file_format="openqasm", braket_dialect=False):
+        with tempfile.TemporaryDirectory() as temporary_directory:
+            parallel_path = os.path.join(temporary_directory, "parallel")
+            serial_path = os.path.join(temporary_directory, "serial")
+            parallel_gate_count = ParallelCircuitBuilder(qsp, max_workers=2, shard_size=shard_size).write_gate_stream(
+                parallel_path, file_format=file_format, braket_dialect=braket_dialect)
+            serial_gate_count = qsp.write_gate_stream(serial_path, file_format=file_format, braket_dialect=braket_dialect)
+            self.assertEqual(parallel_gate_count, serial_gate_count)
+            with open(parallel_path) as parallel_file, open(serial_path) as serial_file:
+                self.assertEqual(parallel_file.read(), serial_file.read())
+
+    def test_identical_to_serial_stream(self):
+        input_array = generate_normalized_complex_array(7)
+        self.assert_identical_to_serial_stream(QubitEfficientQSP(input_array), 5)
+        self.assert_identical_to_serial_stream(QubitEfficientQSP(input_array), 5, braket_dialect=True)
+        self.assert_identical_to_serial_stream(QubitEfficientQSP(input_array), 5, file_format="jsonl")
+
+    def test_identical_to_serial_stream_sparse_array(self):
+        sparse_input_array = generate_normalized_real_sparse_array(6, [1, 3, 6, 15, 30])
+        self.assert_identical_to_serial_stream(QubitEfficientQSP(sparse_input_array), 4)
+
+    def test_identical_to_serial_stream_large_instance(self):
+        for qsp in (QubitEfficientQSP(generate_haar_random_states(10, rng=0)[0]),
+                    QubitEfficientQSP(generate_haar_random_states(10, rng=1)[0], dtype=np.float32, keep_amplitude_arrays=False)):
+            self.assert_identical_to_serial_stream(qsp, 100)
+
+    def test_invalid_input(self):
+        with self.assertRaises(ValueError):
+            ParallelCircuitBuilder(QubitEfficientQSP.from_sparse(3, [1, 2], [0.6, 0.8]))
+        with self.assertRaises(ValueError):
+            ParallelCircuitBuilder(QubitEfficientQSP(generate_normalized_complex_array(3))).write_gate_stream("unused", file_format="qasm2")
+
+
+if __name__ == '__main__':
+    unittest.main()
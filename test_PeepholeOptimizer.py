@@ -0,0 +1,45 @@
+import unittest
+import numpy as np
+from braket.circuits import Circuit
+from PeepholeOptimizer import PeepholeOptimizer
+
+class TestPeepholeOptimizer(unittest.TestCase):
+
+    def test_cancel_x_pairs(self):
+        circuit = Circuit().x(0).x(1).x(0).x(0).x(0).ry(angle=0.3, target=2, control=[0, 1]).x(1).x(1)
+        optimizer = PeepholeOptimizer(circuit)
+        optimized_circuit = optimizer.optimize()
+        self.assertEqual([type(instruction.operator).__name__ for instruction in optimized_circuit.instructions], ["X", "Ry"])
+        self.assertEqual(optimizer.get_gate_count_reduction()["gate_count_before"], 8)
+        self.assertEqual(optimizer.get_gate_count_reduction()["gate_count_after"], 2)
+        self.assertEqual(optimizer.get_gate_count_reduction()["cancelled_gates"], 6)
+
+    def test_keep_x_pairs_separated_by_gate(self):
+        circuit = Circuit().x(0).ry(angle=0.3, target=1, control=[0]).x(0)
+        optimized_circuit = PeepholeOptimizer(circuit).optimize()
+        self.assertEqual(len(optimized_circuit.instructions), 3)
+
+    def test_merge_rotations(self):
+        circuit = Circuit().ry(angle=0.3, target=2, control=[0, 1]).x(3).ry(angle=0.4, target=2, control=[0, 1])
+        circuit.ry(angle=0.5, target=2, control=[0])
+        optimizer = PeepholeOptimizer(circuit)
+        optimized_circuit = optimizer.optimize()
+        self.assertEqual(len(optimized_circuit.instructions), 3)
+        self.assertAlmostEqual(optimized_circuit.instructions[0].operator.angle, 0.7)
+        self.assertEqual(optimizer.get_gate_count_reduction()["merged_rotations"], 1)
+
+    def test_remove_rotations_merged_to_zero(self):
+        circuit = Circuit().x(0).rz(angle=0.3, target=1, control=[0]).rz(angle=-0.3, target=1, control=[0]).x(0)
+        optimizer = PeepholeOptimizer(circuit)
+        optimized_circuit = optimizer.optimize()
+        self.assertEqual(len(optimized_circuit.instructions), 0)
+        self.assertEqual(optimizer.get_gate_count_reduction()["removed_rotations"], 1)
+
+    def test_different_control_state_not_merged(self):
+        circuit = Circuit().ry(angle=0.3, target=1, control=[0], control_state="0").ry(angle=0.3, target=1, control=[0])
+        optimized_circuit = PeepholeOptimizer(circuit).optimize()
+        self.assertEqual(len(optimized_circuit.instructions), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+from PipelineProfiler import PipelineProfiler
+from QubitEfficientQSP import QubitEfficientQSP
+
+from helper_functions import generate_normalized_complex_array
+
+class TestPipelineProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.input_array = generate_normalized_complex_array(4)
+
+    def test_phases_and_allocations(self):
+        measured_phases = []
+        with PipelineProfiler(callback=lambda phase, measurement: measured_phases.append(phase)) as profiler:
+            QubitEfficientQSP(self.input_array).construct_circuit(optimize=True)
+        report = profiler.get_report()
+        self.assertEqual(measured_phases, ["input_conversion", "validation", "angle_computation", "gate_generation",
+                                           "braket_emission", "peephole_optimization"])
+        self.assertEqual(list(report["phases"]), measured_phases)
+        self.assertEqual(report["phases"]["angle_computation"]["calls"], 1)
+        self.assertIsNone(report["phases"]["angle_computation"]["peak_memory"])
+        self.assertEqual(report["allocations"]["input_arrays"], {"count": 1, "nbytes": 2 * 16 * 8})
+        self.assertEqual(report["allocations"]["angle_tree"], {"count": 1, "nbytes": 2 * 15 * 8})
+        self.assertIsNone(PipelineProfiler.get_active())
+
+    def test_level_counts(self):
+        input_array = np.zeros(16, dtype=complex)
+        input_array[[0, 5]] = [0.6, 0.8]
+        for decomposition in ("multi_control", "gray_code"):
+            with PipelineProfiler() as profiler:
+                gate_sequence = QubitEfficientQSP(input_array).construct_gate_sequence(decomposition)
+            levels = profiler.get_report()["levels"]
+            self.assertEqual(list(levels), [4, 3, 2, 1])
+            self.assertEqual(sum(level["gate_count"] for level in levels.values()), len(gate_sequence))
+            self.assertEqual(sum(level["emitted_rotations"] for level in levels.values()),
+                             np.count_nonzero(gate_sequence.get_gates()["op"] != gate_sequence.X))
+            # every level of 2^(n-s) <s, j> instances has one Ry and one Rz candidate per instance
+            self.assertEqual(sum(level["emitted_rotations"] + level["skipped_rotations"] for level in levels.values()), 2 * 15)
+
+    def test_track_memory_and_nesting(self):
+        with PipelineProfiler(track_memory=True) as outer_profiler:
+            with PipelineProfiler.phase("outer"):
+                with PipelineProfiler() as inner_profiler:
+                    QubitEfficientQSP(self.input_array)
+                np.zeros(2 ** 16)
+        self.assertIn("angle_computation", inner_profiler.get_report()["phases"])
+        self.assertEqual(list(outer_profiler.get_report()["phases"]), ["outer"])
+        self.assertGreaterEqual(outer_profiler.get_report()["phases"]["outer"]["peak_memory"], 2 ** 16 * 8)
+
+    def test_disabled(self):
+        self.assertIsNone(PipelineProfiler.get_active())
+        with PipelineProfiler.phase("unused"):
+            QubitEfficientQSP(self.input_array).construct_gate_sequence()
+
+if __name__ == '__main__':
+    unittest.main()
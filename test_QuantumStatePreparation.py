@@ -1,9 +1,11 @@
 # to run all test, type the following code in Terminal: python3 -m unittest discover
 
+import os
+import tempfile
 import unittest
 import numpy as np
 from QuantumStatePreparation import QuantumStatePreparation
-from helper_functions import generate_normalized_complex_array
+from helper_functions import generate_haar_random_states, generate_normalized_complex_array, generate_sparse_states
 
 class TestQuantumStatePreparation(unittest.TestCase):
 
@@ -96,6 +98,221 @@ class TestQuantumStatePreparation(unittest.TestCase):
         self.assertAlmostEqual(angle_22, expected_angle_22)
         self.assertAlmostEqual(angle_31, expected_angle_31)
 
+    def test_angle_tree_matches_per_instance_formula(self):
+        """
+        Test that the vectorized angle tree agrees with summing the amplitude and phase slices of every <s, j> instance.
+        """
+        amplitude_array = np.abs(self.large_input_array)
+        phase_array = np.angle(self.large_input_array)
+        n = self.qsp_large.get_n()
+        for s in range(1, n + 1):
+            ry_angle_level = self.qsp_large.get_ry_angle_level(s)
+            rz_angle_level = self.qsp_large.get_rz_angle_level(s)
+            self.assertEqual(len(ry_angle_level), 2 ** (n - s))
+            for j in range(1, 2 ** (n - s) + 1):
+                indices_top = (2 * j - 1) * 2 ** (s - 1) + np.arange(2 ** (s - 1))
+                indices_bottom = (2 * j - 2) * 2 ** (s - 1) + np.arange(2 ** (s - 1))
+                expected_rz = np.sum(phase_array[indices_top] - phase_array[indices_bottom]) / (2 ** (s - 1))
+                expected_ry = 2 * np.arcsin(np.sqrt(np.sum(amplitude_array[indices_top] ** 2) / np.sum(amplitude_array[indices_top] ** 2 + amplitude_array[indices_bottom] ** 2)))
+                self.assertAlmostEqual(ry_angle_level[j - 1], expected_ry)
+                self.assertAlmostEqual(rz_angle_level[j - 1], expected_rz)
+
+    def test_angle_tree_zero_block(self):
+        """
+        Test that a block holding no probability mass gets a zero Ry angle instead of a division by zero.
+        """
+        qsp = QuantumStatePreparation(np.array([0.6, 0.8, 0, 0], dtype=np.complex128))
+        self.assertEqual(qsp.get_ry_rotation_angle(1, 2), 0.0)
+        self.assertEqual(qsp.get_rz_rotation_angle(1, 2), 0.0)
+        self.assertAlmostEqual(qsp.get_ry_rotation_angle(2, 1), 0.0)
+
+        # a block with tiny but nonzero probability mass still gets its exact angle
+        qsp = QuantumStatePreparation(np.array([np.sqrt(1 - 2e-12), 0, 1e-6, 1e-6], dtype=np.complex128))
+        self.assertAlmostEqual(qsp.get_ry_rotation_angle(1, 2), np.pi / 2)
+
+    def test_sparse_angle_tree_matches_dense(self):
+        """
+        Test that the sparse prefix-tree walk gives the same angles as the dense angle tree.
+        """
+        none_zero_index_array = np.array([1, 3, 6, 15, 30, 31, 500])
+        dense_array = np.zeros(1024, dtype=np.complex128)
+        dense_array[none_zero_index_array] = self.large_input_array[none_zero_index_array]
+        dense_array /= np.linalg.norm(dense_array)
+        qsp_dense = QuantumStatePreparation(dense_array)
+        qsp_sparse = QuantumStatePreparation.from_sparse(10, none_zero_index_array[::-1], dense_array[none_zero_index_array[::-1]])
+        self.assertTrue(qsp_sparse.is_sparse())
+        self.assertEqual(qsp_sparse.get_array_len(), 1024)
+        for s in range(1, 11):
+            np.testing.assert_array_equal(qsp_sparse.get_ry_angle_level(s), qsp_dense.get_ry_angle_level(s))
+            np.testing.assert_array_equal(qsp_sparse.get_rz_angle_level(s), qsp_dense.get_rz_angle_level(s))
+            self.assertEqual(len(qsp_sparse.get_nontrivial_rotation_angles(s)[0]), len(np.unique(none_zero_index_array >> s)))
+        self.assertEqual(qsp_sparse.get_ry_rotation_angle(1, 8), qsp_dense.get_ry_rotation_angle(1, 8))
+        self.assertEqual(qsp_sparse.get_ry_rotation_angle(1, 100), 0.0)
+
+    def test_sparse_input_validation(self):
+        qsp = QuantumStatePreparation.from_sparse(40, {2 ** 39: 0.6, 5: -0.8j})
+        self.assertEqual(qsp.get_n(), 40)
+        self.assertAlmostEqual(qsp.get_ry_rotation_angle(40, 1), 2 * np.arcsin(0.6))
+        with self.assertRaises(ValueError):
+            QuantumStatePreparation.from_sparse(3, [1, 8], [0.6, 0.8])
+        with self.assertRaises(ValueError):
+            QuantumStatePreparation.from_sparse(3, [1, 1], [0.6, 0.8])
+        with self.assertRaises(ValueError) as context:
+            QuantumStatePreparation.from_sparse(3, [1, 2], [0.6, 0.6])
+        self.assertTrue("Wave function array needs to be normalized" in str(context.exception))
+
+    def test_chunked_array_matches_dense(self):
+        """
+        Test that reading a memory-mapped .npy file in chunks gives exactly the angles of the constructor.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            array_path = os.path.join(directory, "state.npy")
+            np.save(array_path, self.large_input_array)
+            for chunk_size, angle_tree_directory in ((16, None), (64, directory), (4096, None)):
+                qsp = QuantumStatePreparation.from_chunked_array(array_path, chunk_size=chunk_size, angle_tree_directory=angle_tree_directory)
+                self.assertEqual(qsp.get_n(), 10)
+                for s in range(1, 11):
+                    np.testing.assert_array_equal(qsp.get_ry_angle_level(s), self.qsp_large.get_ry_angle_level(s))
+                    np.testing.assert_array_equal(qsp.get_rz_angle_level(s), self.qsp_large.get_rz_angle_level(s))
+                np.testing.assert_array_equal(qsp.get_amplitude_array(), self.qsp_large.get_amplitude_array())
+                np.testing.assert_array_equal(qsp.get_phase_array(), self.qsp_large.get_phase_array())
+            self.assertTrue(os.path.exists(os.path.join(directory, "rz_angle_level_6.npy")))
+            del qsp
+
+            with self.assertRaises(ValueError):
+                QuantumStatePreparation.from_chunked_array(array_path, chunk_size=48)
+            np.save(array_path, 2 * self.large_input_array)
+            with self.assertRaises(ValueError) as context:
+                QuantumStatePreparation.from_chunked_array(array_path, chunk_size=16)
+            self.assertTrue("Wave function array needs to be normalized" in str(context.exception))
+
+    def test_update_amplitudes(self):
+        """
+        Test that an incremental update gives the same angles as preparing the updated state from scratch.
+        """
+        qsp = QuantumStatePreparation(self.large_input_array)
+        expected_array = self.large_input_array.copy()
+        for indices, values in (([5], [0.3j]), ([1023, 0, 512], [0.1, -0.2, 0.05 + 0.05j])):
+            changed_rotations = qsp.update_amplitudes(indices, values)
+            expected_array[indices] = values
+            expected_array /= np.linalg.norm(expected_array)
+            expected_qsp = QuantumStatePreparation(expected_array)
+            self.assertLessEqual(len(changed_rotations), 2 * len(indices) * 10)
+            for s in range(1, 11):
+                np.testing.assert_almost_equal(qsp.get_ry_angle_level(s), expected_qsp.get_ry_angle_level(s))
+                np.testing.assert_almost_equal(qsp.get_rz_angle_level(s), expected_qsp.get_rz_angle_level(s))
+            for name, angle in changed_rotations.items():
+                rotation_type, s, j = name.split("_")
+                self.assertEqual(qsp.get_ry_rotation_angle(int(s), int(j)) if rotation_type == "ry" else qsp.get_rz_rotation_angle(int(s), int(j)), angle)
+            np.testing.assert_almost_equal(qsp.get_amplitude_array(), np.abs(expected_array))
+            np.testing.assert_almost_equal(qsp.get_phase_array(), np.angle(expected_array))
+        self.assertIn("ry_1_3", qsp.update_amplitudes([5], [0.0]))
+
+    def test_update_amplitudes_invalid(self):
+        with self.assertRaises(ValueError):
+            self.qsp.update_amplitudes([8], [0.1])
+        with self.assertRaises(ValueError):
+            self.qsp.update_amplitudes([1, 1], [0.1, 0.2])
+        with self.assertRaises(ValueError):
+            QuantumStatePreparation.from_sparse(3, [1, 2], [0.6, 0.8]).update_amplitudes([1], [0.1])
+        # an update to the zero vector is rejected and leaves the state unchanged
+        qsp = QuantumStatePreparation([0.6, 0, 0.8, 0])
+        with self.assertRaises(ValueError) as context:
+            qsp.update_amplitudes([0, 2], [0, 0])
+        self.assertTrue("nonzero norm" in str(context.exception))
+        np.testing.assert_almost_equal(qsp.get_amplitude_array(), [0.6, 0, 0.8, 0])
+        self.assertAlmostEqual(qsp.get_ry_rotation_angle(2, 1), 2 * np.arcsin(0.8))
+
+    def test_block_masses(self):
+        block_masses = self.qsp_large.compute_block_masses()
+        squared_amplitude_array = np.abs(self.large_input_array) ** 2
+        for s in range(1, 11):
+            np.testing.assert_almost_equal(block_masses[s - 1], squared_amplitude_array.reshape(-1, 2 ** s).sum(axis=1))
+
+    def test_pruned_angle_tree(self):
+        ry_angle_tree, rz_angle_tree, fidelity_bound = self.qsp_large.compute_pruned_angle_tree(0.99)
+        self.assertGreaterEqual(fidelity_bound, 0.99)
+        dropped_count = sum(np.sum((ry_angle_tree[s - 1] == 0) & (self.qsp_large.get_ry_angle_level(s) != 0)) for s in range(1, 11))
+        self.assertGreater(dropped_count, 0)
+
+        ry_angle_tree, rz_angle_tree, fidelity_bound = self.qsp_large.compute_pruned_angle_tree(1.0)
+        self.assertEqual(fidelity_bound, 1.0)
+        for s in range(1, 11):
+            np.testing.assert_array_equal(ry_angle_tree[s - 1], self.qsp_large.get_ry_angle_level(s))
+            np.testing.assert_array_equal(rz_angle_tree[s - 1], self.qsp_large.get_rz_angle_level(s))
+
+        with self.assertRaises(ValueError):
+            self.qsp_large.compute_pruned_angle_tree(1.5)
+
+    def test_pruned_angle_tree_largest_threshold(self):
+        """
+        Test that the subtrees are pruned below the largest feasible mass threshold, which a bisection misses
+        for this state as the subtree cost is not monotone in the threshold.
+        """
+        qsp = QuantumStatePreparation(generate_haar_random_states(6, rng=133)[0])
+        block_masses = qsp.compute_block_masses()
+        parent_masses = [np.repeat(block_masses[s], 2) for s in range(1, 6)] + [np.full(1, np.inf)]
+        error_budget = np.sqrt(2 * (1 - np.sqrt(0.9)))
+        feasible_thresholds = [mass_threshold for mass_threshold in np.unique(np.concatenate(block_masses))
+                               if sum(2 * np.sum(np.sqrt(masses[(masses <= mass_threshold) & (parents > mass_threshold)]))
+                                      for masses, parents in zip(block_masses, parent_masses)) <= error_budget / 2]
+        ry_angle_tree, rz_angle_tree, fidelity_bound = qsp.compute_pruned_angle_tree(0.9)
+        self.assertGreaterEqual(fidelity_bound, 0.9)
+        for s in range(1, 7):
+            is_pruned_block = block_masses[s - 1] <= max(feasible_thresholds)
+            np.testing.assert_array_equal(ry_angle_tree[s - 1][is_pruned_block], 0.0)
+            np.testing.assert_array_equal(rz_angle_tree[s - 1][is_pruned_block], 0.0)
+
+    def test_single_amplitude(self):
+        qsp = QuantumStatePreparation(np.array([1 + 0j]))
+        self.assertEqual(qsp.compute_block_masses(), [])
+        self.assertEqual(qsp.compute_pruned_angle_tree(0.9), ([], [], 1.0))
+
+    def test_reduced_precision(self):
+        """
+        Test that float32 angle trees stay within the reported error bounds of the float64 ones.
+        """
+        qsp = QuantumStatePreparation(self.large_input_array, dtype=np.float32)
+        ry_error_bounds, rz_error_bounds, fidelity_bound = qsp.compute_angle_error_bounds()
+        for s in range(1, 11):
+            self.assertEqual(qsp.get_ry_angle_level(s).dtype, np.float32)
+            self.assertLessEqual(np.max(np.abs(qsp.get_ry_angle_level(s) - self.qsp_large.get_ry_angle_level(s))), ry_error_bounds[s - 1])
+            self.assertLessEqual(np.max(np.abs(qsp.get_rz_angle_level(s) - self.qsp_large.get_rz_angle_level(s))), rz_error_bounds[s - 1])
+        self.assertGreater(fidelity_bound, 1 - 1e-6)
+        self.assertGreater(self.qsp_large.compute_angle_error_bounds()[2], 1 - 1e-12)
+
+        chunked_qsp = QuantumStatePreparation.from_chunked_array(self.large_input_array.astype(np.complex64), chunk_size=64, dtype=np.complex64)
+        complex64_qsp = QuantumStatePreparation(self.large_input_array.astype(np.complex64), dtype=np.float32)
+        for s in range(1, 11):
+            np.testing.assert_array_equal(chunked_qsp.get_ry_angle_level(s), complex64_qsp.get_ry_angle_level(s))
+            np.testing.assert_array_equal(chunked_qsp.get_rz_angle_level(s), complex64_qsp.get_rz_angle_level(s))
+        with self.assertRaises(ValueError):
+            QuantumStatePreparation(self.large_input_array, dtype=np.int32)
+
+    def test_complex64_inputs_accepted(self):
+        """
+        Test that correctly normalized complex64 states pass the normalization check, whose rounding exceeds 1e-7.
+        """
+        for n in (10, 16):
+            for input_array in generate_haar_random_states(n, 8, rng=0, dtype=np.complex64):
+                QuantumStatePreparation(input_array, dtype=np.float32)
+                QuantumStatePreparation.from_chunked_array(input_array, chunk_size=2 ** 8, dtype=np.float32)
+        indices, values = generate_sparse_states(30, 50, batch_size=200, rng=0, dtype=np.complex64)
+        for b in range(200):
+            QuantumStatePreparation.from_sparse(30, indices[b], values[b])
+        with self.assertRaises(ValueError):
+            QuantumStatePreparation(generate_haar_random_states(10, rng=0, dtype=np.complex64)[0] * np.float32(1.001), dtype=np.float32)
+
+    def test_without_amplitude_arrays(self):
+        qsp = QuantumStatePreparation(self.large_input_array, keep_amplitude_arrays=False)
+        for s in range(1, 11):
+            np.testing.assert_array_equal(qsp.get_ry_angle_level(s), self.qsp_large.get_ry_angle_level(s))
+            np.testing.assert_array_equal(qsp.get_rz_angle_level(s), self.qsp_large.get_rz_angle_level(s))
+        np.testing.assert_array_equal(qsp.get_amplitude_array(), self.qsp_large.get_amplitude_array())
+        np.testing.assert_array_equal(qsp.get_phase_array(), self.qsp_large.get_phase_array())
+        with self.assertRaises(ValueError):
+            qsp.update_amplitudes([5], [0.3j])
+
     def test_arbitrary_large_instance(self):
         self.assertEqual(self.qsp_large.get_array_len(), 1024)
         self.assertEqual(self.qsp_large.get_n(), 10)
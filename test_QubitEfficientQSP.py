@@ -1,8 +1,13 @@
+import os
+import subprocess
+import sys
 import unittest
 import numpy as np
 from QubitEfficientQSP import QubitEfficientQSP
 
 from braket.devices import LocalSimulator
+from GateSequence import GateSequence
+from StatevectorVerifier import StatevectorVerifier
 
 from helper_functions import generate_normalized_complex_array, generate_normalized_real_array, generate_normalized_real_sparse_array
 
@@ -57,7 +62,221 @@ class TestQubitEfficientQSP(unittest.TestCase):
         circuit.state_vector() # convert the circuit to state vector
         braket_state_vector_result = braket_device.run(circuit, shots=0).result().values[0] # extract the result
         np.testing.assert_almost_equal(self.sparse_input_array, braket_state_vector_result)
-         
+
+
+    def test_sparse_entry_point_construct_circuit(self):
+        none_zero_index_array = [1, 3, 6, 15, 30]
+        sparse_qsp = QubitEfficientQSP.from_sparse(6, none_zero_index_array, self.sparse_input_array[none_zero_index_array])
+        circuit = sparse_qsp.construct_circuit()
+        self.assertEqual(circuit, QubitEfficientQSP(self.sparse_input_array).construct_circuit())
+        braket_device = LocalSimulator() # define the simulator
+        circuit.state_vector() # convert the circuit to state vector
+        braket_state_vector_result = braket_device.run(circuit, shots=0).result().values[0] # extract the result
+        np.testing.assert_almost_equal(self.sparse_input_array, braket_state_vector_result)
+
+    def test_sparse_entry_point_many_qubits(self):
+        """
+        Test that a sparse state on many qubits only emits gates for the occupied blocks.
+        """
+        sparse_qsp = QubitEfficientQSP.from_sparse(32, {0: 0.6, 2 ** 31 + 5: 0.8j})
+        circuit = sparse_qsp.construct_circuit()
+        ry_count = sum(type(instruction.operator).__name__ == "Ry" for instruction in circuit.instructions)
+        rz_count = sum(type(instruction.operator).__name__ == "Rz" for instruction in circuit.instructions)
+        self.assertEqual(ry_count, 1 + 2) # the root split, then Ry(pi) on the 2 set bits of 5
+        self.assertLessEqual(rz_count, 32) # at most one occupied block per level carries a phase difference
+
+    def test_gray_code_construct_circuit_complex(self):
+        circuit = QubitEfficientQSP(self.large_complex_input_array).construct_circuit(decomposition="gray_code")
+        braket_device = LocalSimulator() # define the simulator
+        circuit.state_vector() # convert the circuit to state vector
+        braket_state_vector_result = braket_device.run(circuit, shots=0).result().values[0] # extract the result
+        vec_norm = np.abs(np.dot(self.large_complex_input_array, np.conj(braket_state_vector_result))) # compute |<psi'|psi>| since there might be global phase diff
+        np.testing.assert_almost_equal(vec_norm, 1.0)
+
+    def test_gray_code_construct_circuit_sparse(self):
+        circuit = QubitEfficientQSP(self.sparse_input_array).construct_circuit(decomposition="gray_code")
+        braket_device = LocalSimulator() # define the simulator
+        circuit.state_vector() # convert the circuit to state vector
+        braket_state_vector_result = braket_device.run(circuit, shots=0).result().values[0] # extract the result
+        np.testing.assert_almost_equal(self.sparse_input_array, braket_state_vector_result)
+
+    def test_gray_code_gate_counts(self):
+        """
+        Test that the Gray-code decomposition uses no multi-controlled gate and 2^(n-s) CNOT gates per rotation level.
+        """
+        circuit = QubitEfficientQSP(self.large_complex_input_array).construct_circuit(decomposition="gray_code")
+        for instruction in circuit.instructions:
+            self.assertEqual(len(instruction.control), 0)
+        cnot_count = sum(type(instruction.operator).__name__ == "CNot" for instruction in circuit.instructions)
+        self.assertEqual(cnot_count, 2 * (2 ** 6 - 2))
+
+    def test_optimized_construct_circuit(self):
+        qsp = QubitEfficientQSP(self.large_complex_input_array)
+        circuit = qsp.construct_circuit(optimize=True)
+        braket_device = LocalSimulator() # define the simulator
+        circuit.state_vector() # convert the circuit to state vector
+        braket_state_vector_result = braket_device.run(circuit, shots=0).result().values[0] # extract the result
+        vec_norm = np.abs(np.dot(self.large_complex_input_array, np.conj(braket_state_vector_result))) # compute |<psi'|psi>| since there might be global phase diff
+        np.testing.assert_almost_equal(vec_norm, 1.0)
+        gate_count_reduction = qsp.get_gate_count_reduction()
+        self.assertLess(gate_count_reduction["gate_count_after"], gate_count_reduction["gate_count_before"])
+        self.assertEqual(gate_count_reduction["gate_count_after"], len(circuit.instructions))
+
+    def test_parametric_circuit_template(self):
+        for decomposition in ("multi_control", "gray_code"):
+            template, parameter_values = self.large_complex_qsp.construct_parametric_circuit(decomposition=decomposition)
+            self.assertEqual(len(template.parameters), len(parameter_values))
+            other_template, other_parameter_values = QubitEfficientQSP(self.large_real_input_array).construct_parametric_circuit(decomposition=decomposition)
+            if decomposition == "multi_control":
+                self.assertIsNot(other_template, template) # a real state has no Rz rotations
+            bound_circuit = QubitEfficientQSP.bind_parameter_values(template, parameter_values)
+            self.assertEqual(bound_circuit, QubitEfficientQSP(self.large_complex_input_array).construct_circuit(decomposition=decomposition))
+
+        template, parameter_values = QubitEfficientQSP(generate_normalized_complex_array(6)).construct_parametric_circuit()
+        self.assertIs(template, self.large_complex_qsp.construct_parametric_circuit()[0])
+        braket_device = LocalSimulator() # define the simulator
+        template, parameter_values = self.large_complex_qsp.construct_parametric_circuit()
+        circuit = template.copy()
+        circuit.state_vector() # convert the circuit to state vector
+        braket_state_vector_result = braket_device.run(circuit, shots=0, inputs=parameter_values).result().values[0] # extract the result
+        vec_norm = np.abs(np.dot(self.large_complex_input_array, np.conj(braket_state_vector_result))) # compute |<psi'|psi>| since there might be global phase diff
+        np.testing.assert_almost_equal(vec_norm, 1.0)
+
+    def test_bind_parameter_values_other_state(self):
+        other_input_array = generate_normalized_complex_array(6)
+        for decomposition in ("multi_control", "gray_code"):
+            template = self.large_complex_qsp.construct_parametric_circuit(decomposition=decomposition)[0]
+            other_circuit = QubitEfficientQSP(other_input_array).construct_circuit(decomposition=decomposition)
+            other_parameter_values = QubitEfficientQSP(other_input_array).construct_parametric_circuit(decomposition=decomposition)[1]
+            self.assertEqual(QubitEfficientQSP.bind_parameter_values(template, other_parameter_values), other_circuit)
+            # a template that is not cached is bound instruction by instruction
+            self.assertEqual(QubitEfficientQSP.bind_parameter_values(template.copy(), other_parameter_values), other_circuit)
+
+    def test_parametric_circuit_cache_bounded(self):
+        QubitEfficientQSP.clear_parametric_circuit_cache()
+        # every basis state has its own pattern of nonzero rotations
+        templates = [QubitEfficientQSP(np.eye(64)[k]).construct_parametric_circuit()[0]
+                     for k in range(QubitEfficientQSP.PARAMETRIC_CIRCUIT_CACHE_SIZE + 5)]
+        self.assertEqual(len(QubitEfficientQSP._parametric_circuit_cache), QubitEfficientQSP.PARAMETRIC_CIRCUIT_CACHE_SIZE)
+        # the template of a recently used pattern survives, the least recently used ones are evicted
+        real_qsp = QubitEfficientQSP(self.large_real_input_array)
+        real_template = real_qsp.construct_parametric_circuit()[0]
+        for template in templates[-QubitEfficientQSP.PARAMETRIC_CIRCUIT_CACHE_SIZE + 1:]:
+            self.assertIn(template, QubitEfficientQSP._parametric_circuit_cache.values())
+        self.assertNotIn(templates[0], QubitEfficientQSP._parametric_circuit_cache.values())
+        self.assertIs(real_qsp.construct_parametric_circuit()[0], real_template)
+
+    def test_update_amplitudes_rebinds_parametric_circuit(self):
+        template, parameter_values = self.large_complex_qsp.construct_parametric_circuit()
+        changed_rotations = self.large_complex_qsp.update_amplitudes([7, 40], [0.2 - 0.1j, 0.3j])
+        parameter_values.update(changed_rotations)
+        updated_array = self.large_complex_input_array.copy()
+        updated_array[[7, 40]] = [0.2 - 0.1j, 0.3j]
+        updated_array /= np.linalg.norm(updated_array)
+
+        updated_template, updated_parameter_values = self.large_complex_qsp.construct_parametric_circuit()
+        self.assertIs(updated_template, template)
+        self.assertEqual(updated_parameter_values, parameter_values)
+        circuit = QubitEfficientQSP.bind_parameter_values(template, parameter_values)
+        braket_device = LocalSimulator() # define the simulator
+        circuit.state_vector() # convert the circuit to state vector
+        braket_state_vector_result = braket_device.run(circuit, shots=0).result().values[0] # extract the result
+        vec_norm = np.abs(np.dot(updated_array, np.conj(braket_state_vector_result))) # compute |<psi'|psi>| since there might be global phase diff
+        np.testing.assert_almost_equal(vec_norm, 1.0)
+
+    def test_update_amplitudes_changes_rotation_pattern(self):
+        template, parameter_values = self.large_real_qsp.construct_parametric_circuit()
+        ry_angle_level = self.large_real_qsp.get_ry_angle_level(1).copy()
+        # a real state has no Rz rotations, so a complex amplitude needs parameters the template does not have
+        with self.assertRaises(ValueError):
+            self.large_real_qsp.update_amplitudes([7], [0.2j])
+        np.testing.assert_array_equal(self.large_real_qsp.get_ry_angle_level(1), ry_angle_level)
+        np.testing.assert_almost_equal(self.large_real_qsp.get_amplitude_array(), np.abs(self.large_real_input_array))
+        self.assertIs(self.large_real_qsp.construct_parametric_circuit()[0], template)
+
+        changed_rotations = self.large_real_qsp.update_amplitudes([7], [0.2j], allow_rotation_pattern_change=True)
+        self.assertIn("rz_1_4", changed_rotations)
+        updated_array = self.large_real_input_array.astype(complex)
+        updated_array[7] = 0.2j
+        updated_array /= np.linalg.norm(updated_array)
+        updated_template, updated_parameter_values = self.large_real_qsp.construct_parametric_circuit()
+        self.assertIsNot(updated_template, template)
+        circuit = QubitEfficientQSP.bind_parameter_values(updated_template, updated_parameter_values)
+        fidelity = StatevectorVerifier(self.large_real_qsp, gate_sequence=GateSequence.from_braket(circuit, 6)).compute_fidelity(updated_array)
+        self.assertAlmostEqual(fidelity, 1.0)
+
+    def test_approximate_construct_circuit(self):
+        decaying_input_array = self.large_complex_input_array * np.exp(-np.arange(64) / 8)
+        decaying_input_array /= np.linalg.norm(decaying_input_array)
+        exact_circuit = QubitEfficientQSP(decaying_input_array).construct_circuit()
+        circuit, fidelity_bound = QubitEfficientQSP(decaying_input_array).construct_approximate_circuit(0.999)
+        self.assertGreaterEqual(fidelity_bound, 0.999)
+        self.assertLess(len(circuit.instructions), len(exact_circuit.instructions))
+        braket_device = LocalSimulator() # define the simulator
+        circuit.state_vector() # convert the circuit to state vector
+        braket_state_vector_result = braket_device.run(circuit, shots=0).result().values[0] # extract the result
+        fidelity = np.abs(np.dot(decaying_input_array, np.conj(braket_state_vector_result))) ** 2
+        self.assertGreaterEqual(fidelity, fidelity_bound)
+
+    def test_approximate_single_amplitude(self):
+        circuit, fidelity_bound = QubitEfficientQSP(np.array([1 + 0j])).construct_approximate_circuit(0.9)
+        self.assertEqual(len(circuit.instructions), 0)
+        self.assertEqual(fidelity_bound, 1.0)
+
+    def test_approximate_sparse_instance(self):
+        none_zero_index_array = np.array([1, 3, 6, 15, 30, 700, 701, 4000])
+        values = np.array([0.7, 0.5, 0.3, 0.3, 0.2, 0.1, 0.05, 0.01j])
+        values /= np.linalg.norm(values)
+        dense_array = np.zeros(2 ** 12, dtype=np.complex128)
+        dense_array[none_zero_index_array] = values
+        sparse_qsp = QubitEfficientQSP.from_sparse(12, none_zero_index_array, values)
+        ry_angle_tree, rz_angle_tree, fidelity_bound = sparse_qsp.compute_pruned_angle_tree(0.99)
+        approximate_qsp = QubitEfficientQSP.from_angle_tree(12, ry_angle_tree, rz_angle_tree, sparse_qsp.get_block_index_tree())
+        self.assertGreaterEqual(StatevectorVerifier(approximate_qsp).compute_fidelity(dense_array), fidelity_bound)
+        circuit, _ = sparse_qsp.construct_approximate_circuit(0.99)
+        self.assertLess(len(circuit.instructions), len(sparse_qsp.construct_circuit().instructions))
+
+    def test_approximate_opposite_phases(self):
+        """
+        Test the fidelity bound on complex states whose dropped subtrees are nearly opposite to |0...0>.
+        """
+        opposite_phase_array = np.array([np.sqrt(0.049) * np.exp(-1j * (np.pi - 0.3)), np.sqrt(0.021) * np.exp(1j * (np.pi - 0.3))]
+                                        + [np.sqrt(0.93 / 6)] * 6)
+        input_arrays = [opposite_phase_array]
+        rng = np.random.default_rng(5)
+        for _ in range(100):
+            input_array = (rng.standard_normal(32) + 1j * rng.standard_normal(32)) * np.exp(-np.arange(32) / rng.uniform(2, 16))
+            input_array[::2] *= np.where(rng.random(16) < 0.5, -1, 1)
+            input_arrays.append(input_array / np.linalg.norm(input_array))
+        for input_array in input_arrays:
+            for target_fidelity in (0.5, 0.9, 0.99):
+                qsp = QubitEfficientQSP(input_array)
+                ry_angle_tree, rz_angle_tree, fidelity_bound = qsp.compute_pruned_angle_tree(target_fidelity)
+                self.assertGreaterEqual(fidelity_bound, target_fidelity)
+                approximate_qsp = QubitEfficientQSP.from_angle_tree(qsp.get_n(), ry_angle_tree, rz_angle_tree)
+                verifier = StatevectorVerifier(approximate_qsp, gate_sequence=approximate_qsp.construct_gate_sequence(decomposition="gray_code"))
+                self.assertGreaterEqual(verifier.compute_fidelity(input_array), fidelity_bound - 1e-12)
+
+    def test_iter_gate_sequence_chunks(self):
+        for qsp in (self.large_complex_qsp, self.sparse_qsp, QubitEfficientQSP.from_sparse(12, [3, 1000, 4000], [0.6, 0.8j, 0])):
+            for decomposition in ("multi_control", "gray_code"):
+                chunks = list(qsp.iter_gate_sequence(decomposition, chunk_size=3))
+                self.assertTrue(all(len(chunk) <= 2 * 3 for chunk in chunks))
+                np.testing.assert_array_equal(np.concatenate([chunk.get_gates() for chunk in chunks]),
+                                              qsp.construct_gate_sequence(decomposition).get_gates())
+
+    def test_invalid_decomposition(self):
+        with self.assertRaises(ValueError):
+            self.qsp.construct_circuit(decomposition="unknown")
+
+    def test_import_without_backends(self):
+        # the angle computation, gate records and resource counts only need NumPy
+        script = ("import sys, QubitEfficientQSP, ResourceEstimator, CircuitCache; "
+                  "print(sorted({name.split('.')[0] for name in sys.modules} & {'braket', 'qiskit', 'matplotlib'}))")
+        completed_process = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                           capture_output=True, text=True, check=True)
+        self.assertEqual(completed_process.stdout.strip(), "[]")
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
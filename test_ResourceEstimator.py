@@ -0,0 +1,47 @@
+import unittest
+import numpy as np
+from QubitEfficientQSP import QubitEfficientQSP
+from ResourceEstimator import ResourceEstimator
+
+from helper_functions import generate_normalized_complex_array, generate_normalized_real_sparse_array
+
+class TestResourceEstimator(unittest.TestCase):
+
+    @staticmethod
+    def _count_resources(circuit) -> dict:
+        resources = dict.fromkeys(("x_count", "cnot_count", "rotation_count", "controlled_rotation_count", "multi_control_gate_count"), 0)
+        for instruction in circuit.instructions:
+            gate_name = type(instruction.operator).__name__
+            if gate_name == "X":
+                resources["x_count"] += 1
+            elif gate_name == "CNot":
+                resources["cnot_count"] += 1
+            else:
+                resources[("rotation_count", "controlled_rotation_count", "multi_control_gate_count")[min(len(instruction.control), 2)]] += 1
+        resources["gate_count"] = len(circuit.instructions)
+        resources["depth"] = circuit.depth
+        return resources
+
+    def test_estimate_matches_circuit(self):
+        basis_state = np.zeros(64)
+        basis_state[37] = 1
+        input_arrays = (generate_normalized_complex_array(5), generate_normalized_real_sparse_array(6, [1, 3, 6, 15, 30]), basis_state)
+        for input_array in input_arrays:
+            for decomposition in ("multi_control", "gray_code"):
+                circuit = QubitEfficientQSP(input_array).construct_circuit(decomposition=decomposition)
+                self.assertEqual(ResourceEstimator(QubitEfficientQSP(input_array)).estimate(decomposition), self._count_resources(circuit))
+
+    def test_estimate_sparse_instance(self):
+        sparse_qsp = QubitEfficientQSP.from_sparse(7, [3, 64, 100], [0.6, 0.8j, 0])
+        dense_array = np.zeros(128, dtype=complex)
+        dense_array[[3, 64]] = [0.6, 0.8j]
+        for decomposition in ("multi_control", "gray_code"):
+            circuit = QubitEfficientQSP(dense_array).construct_circuit(decomposition=decomposition)
+            self.assertEqual(ResourceEstimator(sparse_qsp).estimate(decomposition), self._count_resources(circuit))
+
+    def test_invalid_decomposition(self):
+        with self.assertRaises(ValueError):
+            ResourceEstimator(QubitEfficientQSP([0.6, 0.8])).estimate("unknown")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import numpy as np
+from GateSequence import GateSequence
+from QubitEfficientQSP import QubitEfficientQSP
+from StatevectorVerifier import StatevectorVerifier
+
+from braket.devices import LocalSimulator
+
+from helper_functions import generate_haar_random_states, generate_normalized_complex_array, generate_normalized_real_sparse_array
+
+class TestStatevectorVerifier(unittest.TestCase):
+
+    def setUp(self):
+        self.complex_input_array = generate_normalized_complex_array(5)
+        self.qsp = QubitEfficientQSP(self.complex_input_array)
+
+    def test_simulate_matches_braket(self):
+        circuit = self.qsp.construct_circuit()
+        braket_device = LocalSimulator() # define the simulator
+        circuit.state_vector() # convert the circuit to state vector
+        braket_state_vector_result = braket_device.run(circuit, shots=0).result().values[0] # extract the result
+        np.testing.assert_almost_equal(StatevectorVerifier(self.qsp).simulate(), braket_state_vector_result)
+
+    def test_simulate_gate_sequence_matches_braket(self):
+        braket_device = LocalSimulator()
+        for decomposition in ("multi_control", "gray_code"):
+            gate_sequence = self.qsp.construct_gate_sequence(decomposition=decomposition)
+            for circuit in (gate_sequence.to_braket(use_control_state=True),
+                            QubitEfficientQSP(self.complex_input_array).construct_circuit(decomposition=decomposition, optimize=True)):
+                np.testing.assert_almost_equal(StatevectorVerifier.simulate_gate_sequence(GateSequence.from_braket(circuit)),
+                                               StatevectorVerifier(self.qsp).simulate())
+                circuit.state_vector()
+                braket_state_vector_result = braket_device.run(circuit, shots=0).result().values[0]
+                np.testing.assert_almost_equal(StatevectorVerifier(self.qsp, gate_sequence=gate_sequence).simulate(), braket_state_vector_result)
+
+    def test_gate_sequence_detects_wrong_circuit(self):
+        gate_sequence = self.qsp.construct_gate_sequence(decomposition="gray_code")
+        wrong_gates = gate_sequence.get_gates().copy()
+        wrong_gates = wrong_gates[wrong_gates["op"] != GateSequence.X] # drop the CNOT gates
+        self.assertLess(StatevectorVerifier(self.qsp, gate_sequence=GateSequence(5, wrong_gates)).compute_fidelity(), 0.99)
+        self.assertAlmostEqual(StatevectorVerifier(self.qsp, gate_sequence=gate_sequence).compute_fidelity(), 1.0)
+
+    def test_fidelity_large_instance(self):
+        large_input_array = generate_normalized_complex_array(20)
+        verifier = StatevectorVerifier(QubitEfficientQSP(large_input_array))
+        self.assertAlmostEqual(verifier.compute_fidelity(), 1.0)
+
+    def test_fidelity_sparse_instance(self):
+        none_zero_index_array = [1, 3, 6, 15, 30, 2000]
+        sparse_input_array = generate_normalized_real_sparse_array(12, none_zero_index_array)
+        sparse_qsp = QubitEfficientQSP.from_sparse(12, none_zero_index_array, sparse_input_array[none_zero_index_array])
+        with self.assertRaises(ValueError):
+            StatevectorVerifier(sparse_qsp).compute_fidelity()
+        np.testing.assert_almost_equal(StatevectorVerifier(sparse_qsp).simulate(), sparse_input_array)
+
+    def test_fidelity_reduced_precision(self):
+        for n in (0, 10, 14):
+            input_array = generate_haar_random_states(n, rng=[1, n])[0] if n > 0 else np.array([1 + 0j])
+            float32_qsp = QubitEfficientQSP(input_array, dtype=np.float32)
+            verifier = StatevectorVerifier(float32_qsp)
+            self.assertAlmostEqual(np.linalg.norm(verifier.simulate()), 1.0, places=12)
+            self.assertGreaterEqual(verifier.compute_fidelity(input_array), float32_qsp.compute_angle_error_bounds()[2])
+
+    def test_fidelity_detects_wrong_state(self):
+        self.assertLess(StatevectorVerifier(self.qsp).compute_fidelity(generate_normalized_complex_array(5)), 0.99)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import random
+import unittest
+import numpy as np
+from QubitEfficientQSP import QubitEfficientQSP
+from StatevectorVerifier import StatevectorVerifier
+
+from helper_functions import (generate_gaussian_states, generate_haar_random_states, generate_normalized_real_sparse_array,
+                              generate_product_states, generate_sparse_states, generate_state_batches, round_to_three_significant_digits)
+
+class TestHelperFunctions(unittest.TestCase):
+
+    def test_round_to_three_significant_digits(self):
+        np.testing.assert_array_equal(round_to_three_significant_digits([0.12345, -0.0, -0.5678j], 3), [0.123, 0.0, -0.568j])
+
+    def test_legacy_seeding(self):
+        random.seed(10)
+        expected_values = np.array([random.random() for _ in range(3)])
+        random.seed(10)
+        sparse_array = generate_normalized_real_sparse_array(3, [1, 2, 4])
+        np.testing.assert_almost_equal(sparse_array[[1, 2, 4]], expected_values / np.linalg.norm(expected_values))
+        np.testing.assert_array_equal(generate_normalized_real_sparse_array(3, [1, 2, 4], rng=7),
+                                      generate_normalized_real_sparse_array(3, [1, 2, 4], rng=np.random.default_rng(7)))
+
+    def test_dense_generators(self):
+        for state_generator in (generate_haar_random_states, generate_product_states, generate_gaussian_states):
+            states = state_generator(6, batch_size=3, rng=1)
+            self.assertEqual(states.shape, (3, 64))
+            np.testing.assert_almost_equal(np.linalg.norm(states, axis=1), np.ones(3))
+            np.testing.assert_array_equal(states, state_generator(6, batch_size=3, rng=np.random.default_rng(1)))
+            self.assertAlmostEqual(StatevectorVerifier(QubitEfficientQSP(states[0])).compute_fidelity(states[0]), 1.0)
+        self.assertEqual(generate_haar_random_states(4, rng=0, dtype=np.complex64).dtype, np.complex64)
+        # a product state has Schmidt rank 1 across every cut
+        self.assertEqual(np.linalg.matrix_rank(generate_product_states(6, rng=2)[0].reshape(8, 8)), 1)
+
+    def test_sparse_states(self):
+        indices, values = generate_sparse_states(40, 5, batch_size=4, rng=3)
+        self.assertEqual(indices.shape, (4, 5))
+        self.assertTrue(np.all(np.diff(indices, axis=1) > 0))
+        np.testing.assert_almost_equal(np.linalg.norm(values, axis=1), np.ones(4))
+        qsp = QubitEfficientQSP.from_sparse(40, indices[0], values[0])
+        self.assertTrue(qsp.is_sparse())
+        with self.assertRaises(ValueError):
+            generate_sparse_states(2, 5)
+
+    def test_state_batches(self):
+        batches = list(generate_state_batches(generate_sparse_states, 8, 3, batch_size=2, rng=4, nonzero_count=3))
+        self.assertEqual(len(batches), 3)
+        self.assertFalse(np.array_equal(batches[0][1], batches[1][1]))
+        np.testing.assert_array_equal(batches[2][0], list(generate_state_batches(generate_sparse_states, 8, 3, batch_size=2, rng=4, nonzero_count=3))[2][0])
+
+if __name__ == '__main__':
+    unittest.main()